@@ -0,0 +1,132 @@
+import time
+import numpy as np
+import image_tools
+import lzw_api
+import lzw_numba
+import lzw_scan
+import lzw_segments
+import level3_compression
+import level3_decompression
+import level4_compression
+import level4_decompression
+
+
+def timed(func, *args, **kwargs):
+    """Run func once and return (result, elapsed seconds)."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def load_cases(image_path):
+    """Build the symbol streams each image level feeds to LZW."""
+    img = image_tools.readPILimg(image_path).convert("RGB")
+    rgb = image_tools.PIL2np(img)
+    gray = image_tools.PIL2np(image_tools.color2gray(img))
+
+    diff = level3_compression.create_difference_image(gray)
+    diff = np.clip(diff, -128, 127)
+
+    cases = [
+        # name, symbols for the arrays, reference encoder, reference decoder, max_size, offset
+        ("level2 gray (tuple keys)", gray, None, None, 65535, 0),
+        ("level3 gray diff (tuple keys)", diff + 128,
+         lambda: level3_compression.compress_lzw(diff.flatten().tolist()),
+         level3_decompression.decompress_lzw, 4096, 128),
+        ("level4 red channel (string keys)", rgb[:, :, 0],
+         lambda: level4_compression.compress_lzw(rgb[:, :, 0].flatten().tolist()),
+         level4_decompression.decompress_lzw, 4096, 0),
+    ]
+    try:
+        import level2_compression
+        import level2_decompression
+        cases[0] = ("level2 gray (tuple keys)", gray,
+                    lambda: level2_compression.compress_lzw(gray.flatten().tolist()),
+                    level2_decompression.decompress_lzw, 65535, 0)
+    except ImportError as e:
+        print(f"Skipping level2 reference implementation: {e}")
+    return cases
+
+
+def benchmark_segments(image_path, counts=(1, 2, 4, 8)):
+    """Codes and decode times of a grayscale image coded as independent bands of rows.
+
+    The pool time includes starting the worker processes.
+    """
+    gray = image_tools.PIL2np(image_tools.color2gray(image_tools.readPILimg(image_path)))
+    height, width = gray.shape
+    print(f"{'segments':>8} {'codes':>9} {'1 process':>10} {'pool':>9}")
+    for count in counts:
+        first_rows, streams = lzw_segments.compress_rows(gray, count, 256, 65535)
+        segments = list(zip(first_rows, streams))
+        serial, serial_time = timed(lzw_segments.decode, width, height, segments, 256, 65536,
+                                    workers=1)
+        pooled, pool_time = timed(lzw_segments.decode, width, height, segments, 256, 65536,
+                                  workers=count)
+        assert np.array_equal(serial, gray) and np.array_equal(pooled, gray)
+        print(f"{len(segments):8} {sum(len(codes) for codes in streams):9} "
+              f"{serial_time:10.3f} {pool_time:9.3f}")
+
+
+def benchmark_scan_orders(image_path, levels=(2, 3, 5)):
+    """Compression ratio and throughput of the container levels for every scan order.
+
+    "index" is the time to build the (then cached) permutation of the image
+    shape; the throughputs are measured with the permutation cached.
+    """
+    img = image_tools.readPILimg(image_path)
+    images = {2: image_tools.PIL2np(image_tools.color2gray(img)),
+              4: image_tools.PIL2np(img.convert("RGB"))}
+    print(f"{'level':>5} {'order':>10} {'ratio':>7} {'index':>7} {'enc MB/s':>9} {'dec MB/s':>9}")
+    for level in levels:
+        data = images[2 if level in (2, 3) else 4]
+        megabytes = data.nbytes / 1e6
+        for order in lzw_scan.ORDERS:
+            lzw_scan.scan_indices.cache_clear()
+            lzw_scan.inverse_indices.cache_clear()
+            _, index_time = timed(lzw_scan.scan_indices, order, *data.shape[:2])
+            blob, enc_time = timed(lzw_api.compress, data, level, scan=order)
+            decoded, dec_time = timed(lzw_api.decompress, blob)
+            assert np.array_equal(decoded, data), f"level {level} {order}: round trip failed"
+            print(f"{level:5} {order:>10} {data.nbytes / len(blob):7.3f} {index_time:7.3f} "
+                  f"{megabytes / enc_time:9.1f} {megabytes / dec_time:9.1f}")
+
+
+def main():
+    image_path = "big_image.bmp"
+    print(f"Numba available: {lzw_numba.HAVE_NUMBA}")
+
+    # The first call compiles the kernels, or loads them from the cache=True
+    # on-disk cache when a previous run already compiled them
+    _, warm_up_time = timed(lzw_numba.warm_up)
+    print(f"Warm-up (compile or cache load): {warm_up_time:.3f} s")
+
+    print(f"{'case':34} {'ref enc':>9} {'ref dec':>9} {'arr enc':>9} {'arr dec':>9} {'speedup':>8}")
+    for name, symbols, ref_encode, ref_decode, max_size, offset in load_cases(image_path):
+        codes, enc_time = timed(lzw_numba.compress_lzw, symbols, 256, max_size)
+        decoded, dec_time = timed(lzw_numba.decompress_lzw, codes, 256, max_size,
+                                  dtype=np.uint8)
+        assert np.array_equal(decoded, symbols.ravel()), f"{name}: round trip failed"
+
+        if ref_encode is None:
+            print(f"{name:34} {'-':>9} {'-':>9} {enc_time:9.3f} {dec_time:9.3f} {'-':>8}")
+            continue
+
+        ref_codes, ref_enc_time = timed(ref_encode)
+        assert codes.tolist() == ref_codes, f"{name}: codes differ from reference"
+        ref_decoded, ref_dec_time = timed(ref_decode, list(ref_codes))
+        assert np.array_equal(np.array(ref_decoded) + offset, symbols.ravel())
+
+        speedup = (ref_enc_time + ref_dec_time) / (enc_time + dec_time)
+        print(f"{name:34} {ref_enc_time:9.3f} {ref_dec_time:9.3f} "
+              f"{enc_time:9.3f} {dec_time:9.3f} {speedup:7.1f}x")
+
+    print()
+    benchmark_segments(image_path)
+
+    print()
+    benchmark_scan_orders(image_path)
+
+
+if __name__ == "__main__":
+    main()
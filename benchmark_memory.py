@@ -0,0 +1,82 @@
+"""Peak memory guard for the level 3 and level 5 decoders (Linux only).
+
+A test image is made by tiling big_image.bmp and compressed with both
+levels. Each file is then decoded in a fresh interpreter that resets its
+peak RSS (VmHWM) right before the decode. The growth of the peak over the
+RSS at that point is compared to the size of the decoded image. Fails
+(exit code 1) when a decoder needs more than the budget.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+import image_tools
+import lzw_logging
+import level3_compression
+import level5_compression
+
+TILES = 3
+MEMORY_BUDGET = 3.5  # Peak RSS growth as a multiple of the decoded image size
+
+MEASURE = """
+import sys
+import lzw_numba
+import {module}
+
+def status(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) * 1024
+
+lzw_numba.warm_up()
+with open("/proc/self/clear_refs", "w") as f:
+    f.write("5")  # Reset the peak RSS to the current RSS
+before = status("VmRSS")
+assert {module}.decompress_image_file(sys.argv[1]) is not None
+print(status("VmHWM") - before)
+"""
+
+
+def peak_growth(module, compressed_file_path):
+    """Bytes the peak RSS grows by while `module` decodes the file in a fresh interpreter."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, "-c", MEASURE.format(module=module),
+                             compressed_file_path],
+                            capture_output=True, text=True, check=True, cwd=here)
+    return int(result.stdout.split()[-1])
+
+
+def main():
+    lzw_logging.configure("WARNING")
+    rgb = image_tools.PIL2np(image_tools.readPILimg("big_image.bmp").convert("RGB"))
+    rgb = np.tile(rgb, (TILES, TILES, 1))
+    height, width, _ = rgb.shape
+    print(f"Test image: {width}x{height}")
+
+    failed = False
+    with tempfile.TemporaryDirectory() as directory:
+        image_path = os.path.join(directory, "tiled.bmp")
+        image_tools.np2PIL(rgb).save(image_path)
+        jobs = [("level3_decompression", level3_compression.compress_image_file(image_path),
+                 width * height),
+                ("level5_decompression", level5_compression.compress_image_file(image_path),
+                 3 * width * height)]
+        for module, compressed_file_path, image_bytes in jobs:
+            growth = peak_growth(module, compressed_file_path)
+            ratio = growth / image_bytes
+            print(f"{module}: peak RSS +{growth / 2 ** 20:.1f} MiB, "
+                  f"{ratio:.2f}x the {image_bytes / 2 ** 20:.1f} MiB image")
+            if ratio > MEMORY_BUDGET:
+                print(f"FAIL: {module} needs more than {MEMORY_BUDGET}x the image size")
+                failed = True
+
+    if failed:
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
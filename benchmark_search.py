@@ -0,0 +1,86 @@
+"""Compressed-domain search against decompress-then-search on a large log.
+
+A synthetic log of about SIZE_MB megabytes is coded as a level 1 block file.
+Every pattern is then searched with lzw_search.search() and by decoding the
+whole file (lzw_blocks.decode) and scanning it with bytes.find; both must
+report the same (line, offset) hits.
+
+    python benchmark_search.py [size in MB]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+import lzw_blocks
+import lzw_numba
+import lzw_search
+
+SIZE_MB = 256
+BLOCK_SIZE = 1024 * 1024
+PATTERNS = ["ERROR", "request 2424242", "timeout after 30 s", "user=alice"]
+
+
+def make_log(size):
+    """Log-like text of about `size` bytes."""
+    rng = random.Random(0)
+    levels = ["INFO"] * 90 + ["WARN"] * 8 + ["ERROR"] * 2
+    users = ["alice", "bob", "carol", "dave", "erin"]
+    lines = []
+    total = 0
+    i = 0
+    while total < size:
+        line = (f"2026-10-19T{i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d} "
+                f"{rng.choice(levels)} worker-{rng.randrange(16)} request {i} "
+                f"user={rng.choice(users)} took {rng.randrange(1, 2000)} ms\n")
+        if rng.random() < 0.001:
+            line = line[:-1] + " timeout after 30 s\n"
+        lines.append(line)
+        total += len(line)
+        i += 1
+    return "".join(lines).encode("utf-8")
+
+
+def decode_and_search(path, pattern):
+    """Hits found by decoding the whole file and scanning the text."""
+    data = lzw_blocks.decode(path)
+    pattern = pattern.encode("utf-8")
+    hits = []
+    line = 1
+    previous = 0
+    position = data.find(pattern)
+    while position >= 0:
+        line += data.count(b"\n", previous, position)
+        previous = position
+        hits.append((line, position))
+        position = data.find(pattern, position + 1)
+    return hits
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    size_mb = float(sys.argv[1]) if len(sys.argv) > 1 else SIZE_MB
+    lzw_numba.warm_up()
+    data = make_log(int(size_mb * 1024 * 1024))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "log_compressed.lzw")
+        _, compress_time = timed(lzw_blocks.write_file, path, data, BLOCK_SIZE)
+        print(f"Log: {len(data) / 2 ** 20:.0f} MiB, compressed to "
+              f"{os.path.getsize(path) / 2 ** 20:.0f} MiB in {compress_time:.1f} s")
+        del data
+        print(f"{'pattern':22} {'hits':>8} {'search':>8} {'decode+find':>12} {'speedup':>8}")
+        for pattern in PATTERNS:
+            hits, search_time = timed(lzw_search.search, path, pattern)
+            expected, baseline_time = timed(decode_and_search, path, pattern)
+            assert hits == expected, f"{pattern}: results differ"
+            print(f"{pattern:22} {len(hits):8} {search_time:7.2f}s {baseline_time:11.2f}s "
+                  f"{baseline_time / search_time:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Startup-time guard for short text jobs, based on ``python -X importtime``.
+
+Fails (exit code 1) when the level 1 path of lzw_cli imports a heavy module
+or its imports take longer than the budget.
+"""
+import subprocess
+import sys
+
+HEAVY_MODULES = ("numpy", "PIL", "cv2", "numba")
+IMPORT_BUDGET_MS = 50
+
+
+def import_times(statement):
+    """Run statement in a fresh interpreter; returns [(cumulative us, module)] of all imports."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            capture_output=True, text=True, check=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        # Nested imports are indented below the module that imported them
+        imports.append((int(cumulative_us), name[1:].rstrip()))
+    return imports
+
+
+def report(title, statement):
+    """Print the slowest imports of a job; returns (total ms, heavy modules imported)."""
+    imports = import_times(statement)
+    # Top-level imports are the ones not indented under another import
+    top_level = [(us, name) for us, name in imports if not name.startswith(" ")]
+    total_ms = sum(us for us, _ in top_level) / 1000
+    heavy = sorted({name.strip().split(".")[0] for _, name in imports
+                    if name.strip().split(".")[0] in HEAVY_MODULES})
+    print(f"{title}: {total_ms:.1f} ms of imports, heavy modules: {', '.join(heavy) or 'none'}")
+    for us, name in sorted(top_level, reverse=True)[:5]:
+        print(f"    {us / 1000:8.1f} ms  {name.strip()}")
+    return total_ms, heavy
+
+
+def main():
+    text_ms, text_heavy = report(
+        "Level 1 (text)",
+        "import lzw_cli; lzw_cli.load_function(1, 'compress'); lzw_cli.load_function(1, 'decompress')")
+    report("Level 5 (color difference)",
+           "import lzw_cli; lzw_cli.load_function(5, 'compress'); lzw_cli.load_function(5, 'decompress')")
+
+    if text_heavy:
+        print(f"FAIL: text jobs import {', '.join(text_heavy)}")
+        return 1
+    if text_ms > IMPORT_BUDGET_MS:
+        print(f"FAIL: text job imports take {text_ms:.1f} ms (budget {IMPORT_BUDGET_MS} ms)")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2 @@
+# load_test.py is a load generator for lzw_server, not a test module
+collect_ignore = ["load_test.py"]
@@ -1,3 +1,4 @@
+import sys
 from PIL import Image
 import numpy as np
 
@@ -50,3 +51,113 @@ def np2PIL(image):
 
 def arr_to_PIL(arr):
     return Image.fromarray(arr)
+
+
+def read_gray_array(path):
+    """Grayscale pixels of an image file or a 2-D .npy array.
+
+    8-bit images give uint8 (color is converted to gray); 16-bit images
+    (PIL modes I;16 and I, e.g. 12- or 16-bit PNG and TIFF) and uint16
+    arrays give uint16 without any loss.
+    """
+    if path.lower().endswith(".npy"):
+        arr = np.load(path)
+        if arr.ndim != 2 or arr.dtype not in (np.uint8, np.uint16):
+            raise ValueError(f"Expected a 2-D uint8 or uint16 array, got {arr.ndim}-D {arr.dtype}")
+        return arr
+    img = readPILimg(path)
+    if img.mode.startswith("I"):
+        arr = np.array(img)
+        if arr.size and (arr.min() < 0 or arr.max() > 65535):
+            raise ValueError(f"Pixel values of mode {img.mode} do not fit in 16 bits")
+        return arr.astype(np.uint16)
+    if img.mode != "L":
+        img = color2gray(img)
+    return PIL2np(img)
+
+
+def byte_planes(arr):
+    """(2, height, width) uint8 high and low bytes of a uint16 array."""
+    return np.stack([arr >> 8, arr & 0xFF]).astype(np.uint8)
+
+
+def join_byte_planes(planes):
+    """uint16 array from the high and low byte planes made by byte_planes."""
+    return (planes[0].astype(np.uint16) << 8) | planes[1]
+
+
+def difference_image16(arr):
+    """Lossless difference image of a uint16 array, zigzag coded.
+
+    Residuals are taken mod 2^16 from the left neighbour (the pixel above in
+    the first column), then mapped 0, -1, 1, -2, ... to 0, 1, 2, 3, ... so
+    small residuals of either sign leave the high byte at zero.
+    """
+    prediction = np.zeros_like(arr)
+    prediction[:, 1:] = arr[:, :-1]
+    prediction[1:, 0] = arr[:-1, 0]
+    diff = (arr - prediction).view(np.int16)
+    return ((diff << 1) ^ (diff >> 15)).view(np.uint16)
+
+
+def restore_differences16(zigzag):
+    """Undo difference_image16 (uint16 arithmetic wraps mod 2^16)."""
+    zigzag = zigzag.astype(np.uint16)
+    diff = (zigzag >> 1) ^ (-(zigzag & 1)).astype(np.uint16)
+    np.cumsum(diff[:, 0], dtype=np.uint16, out=diff[:, 0])
+    np.cumsum(diff, axis=1, dtype=np.uint16, out=diff)
+    return diff
+
+
+def restore_differences(diff, block_rows=16):
+    """Undo the level 3/5 difference transform in place and clip to 0-255.
+
+    diff has shape (..., height, width): the first column is a running sum
+    down the rows, then every row a running sum along it. Sums are taken in
+    int32 a block of rows at a time, so corrupt residuals cannot overflow an
+    int16 buffer and the only extra memory is one block.
+    """
+    first_column = np.cumsum(diff[..., 0], axis=-1, dtype=np.int32)
+    for start in range(0, diff.shape[-2], block_rows):
+        rows = slice(start, start + block_rows)
+        block = diff[..., rows, :].astype(np.int32)
+        block[..., 0] = first_column[..., rows]
+        np.cumsum(block, axis=-1, out=block)
+        np.clip(block, 0, 255, out=block)
+        diff[..., rows, :] = block
+    return diff
+
+
+def uint8_view(arr):
+    """uint8 view of the low bytes of an integer array holding 0-255.
+
+    The view itself copies nothing, but it is strided, so PIL (or anything
+    needing contiguous data) makes one uint8 copy of it.
+    """
+    low = 0 if sys.byteorder == "little" else arr.itemsize - 1
+    return arr.view(np.uint8)[..., low::arr.itemsize]
+
+
+def entropy(symbols, alphabet=256):
+    """Shannon entropy in bits per symbol of an array of integers in [0, alphabet)."""
+    counts = np.bincount(np.asarray(symbols).ravel(), minlength=alphabet)
+    p = counts[counts > 0] / max(counts.sum(), 1)
+    return float(-(p * np.log2(p)).sum())
+
+
+def pack_pixels(img):
+    """(H, W, 3) uint8 RGB pixels as (H, W) uint32 values 0xRRGGBB."""
+    img = img.astype(np.uint32)
+    return (img[:, :, 0] << 16) | (img[:, :, 1] << 8) | img[:, :, 2]
+
+
+def unpack_pixels(packed):
+    """Inverse of pack_pixels: uint32 values 0xRRGGBB to uint8 RGB pixels."""
+    return np.stack([(packed >> shift) & 0xFF for shift in (16, 8, 0)], axis=-1).astype(np.uint8)
+
+
+def palette_indices(img):
+    """(palette, indices): the distinct colors of an RGB image, sorted, as an (n, 3)
+    uint8 array and the (H, W) int32 palette index of every pixel."""
+    colors, inverse = np.unique(pack_pixels(img).ravel(), return_inverse=True)
+    return unpack_pixels(colors), inverse.astype(np.int32).reshape(img.shape[:2])
@@ -0,0 +1,145 @@
+"""Instrumentation for the compression pipeline.
+
+Code paths report per-stage timings and counters through stage() and
+count(); both are no-ops unless a collect() block is active, so the
+overhead outside of measurements is one context variable lookup.
+
+    with instrumentation.collect("big_image.bmp") as metrics:
+        level5_compression.compress_image_file("big_image.bmp")
+    print(metrics.to_json())
+
+Stages: load, transform, lzw, pack, unpack, write. Counters include
+symbols_in, codes_emitted, dictionary_fills, bytes_in and bytes_out.
+
+Set LZW_PROFILE=cprofile, tracemalloc or cprofile,tracemalloc (or pass
+profile=...) to also capture a cProfile summary and peak traced memory.
+"""
+import contextvars
+import io
+import json
+import os
+import time
+from contextlib import contextmanager
+
+_active = contextvars.ContextVar("lzw_metrics", default=None)
+
+
+class Metrics:
+    """Timers and counters collected for one job."""
+
+    def __init__(self, label=None):
+        self.label = label
+        self.stages = {}
+        self.counters = {}
+        self.total = 0.0
+        self.profile = None
+        self.memory = None
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self):
+        result = {"label": self.label, "total_seconds": round(self.total, 6),
+                  "stages": {name: round(seconds, 6) for name, seconds in self.stages.items()},
+                  "counters": dict(self.counters)}
+        if self.profile is not None:
+            result["profile"] = self.profile
+        if self.memory is not None:
+            result["memory"] = self.memory
+        return result
+
+    def to_json(self, indent=None):
+        return json.dumps(self.as_dict(), indent=indent)
+
+
+def current():
+    """The Metrics being collected in this context, or None."""
+    return _active.get()
+
+
+@contextmanager
+def stage(name):
+    """Time a pipeline stage if metrics are being collected."""
+    metrics = _active.get()
+    if metrics is None:
+        yield
+        return
+    with metrics.stage(name):
+        yield
+
+
+def count(name, value=1):
+    """Add to a counter if metrics are being collected."""
+    metrics = _active.get()
+    if metrics is not None:
+        metrics.count(name, value)
+
+
+def count_lzw(symbol_count, code_count, alphabet=256, max_size=4096):
+    """Counters for one LZW stream; the dictionary filled up if it ran out of codes."""
+    metrics = _active.get()
+    if metrics is None:
+        return
+    metrics.count("symbols_in", int(symbol_count))
+    metrics.count("codes_emitted", int(code_count))
+    # Every code but the last adds a dictionary entry until the limit is reached
+    if code_count - 1 >= max_size - alphabet:
+        metrics.count("dictionary_fills")
+
+
+@contextmanager
+def collect(label=None, callback=None, profile=None):
+    """Collect metrics for the code run inside the block.
+
+    callback, if given, receives the metrics dictionary at the end. profile
+    defaults to the LZW_PROFILE environment variable.
+    """
+    if profile is None:
+        profile = os.environ.get("LZW_PROFILE", "")
+    metrics = Metrics(label)
+    token = _active.set(metrics)
+
+    profiler = None
+    if "cprofile" in profile:
+        import cProfile
+        profiler = cProfile.Profile()
+    tracing = False
+    if "tracemalloc" in profile:
+        import tracemalloc
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            tracing = True
+
+    start = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield metrics
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        metrics.total = time.perf_counter() - start
+        _active.reset(token)
+
+        if profiler is not None:
+            import pstats
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(15)
+            metrics.profile = stream.getvalue()
+        if tracing:
+            import tracemalloc
+            current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics("lineno")[:5]
+            tracemalloc.stop()
+            metrics.memory = {"peak_bytes": peak_bytes, "current_bytes": current_bytes,
+                              "top": [str(statistic) for statistic in top]}
+        if callback is not None:
+            callback(metrics.as_dict())
@@ -1,5 +1,9 @@
 import os
 import math
+import instrumentation
+import lzw_logging
+
+logger = lzw_logging.get_logger(__name__)
 
 def compress(uncompressed):
     """Compress a string to a list of output symbols."""
@@ -47,7 +51,7 @@ def pad_encoded_text(encoded_text):
 def get_byte_array(padded_encoded_text):
     """Convert padded binary string to byte array."""
     if (len(padded_encoded_text) % 8 != 0):
-        print("Encoded text not padded properly")
+        logger.info("Encoded text not padded properly")
         exit(0)
     b = bytearray()
     for i in range(0, len(padded_encoded_text), 8):
@@ -61,12 +65,12 @@ def compress_text(file_path, code_length=12):
     with open(file_path, 'r', encoding='utf-8') as file:
         text = file.read()
     
-    print(f"Original text length: {len(text)} characters")
+    logger.info(f"Original text length: {len(text)} characters")
     
     # Compress the text
     compressed_codes = compress(text)
     
-    print(f"Number of compressed codes: {len(compressed_codes)}")
+    logger.info(f"Number of compressed codes: {len(compressed_codes)}")
     
     # Convert to binary string
     binary_string = int_array_to_binary_string(compressed_codes, code_length)
@@ -90,62 +94,85 @@ def compress_text(file_path, code_length=12):
     compression_factor = original_size / compressed_size
     space_saving = 1 - compression_ratio
     
-    print(f"Original file size: {original_size} bytes")
-    print(f"Compressed file size: {compressed_size} bytes")
-    print(f"Compression Ratio (CR): {compression_ratio:.4f}")
-    print(f"Compression Factor (CF): {compression_factor:.4f}")
-    print(f"Space Saving (SS): {space_saving:.4f} ({space_saving*100:.2f}%)")
+    logger.info(f"Original file size: {original_size} bytes")
+    logger.info(f"Compressed file size: {compressed_size} bytes")
+    logger.info(f"Compression Ratio (CR): {compression_ratio:.4f}")
+    logger.info(f"Compression Factor (CF): {compression_factor:.4f}")
+    logger.info(f"Space Saving (SS): {space_saving:.4f} ({space_saving*100:.2f}%)")
     
     return compressed_file_path
 
-def compress_text_file(input_file_path):
-    """Compress the text file using LZW compression for GUI compatibility"""
-    print(f"GUI Compression Started: {input_file_path}")
+def compress_text_file(input_file_path, block_size=0):
+    """Compress the text file using LZW compression for GUI compatibility
+    
+    With `block_size` set the file is coded in independent blocks of about
+    that many bytes with an index for random access (see lzw_blocks).
+    """
+    logger.info(f"GUI Compression Started: {input_file_path}")
     
     # Create .lzw file path for GUI compatibility
     output_file_path = os.path.splitext(input_file_path)[0] + "_compressed.lzw"
     
     try:
+        if block_size:
+            import lzw_blocks  # Loads NumPy, so only for block files
+            with instrumentation.stage("load"):
+                with open(input_file_path, 'rb') as file:
+                    data = file.read()
+            with instrumentation.stage("lzw"):
+                compressed_size = lzw_blocks.write_file(output_file_path, data, block_size)
+            instrumentation.count("bytes_in", len(data))
+            instrumentation.count("bytes_out", compressed_size)
+            logger.info(f"Compressed {len(data)} bytes to {compressed_size} in blocks of {block_size}")
+            return output_file_path
+        
         # Read the text file
-        with open(input_file_path, 'r', encoding='utf-8') as file:
-            text = file.read()
+        with instrumentation.stage("load"):
+            with open(input_file_path, 'r', encoding='utf-8') as file:
+                text = file.read()
         
-        print(f"File read, length: {len(text)} characters")
+        logger.info(f"File read, length: {len(text)} characters")
         
         # Compress the text using the existing compress function
-        compressed_codes = compress(text)
+        with instrumentation.stage("lzw"):
+            compressed_codes = compress(text)
+        instrumentation.count("symbols_in", len(text))
+        instrumentation.count("codes_emitted", len(compressed_codes))
         
-        print(f"Compression completed, {len(compressed_codes)} codes")
+        logger.info(f"Compression completed, {len(compressed_codes)} codes")
         
         # Save the compressed data in .lzw format that GUI expects
-        with open(output_file_path, 'wb') as file:
-            # Save the original text length (4 bytes)
-            file.write(len(text).to_bytes(4, byteorder='big'))
-            
-            # Save each code (4 bytes each)
-            for code in compressed_codes:
-                file.write(code.to_bytes(4, byteorder='big'))
+        with instrumentation.stage("write"):
+            with open(output_file_path, 'wb') as file:
+                # Save the original text length (4 bytes)
+                file.write(len(text).to_bytes(4, byteorder='big'))
+                
+                # Save each code (4 bytes each)
+                file.write(b"".join(code.to_bytes(4, byteorder='big') for code in compressed_codes))
         
-        print(f"File successfully saved: {output_file_path}")
+        logger.info(f"File successfully saved: {output_file_path}")
         
         # Calculate compression metrics
         original_size = os.path.getsize(input_file_path)
         compressed_size = os.path.getsize(output_file_path)
-        print(f"Original size: {original_size} bytes")
-        print(f"Compressed size: {compressed_size} bytes")
+        instrumentation.count("bytes_in", original_size)
+        instrumentation.count("bytes_out", compressed_size)
+        logger.info(f"Original size: {original_size} bytes")
+        logger.info(f"Compressed size: {compressed_size} bytes")
         
         return output_file_path
     
     except Exception as e:
-        print(f"Compression error: {str(e)}")
+        logger.error(f"Compression error: {str(e)}")
         return None
 
 def main():
     # Compress the text file
     file_path = "long_text.txt"
-    print("Compressing text file...")
+    logger.info("Compressing text file...")
     compressed_file = compress_text(file_path)
-    print(f"Text file compressed and saved as {compressed_file}")
+    logger.info(f"Text file compressed and saved as {compressed_file}")
 
 if __name__ == "__main__":
+    lzw_logging.configure()
     main() 
\ No newline at end of file
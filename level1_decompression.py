@@ -1,8 +1,21 @@
 import os
+import instrumentation
+import lzw_logging
 
-def decompress(compressed):
-    """Decompress a list of output ks to a string."""
+logger = lzw_logging.get_logger(__name__)
+
+BLOCK_MAGIC = b"LZWT"  # lzw_blocks.MAGIC, checked without importing NumPy
+
+def decompress(compressed, max_dict_size=65536, strict=False, errors=None):
+    """Decompress a list of output ks to a string (max_dict_size=None: no limit).
+    
+    Bad codes are skipped and counted in `errors` (a lzw_logging.DecodeErrors);
+    with `strict` set the first one raises lzw_logging.DecodeError instead.
+    """
     from io import StringIO
+    own_errors = errors is None
+    if own_errors:
+        errors = lzw_logging.DecodeErrors(strict, logger)
     # Build the dictionary.
     dict_size = 256
     dictionary = {i: chr(i) for i in range(dict_size)}
@@ -23,37 +36,39 @@ def decompress(compressed):
             entry = w + w[0]
         else:
             # Daha güvenli bir yaklaşım - hata fırlatmak yerine atla
-            print(f'Warning: Bad compressed code: {k}, skipping')
+            errors.report("bad_codes", "Bad compressed code: %d", k)
             continue
             
         result.write(entry)
         
-        if dict_size < 65536:  # 2^16 sınırlaması
+        if max_dict_size is None or dict_size < max_dict_size:  # 2^16 sınırlaması
             # Add w+entry[0] to the dictionary.
             dictionary[dict_size] = w + entry[0]
             dict_size += 1
             
         w = entry
-        
+    
+    if own_errors:
+        errors.summary()
     return result.getvalue()
 
 def remove_padding(padded_encoded_text, code_length):
     """Remove padding from the encoded text and convert to integer codes."""
     if len(padded_encoded_text) < 8:
-        print("Warning: Padded text too short")
+        logger.warning("Padded text too short")
         return []
         
     padded_info = padded_encoded_text[:8]
     try:
         extra_padding = int(padded_info, 2)
     except ValueError:
-        print(f"Warning: Invalid padding info: {padded_info}")
+        logger.warning(f"Invalid padding info: {padded_info}")
         extra_padding = 0
         
     padded_encoded_text = padded_encoded_text[8:]
     
     if extra_padding > len(padded_encoded_text):
-        print(f"Warning: Invalid padding value: {extra_padding} > {len(padded_encoded_text)}")
+        logger.warning(f"Invalid padding value: {extra_padding} > {len(padded_encoded_text)}")
         extra_padding = 0
         
     encoded_text = padded_encoded_text[:-1 * extra_padding] if extra_padding > 0 else padded_encoded_text
@@ -65,12 +80,72 @@ def remove_padding(padded_encoded_text, code_length):
                 code = int(encoded_text[bits:bits+code_length], 2)
                 int_codes.append(code)
             except ValueError:
-                print(f"Warning: Invalid bit sequence: {encoded_text[bits:bits+code_length]}")
+                logger.warning(f"Invalid bit sequence: {encoded_text[bits:bits+code_length]}")
                 
     return int_codes
 
-def decompress_text_file(compressed_file_path):
-    """Decompress a text file compressed with LZW"""
+def decompress_block_text_file(compressed_file_path, strict=False, workers=None):
+    """Decompress a block .lzw file, blocks in parallel threads"""
+    import lzw_blocks
+    errors = lzw_logging.DecodeErrors(strict, logger)
+    with instrumentation.stage("lzw"):
+        data = lzw_blocks.decode(compressed_file_path, errors, workers)
+    errors.summary()
+    instrumentation.count("bytes_in", os.path.getsize(compressed_file_path))
+    
+    decompressed_file_path = os.path.splitext(compressed_file_path)[0].replace("_compressed", "_decompressed") + ".txt"
+    with instrumentation.stage("write"):
+        with open(decompressed_file_path, 'wb') as file:
+            file.write(data)
+    instrumentation.count("bytes_out", len(data))
+    return decompressed_file_path
+
+def decompress_lzw_text_file(compressed_file_path, strict=False):
+    """Decompress a .lzw file written by compress_text_file (length + 4-byte codes)"""
+    with instrumentation.stage("load"):
+        with open(compressed_file_path, 'rb') as file:
+            text_length = int.from_bytes(file.read(4), byteorder='big')
+            data = file.read()
+        codes = [int.from_bytes(data[i:i + 4], byteorder='big') for i in range(0, len(data) - 3, 4)]
+    instrumentation.count("bytes_in", len(data) + 4)
+    instrumentation.count("codes_in", len(codes))
+    
+    # compress_text_file does not limit the dictionary size
+    errors = lzw_logging.DecodeErrors(strict, logger)
+    with instrumentation.stage("lzw"):
+        decompressed_text = decompress(codes, max_dict_size=None, errors=errors)
+    if len(decompressed_text) != text_length:
+        errors.report("length_mismatch", "Got %d characters, expected %d",
+                      len(decompressed_text), text_length)
+    errors.summary()
+    
+    decompressed_file_path = os.path.splitext(compressed_file_path)[0].replace("_compressed", "_decompressed") + ".txt"
+    with instrumentation.stage("write"):
+        with open(decompressed_file_path, 'w', encoding='utf-8') as file:
+            file.write(decompressed_text)
+    instrumentation.count("bytes_out", len(decompressed_text))
+    return decompressed_file_path
+
+def decompress_text_file(compressed_file_path, strict=False, workers=None):
+    """Decompress a text file compressed with LZW
+    
+    With `strict` set the first bad code raises lzw_logging.DecodeError
+    instead of being skipped; other failures return None.
+    """
+    # .lzw files come from compress_text_file and use fixed 4-byte codes, or blocks
+    if compressed_file_path.endswith(".lzw"):
+        try:
+            with open(compressed_file_path, 'rb') as file:
+                blocked = file.read(len(BLOCK_MAGIC)) == BLOCK_MAGIC
+            if blocked:
+                return decompress_block_text_file(compressed_file_path, strict, workers)
+            return decompress_lzw_text_file(compressed_file_path, strict)
+        except lzw_logging.DecodeError:
+            raise  # Strict mode: let the caller see the bad code
+        except Exception as e:
+            logger.error(f"Decompression failed: {e}")
+            return None
+    
     # Determine code length
     # Try different code lengths to see which one works best
     for code_length in [12, 10, 14, 16]:
@@ -90,11 +165,11 @@ def decompress_text_file(compressed_file_path):
             
             # Skip if no codes were extracted
             if not int_codes:
-                print(f"No valid codes found with code_length={code_length}, trying another")
+                logger.debug(f"No valid codes found with code_length={code_length}, trying another")
                 continue
                 
             # Decompress
-            decompressed_text = decompress(int_codes.copy())
+            decompressed_text = decompress(int_codes.copy(), strict=strict)
             
             # Save the decompressed text
             filename, file_extension = os.path.splitext(compressed_file_path)
@@ -103,26 +178,29 @@ def decompress_text_file(compressed_file_path):
             with open(decompressed_file_path, 'w', encoding='utf-8') as file:
                 file.write(decompressed_text)
             
-            print(f"Successfully decompressed with code_length={code_length}")
+            logger.info(f"Successfully decompressed with code_length={code_length}")
             return decompressed_file_path
             
+        except lzw_logging.DecodeError:
+            raise  # Strict mode: a bad code is not a reason to guess another code length
         except Exception as e:
-            print(f"Failed with code_length={code_length}: {e}")
+            logger.debug(f"Failed with code_length={code_length}: {e}")
     
     # If we get here, all attempts failed
-    print("All decompression attempts failed")
+    logger.error("All decompression attempts failed")
     return None
 
 def main():
     # Decompress the compressed file
     compressed_file_path = "long_text_compressed.bin"
-    print("Decompressing compressed file...")
+    logger.info("Decompressing compressed file...")
     decompressed_file = decompress_text_file(compressed_file_path)
     
     if decompressed_file:
-        print(f"Compressed file decompressed and saved as {decompressed_file}")
+        logger.info(f"Compressed file decompressed and saved as {decompressed_file}")
     else:
-        print("Decompression failed")
+        logger.error("Decompression failed")
 
 if __name__ == "__main__":
+    lzw_logging.configure()
     main() 
\ No newline at end of file
@@ -3,7 +3,12 @@ import math
 import numpy as np
 from PIL import Image
 import image_tools
-import cv2
+import lzw_numba
+import lzw_segments
+import instrumentation
+import lzw_logging
+
+logger = lzw_logging.get_logger(__name__)
 
 def calculate_entropy(pixel_values):
     """Calculate the entropy of the image."""
@@ -56,43 +61,64 @@ def compress_lzw(data):
     
     return result
 
-def compress_image_file(input_file_path):
-    # Read the image
-    img = cv2.imread(input_file_path, cv2.IMREAD_GRAYSCALE)
-    if img is None:
-        print("Could not read image!")
-        return None
+def compress_image_file(input_file_path, segments=1):
+    """Compress an image file as grayscale.
+    
+    With `segments` > 1 the rows are split into that many independently coded
+    bands (see lzw_segments) so decompression can run on several processes.
+    16-bit images (and uint16 .npy arrays) are coded losslessly as a high
+    and a low byte plane.
+    """
+    # Read the image as grayscale (PIL is enough, no OpenCV needed)
+    with instrumentation.stage("load"):
+        try:
+            img = image_tools.read_gray_array(input_file_path)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read image! {e}")
+            return None
     
     # Image dimensions
     height, width = img.shape
-    print(f"Image dimensions: {width}x{height}")
-    
-    # Flatten the image and convert to list
-    flat_img = img.flatten().tolist()
+    logger.info(f"Image dimensions: {width}x{height}")
     
-    # LZW compression
+    # LZW compression (array-based, JIT-compiled when Numba is installed)
     try:
-        compressed_data = compress_lzw(flat_img)
+        output_file_path = os.path.splitext(input_file_path)[0] + "_compressed.lzw"
+        if segments > 1 or img.dtype == np.uint16:
+            # 16-bit images always use the segmented layout, with one byte plane per 8 bits
+            planes = image_tools.byte_planes(img) if img.dtype == np.uint16 else img[np.newaxis]
+            with instrumentation.stage("lzw"):
+                first_rows, streams = lzw_segments.compress_rows(planes, segments, 256, 65535)
+            with instrumentation.stage("write"):
+                size = lzw_segments.write_file(output_file_path, 2, width, height, first_rows,
+                                               streams, len(planes))
+            instrumentation.count("bytes_in", img.nbytes)
+            instrumentation.count("bytes_out", size)
+            logger.info(f"Image compressed in {len(streams)} segments: {output_file_path}")
+            return output_file_path
+        
+        with instrumentation.stage("lzw"):
+            compressed_data = lzw_numba.compress_lzw(img, max_size=65535)
+        instrumentation.count_lzw(img.size, len(compressed_data), 256, 65535)
         
         # Save the compressed data
-        output_file_path = os.path.splitext(input_file_path)[0] + "_compressed.lzw"
-        with open(output_file_path, 'wb') as f:
-            # Write width and height (4 bytes each)
-            f.write(width.to_bytes(4, byteorder='big'))
-            f.write(height.to_bytes(4, byteorder='big'))
-            
-            # Write compressed data - USE ONLY 2 BYTES!
-            for value in compressed_data:
-                # Use 16-bit (2 bytes) to prevent overflow
-                if value > 65535:
-                    value = 65535  # Limit if value is too large
-                f.write(value.to_bytes(2, byteorder='big'))
+        with instrumentation.stage("write"):
+            with open(output_file_path, 'wb') as f:
+                # Write width and height (4 bytes each)
+                f.write(width.to_bytes(4, byteorder='big'))
+                f.write(height.to_bytes(4, byteorder='big'))
+                
+                # Write compressed data - USE ONLY 2 BYTES!
+                # Codes never exceed 65534 because the dictionary stops at 65535
+                f.write(compressed_data.astype('>u2').tobytes())
+        instrumentation.count("bytes_in", img.nbytes)
+        instrumentation.count("bytes_out", 8 + 2 * len(compressed_data))
         
-        print(f"Image compressed successfully: {output_file_path}")
+        logger.info(f"Image compressed successfully: {output_file_path}")
         return output_file_path
     
     except Exception as e:
-        print(f"Compression error: {e}")
+        logger.error(f"Compression error: {e}")
         return None
 
 def main():
@@ -103,9 +129,9 @@ def main():
     # Convert to grayscale if not already
     if img.mode != "L":
         img = image_tools.color2gray(img)
-        print(f"Image converted to grayscale. Size: {img.size}")
+        logger.info(f"Image converted to grayscale. Size: {img.size}")
     else:
-        print(f"Image is already grayscale. Size: {img.size}")
+        logger.info(f"Image is already grayscale. Size: {img.size}")
     
     # Get image dimensions
     width, height = img.size
@@ -114,20 +140,20 @@ def main():
     img_array = image_tools.PIL2np(img)
     pixel_values = img_array.flatten().tolist()
     
-    print(f"Original image dimensions: {width}x{height}")
-    print(f"Total pixels: {len(pixel_values)}")
+    logger.info(f"Original image dimensions: {width}x{height}")
+    logger.info(f"Total pixels: {len(pixel_values)}")
     
     # Calculate entropy of original image
     entropy = calculate_entropy(pixel_values)
-    print(f"Image entropy: {entropy:.4f} bits/pixel")
+    logger.info(f"Image entropy: {entropy:.4f} bits/pixel")
     
     # Compress the pixel values (construct LZW dictionary)
-    compressed_codes = compress_lzw(pixel_values)
+    compressed_codes = lzw_numba.compress_lzw(img_array, max_size=65535)
     
     # Calculate average code length
     code_length = 12  # Standard LZW code length
     avg_code_length = (len(compressed_codes) * code_length) / len(pixel_values)
-    print(f"Average code length: {avg_code_length:.4f} bits/pixel")
+    logger.info(f"Average code length: {avg_code_length:.4f} bits/pixel")
     
     # Save compressed data and image dimensions
     compressed_file_path = os.path.splitext(image_path)[0] + "_compressed.lzw"
@@ -135,8 +161,7 @@ def main():
         f.write(width.to_bytes(4, byteorder='big'))
         f.write(height.to_bytes(4, byteorder='big'))
         
-        for value in compressed_codes:
-            f.write(value.to_bytes(4, byteorder='big'))  # 4 byte kullandığınızdan emin olun
+        f.write(compressed_codes.astype('>u4').tobytes())  # 4 byte kullandığınızdan emin olun
     
     # Calculate compression ratio
     original_size = os.path.getsize(image_path)
@@ -145,13 +170,14 @@ def main():
     compression_factor = original_size / compressed_size
     space_saving = 1 - compression_ratio
     
-    print(f"Original file size: {original_size} bytes")
-    print(f"Compressed file size: {compressed_size} bytes")
-    print(f"Compression Ratio (CR): {compression_ratio:.4f}")
-    print(f"Compression Factor (CF): {compression_factor:.4f}")
-    print(f"Space Saving (SS): {space_saving:.4f} ({space_saving*100:.2f}%)")
+    logger.info(f"Original file size: {original_size} bytes")
+    logger.info(f"Compressed file size: {compressed_size} bytes")
+    logger.info(f"Compression Ratio (CR): {compression_ratio:.4f}")
+    logger.info(f"Compression Factor (CF): {compression_factor:.4f}")
+    logger.info(f"Space Saving (SS): {space_saving:.4f} ({space_saving*100:.2f}%)")
     
-    print(f"Image compressed and saved as {compressed_file_path}")
+    logger.info(f"Image compressed and saved as {compressed_file_path}")
 
 if __name__ == "__main__":
+    lzw_logging.configure()
     main() 
\ No newline at end of file
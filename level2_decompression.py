@@ -2,11 +2,25 @@ import os
 import numpy as np
 from PIL import Image
 import image_tools
+import lzw_numba
+import lzw_cache
+import lzw_segments
+import instrumentation
+import lzw_logging
 
-def decompress_lzw(compressed_data):
-    """LZW decompression algorithm with improved error handling"""
+logger = lzw_logging.get_logger(__name__)
+
+def decompress_lzw(compressed_data, strict=False, errors=None):
+    """LZW decompression algorithm with improved error handling
+    
+    Bad codes are repaired and counted in `errors` (a lzw_logging.DecodeErrors);
+    with `strict` set the first one raises lzw_logging.DecodeError instead.
+    """
     if not compressed_data:
         return []
+    own_errors = errors is None
+    if own_errors:
+        errors = lzw_logging.DecodeErrors(strict, logger)
     
     # Initialize dictionary
     dictionary = {i: [i] for i in range(256)}
@@ -15,7 +29,7 @@ def decompress_lzw(compressed_data):
     # Get the first code and decode
     current = compressed_data[0]
     if current >= 256:
-        print(f"Warning: First code {current} >= 256, setting to 0")
+        errors.report("bad_codes", "First code %d >= 256, setting to 0", current)
         current = 0
     
     result = [current]
@@ -34,7 +48,7 @@ def decompress_lzw(compressed_data):
                 entry = [0]  # Fallback if entry is empty
         else:
             # Invalid code - skip and continue
-            print(f"Warning: Code {code} not in dictionary and not next code {next_code}")
+            errors.report("bad_codes", "Code %d not in dictionary and not next code %d", code, next_code)
             # Try to recover by using a valid code
             if current in dictionary:
                 entry = dictionary[current].copy()
@@ -58,8 +72,16 @@ def decompress_lzw(compressed_data):
         
         current = code
     
+    if own_errors:
+        errors.summary()
     return result
 
+def read_codes(f):
+    """Read the remaining 16-bit big-endian codes of an open file as an array."""
+    data = f.read()
+    data = data[:len(data) - len(data) % 2]  # Ignore a trailing partial code
+    return np.frombuffer(data, dtype='>u2').astype(np.int32)
+
 def try_decompress_with_different_sizes(compressed_file_path):
     """Try decompressing with different byte sizes for dimensions"""
     # Try combinations of width and height byte sizes
@@ -74,35 +96,52 @@ def try_decompress_with_different_sizes(compressed_file_path):
                 
                 # Check if dimensions look reasonable
                 if 0 < width <= 10000 and 0 < height <= 10000:
-                    print(f"Trying dimensions: {width}x{height} (width bytes: {width_bytes}, height bytes: {height_bytes})")
+                    logger.debug(f"Trying dimensions: {width}x{height} (width bytes: {width_bytes}, height bytes: {height_bytes})")
                     
                     # Read compressed data
-                    compressed_data = []
-                    chunk = f.read(2)  # Read 2 bytes (16-bit)
-                    while chunk:
-                        if len(chunk) == 2:  # Ensure we read exactly 2 bytes
-                            value = int.from_bytes(chunk, byteorder='big')
-                            compressed_data.append(value)
-                        chunk = f.read(2)
+                    compressed_data = read_codes(f)
                     
-                    # Decompress and check if successful
-                    decompressed_pixels = decompress_lzw(compressed_data)
+                    # Only the decoded length is needed to check the dimensions
+                    decompressed_count = lzw_numba.decoded_length(compressed_data, 256, 65536)
                     
                     # If decompressed pixels count is close to expected, this might be the right size
                     expected_pixels = width * height
-                    if abs(len(decompressed_pixels) - expected_pixels) < expected_pixels * 0.1:  # Within 10% of expected
+                    if abs(decompressed_count - expected_pixels) < expected_pixels * 0.1:  # Within 10% of expected
                         return width, height, compressed_data
                     
         except Exception as e:
-            print(f"Error with width_bytes={width_bytes}, height_bytes={height_bytes}: {e}")
+            logger.debug(f"Error with width_bytes={width_bytes}, height_bytes={height_bytes}: {e}")
     
     # If all attempts fail, raise an exception
     raise ValueError("Could not determine correct image dimensions from compressed file")
 
-def decompress_image_file(compressed_file_path):
-    """Decompress compressed image file with improved error handling"""
-    try:
-        # Try to determine correct dimensions
+def decode_image_file(compressed_file_path, strict=False, errors=None, workers=None):
+    """Read and decode a compressed grayscale image file to a uint8 array
+    
+    Repaired codes and a pixel count mismatch are counted in `errors`; with
+    `strict` set they raise instead. Segmented files are decoded by up to
+    `workers` processes (default: one per CPU); 16-bit ones give uint16.
+    """
+    own_errors = errors is None
+    if own_errors:
+        errors = lzw_logging.DecodeErrors(strict, logger)
+    if lzw_segments.is_segmented(compressed_file_path):
+        with instrumentation.stage("load"):
+            width, height, planes, segments = lzw_segments.read_file(compressed_file_path, 2)
+        instrumentation.count("bytes_in", os.path.getsize(compressed_file_path))
+        instrumentation.count("codes_in", sum(len(codes) for _, codes in segments))
+        logger.info(f"Decompressing: {width}x{height} {8 * planes}-bit image in {len(segments)} segments")
+        with instrumentation.stage("lzw"):
+            img_array = lzw_segments.decode(width, planes * height, segments, 256, 65536, np.uint8,
+                                            lenient=not errors.strict, errors=errors,
+                                            workers=workers)
+        if planes == 2:
+            img_array = image_tools.join_byte_planes(img_array.reshape((2, height, width)))
+        if own_errors:
+            errors.summary()
+        return img_array
+    # Try to determine correct dimensions
+    with instrumentation.stage("load"):
         try:
             width, height, compressed_data = try_decompress_with_different_sizes(compressed_file_path)
         except ValueError:
@@ -113,48 +152,86 @@ def decompress_image_file(compressed_file_path):
                 height = int.from_bytes(f.read(4), byteorder='big')
                 
                 # Read compressed data
-                compressed_data = []
-                chunk = f.read(2)  # Read 2 bytes (16-bit)
-                while chunk:
-                    if len(chunk) == 2:  # Ensure we read exactly 2 bytes
-                        value = int.from_bytes(chunk, byteorder='big')
-                        compressed_data.append(value)
-                    chunk = f.read(2)
-        
-        print(f"Decompressing: {width}x{height} image")
-        print(f"Number of compressed codes read: {len(compressed_data)}")
-        
-        # Decompress the data
-        decompressed_pixels = decompress_lzw(compressed_data)
-        
-        # Ensure we have the correct number of pixels
-        expected_pixels = width * height
-        if len(decompressed_pixels) > expected_pixels:
-            print(f"Warning: Got {len(decompressed_pixels)} pixels, truncating to {expected_pixels}")
-            decompressed_pixels = decompressed_pixels[:expected_pixels]
-        elif len(decompressed_pixels) < expected_pixels:
-            print(f"Warning: Got only {len(decompressed_pixels)} pixels, expected {expected_pixels}")
-            padding = [0] * (expected_pixels - len(decompressed_pixels))
-            decompressed_pixels.extend(padding)
+                compressed_data = read_codes(f)
+    instrumentation.count("bytes_in", os.path.getsize(compressed_file_path))
+    instrumentation.count("codes_in", len(compressed_data))
+    
+    logger.info(f"Decompressing: {width}x{height} image")
+    logger.debug(f"Number of compressed codes read: {len(compressed_data)}")
+    
+    # Decompress the data
+    with instrumentation.stage("lzw"):
+        decompressed_pixels = lzw_numba.decompress_lzw(compressed_data, 256, 65536,
+                                                       dtype=np.uint8, lenient=not errors.strict,
+                                                       errors=errors)
+    
+    # Ensure we have the correct number of pixels
+    expected_pixels = width * height
+    if len(decompressed_pixels) > expected_pixels:
+        errors.report("length_mismatch", "Got %d pixels, truncating to %d",
+                      len(decompressed_pixels), expected_pixels)
+        decompressed_pixels = decompressed_pixels[:expected_pixels]
+    elif len(decompressed_pixels) < expected_pixels:
+        errors.report("length_mismatch", "Got only %d pixels, expected %d",
+                      len(decompressed_pixels), expected_pixels)
+        padding = np.zeros(expected_pixels - len(decompressed_pixels), dtype=np.uint8)
+        decompressed_pixels = np.concatenate((decompressed_pixels, padding))
+    
+    if own_errors:
+        errors.summary()
+    # Reshape to 2D array
+    return decompressed_pixels.reshape((height, width))
+
+def decompress_image_array(compressed_file_path, strict=False, workers=None):
+    """Decoded image array, served from the in-process cache for hot files (read-only)"""
+    img_array, _ = lzw_cache.decoded_images.get_or_decode(compressed_file_path, decode_image_file,
+                                                          strict=strict, workers=workers)
+    return img_array
+
+def decompress_image_file(compressed_file_path, strict=False, workers=None, errors=None):
+    """Decompress compressed image file with improved error handling
+    
+    Pass a DecodeErrors as `errors` to read the error counts afterwards
+    (its strict setting then applies); a cached image adds no counts.
+    """
+    try:
+        if errors is not None:
+            strict = errors.strict
+        img_array, cached = lzw_cache.decoded_images.get_or_decode(compressed_file_path,
+                                                                   decode_image_file,
+                                                                   errors=errors,
+                                                                   strict=strict,
+                                                                   workers=workers)
+        # BMP has no 16-bit grayscale, so those images are saved as 16-bit PNG
+        extension = ".png" if img_array.dtype == np.uint16 else ".bmp"
+        restored_file_path = os.path.splitext(compressed_file_path)[0] + "_restored" + extension
         
-        # Reshape to 2D array
-        img_array = np.array(decompressed_pixels, dtype=np.uint8).reshape((height, width))
+        # A cache hit means the restored file was already written for this input
+        if cached and os.path.exists(restored_file_path):
+            logger.info(f"Image served from cache: {restored_file_path}")
+            return restored_file_path
         
         # Save the restored image using PIL
-        restored_img = image_tools.np2PIL(img_array)
-        restored_file_path = os.path.splitext(compressed_file_path)[0] + "_restored.bmp"
-        restored_img.save(restored_file_path)
+        with instrumentation.stage("write"):
+            if img_array.dtype == np.uint16:
+                restored_img = image_tools.arr_to_PIL(img_array)
+            else:
+                restored_img = image_tools.np2PIL(img_array)
+            restored_img.save(restored_file_path)
+        instrumentation.count("bytes_out", img_array.nbytes)
         
         # Compare with original if available (optional)
         verify_decompression(compressed_file_path, restored_img)
         
-        print(f"Image decompressed and saved as {restored_file_path}")
+        logger.info(f"Image decompressed and saved as {restored_file_path}")
         return restored_file_path
     
+    except ValueError as e:
+        # Bad or corrupted input, e.g. a bad code in strict mode
+        logger.error(f"Image decompression error: {e}")
+        return None
     except Exception as e:
-        print(f"Image decompression error: {e}")
-        import traceback
-        traceback.print_exc()  # Print detailed error information
+        logger.exception(f"Image decompression error: {e}")  # Includes the traceback
         return None
 
 def verify_decompression(compressed_file_path, restored_img):
@@ -162,7 +239,9 @@ def verify_decompression(compressed_file_path, restored_img):
     try:
         # Try different possible original file paths
         possible_paths = [
-            os.path.splitext(compressed_file_path)[0].replace("_compressed", "") + ".bmp",
+            os.path.splitext(compressed_file_path)[0].replace("_compressed", "") + extension
+            for extension in (".bmp", ".png")
+        ] + [
             os.path.splitext(compressed_file_path)[0].replace("_grayscale_compressed", "") + ".bmp",
             os.path.splitext(compressed_file_path)[0] + ".bmp"
         ]
@@ -171,52 +250,53 @@ def verify_decompression(compressed_file_path, restored_img):
             if os.path.exists(original_path):
                 original_img = image_tools.readPILimg(original_path)
                 
-                # Convert original image to grayscale if it's not already
-                if original_img.mode != "L":
+                # Convert original image to grayscale if it's not already (16-bit stays as is)
+                if original_img.mode != "L" and not original_img.mode.startswith("I"):
                     original_img = image_tools.color2gray(original_img)
                 
                 # Resize if dimensions don't match
                 if original_img.size != restored_img.size:
-                    print(f"Warning: Original size {original_img.size} doesn't match restored size {restored_img.size}")
+                    logger.warning(f"Original size {original_img.size} doesn't match restored size {restored_img.size}")
                     original_img = original_img.resize(restored_img.size)
                 
                 original_array = image_tools.PIL2np(original_img)
                 restored_array = image_tools.PIL2np(restored_img)
                 
                 if np.array_equal(original_array, restored_array):
-                    print(f"Decompression successful! Original and restored images are identical.")
+                    logger.info(f"Decompression successful! Original and restored images are identical.")
                     return True
                 else:
-                    print(f"Decompression completed, but images differ.")
+                    logger.info(f"Decompression completed, but images differ.")
                     # Calculate the percentage of different pixels
                     diff = np.sum(original_array != restored_array)
                     total = original_array.size
-                    print(f"Different pixels: {diff}/{total} ({diff/total*100:.2f}%)")
+                    logger.info(f"Different pixels: {diff}/{total} ({diff/total*100:.2f}%)")
                     return False
                 
-        print("Original image not found for comparison.")
+        logger.info("Original image not found for comparison.")
         return False
     except Exception as e:
-        print(f"Error during verification: {e}")
+        logger.error(f"Error during verification: {e}")
         return False
 
 def main():
     # Decompress the image file
     compressed_file_path = "small_image_grayscale_compressed.lzw"
-    print(f"Trying to decompress: {compressed_file_path}")
+    logger.info(f"Trying to decompress: {compressed_file_path}")
     
     # Check if file exists
     if not os.path.exists(compressed_file_path):
-        print(f"Error: File {compressed_file_path} not found!")
+        logger.error(f"Error: File {compressed_file_path} not found!")
         return
     
     # Try to decompress
     result = decompress_image_file(compressed_file_path)
     
     if result:
-        print(f"Decompression completed: {result}")
+        logger.info(f"Decompression completed: {result}")
     else:
-        print("Decompression failed.")
+        logger.error("Decompression failed.")
 
 if __name__ == "__main__":
+    lzw_logging.configure()
     main() 
\ No newline at end of file
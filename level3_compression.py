@@ -3,24 +3,24 @@ import math
 import numpy as np
 from PIL import Image
 import image_tools
+import lzw_numba
+import lzw_segments
+import instrumentation
+import lzw_logging
+
+logger = lzw_logging.get_logger(__name__)
 
 def create_difference_image(img_array):
     """Create a difference image by taking row-wise and column-wise differences."""
-    height, width = img_array.shape
     # Use int16 data type to handle negative differences
-    diff_array = np.zeros((height, width), dtype=np.int16)
-    
-    # Copy the first pixel as is
-    diff_array[0, 0] = img_array[0, 0]
+    img_array = np.asarray(img_array, dtype=np.int16)
+    diff_array = np.empty_like(img_array)
     
-    # Take row-wise differences (for each row, starting from the second pixel)
-    for i in range(height):
-        for j in range(1, width):
-            diff_array[i, j] = int(img_array[i, j]) - int(img_array[i, j-1])
-    
-    # Take column-wise differences for the first column (starting from the second pixel)
-    for i in range(1, height):
-        diff_array[i, 0] = int(img_array[i, 0]) - int(img_array[i-1, 0])
+    # Row-wise differences (for each row, starting from the second pixel)
+    diff_array[:, 1:] = img_array[:, 1:] - img_array[:, :-1]
+    # Column-wise differences for the first column, and the first pixel as is
+    diff_array[1:, 0] = img_array[1:, 0] - img_array[:-1, 0]
+    diff_array[:1, :1] = img_array[:1, :1]
     
     return diff_array
 
@@ -58,8 +58,9 @@ def compress_lzw(data):
         result.append(dictionary[w])
     
     # Print dictionary size for debugging
-    print(f"Dictionary size: {len(dictionary)}")
-    print(f"Min code: {min(result)}, Max code: {max(result)}")
+    instrumentation.count("dictionary_size", len(dictionary))
+    logger.debug(f"Dictionary size: {len(dictionary)}")
+    logger.debug(f"Min code: {min(result)}, Max code: {max(result)}")
     
     return result
 
@@ -83,6 +84,62 @@ def calculate_entropy(pixel_values):
     
     return entropy
 
+def compress_image_file(input_file_path, segments=1):
+    """Compress an image file as a grayscale difference image.
+    
+    With `segments` > 1 the difference image is coded as that many bands of
+    rows with separate dictionaries (see lzw_segments), so it can be decoded
+    in parallel. The prediction itself still runs across band boundaries.
+    
+    16-bit images (and uint16 .npy arrays) are coded losslessly: residuals
+    mod 2^16, zigzag mapped, as a high and a low byte plane.
+    """
+    try:
+        with instrumentation.stage("load"):
+            img_array = image_tools.read_gray_array(input_file_path)
+            height, width = img_array.shape
+        
+        with instrumentation.stage("transform"):
+            if img_array.dtype == np.uint16:
+                symbols = image_tools.byte_planes(image_tools.difference_image16(img_array))
+            else:
+                # Difference values clipped to -128 to 127 and shifted to 0-255
+                symbols = np.clip(create_difference_image(img_array), -128, 127) + 128
+        
+        output_file_path = os.path.splitext(input_file_path)[0] + "_diff_compressed.lzw"
+        if segments > 1 or img_array.dtype == np.uint16:
+            # 16-bit images always use the segmented layout, with one byte plane per 8 bits
+            planes = symbols if symbols.ndim == 3 else symbols[np.newaxis]
+            with instrumentation.stage("lzw"):
+                first_rows, streams = lzw_segments.compress_rows(planes, segments, 256, 4096)
+            with instrumentation.stage("write"):
+                size = lzw_segments.write_file(output_file_path, 3, width, height, first_rows,
+                                               streams, len(planes))
+            instrumentation.count("bytes_in", img_array.nbytes)
+            instrumentation.count("bytes_out", size)
+            logger.info(f"Image compressed in {len(streams)} segments: {output_file_path}")
+            return output_file_path
+        
+        with instrumentation.stage("lzw"):
+            compressed_codes = lzw_numba.compress_lzw(symbols, max_size=4096)
+        instrumentation.count_lzw(symbols.size, len(compressed_codes), 256, 4096)
+        
+        with instrumentation.stage("write"):
+            with open(output_file_path, 'wb') as f:
+                f.write(width.to_bytes(2, byteorder='big'))
+                f.write(height.to_bytes(2, byteorder='big'))
+                f.write(len(compressed_codes).to_bytes(4, byteorder='big'))
+                f.write(compressed_codes.astype('>u2').tobytes())
+        instrumentation.count("bytes_in", img_array.nbytes)
+        instrumentation.count("bytes_out", 8 + 2 * len(compressed_codes))
+        
+        logger.info(f"Image compressed successfully: {output_file_path}")
+        return output_file_path
+    
+    except Exception as e:
+        logger.error(f"Compression error: {e}")
+        return None
+
 def main():
     # Read the image file
     image_path = "big_image.bmp"
@@ -91,9 +148,9 @@ def main():
     # Convert to grayscale if not already
     if img.mode != "L":
         img = image_tools.color2gray(img)
-        print(f"Image converted to grayscale. Size: {img.size}")
+        logger.info(f"Image converted to grayscale. Size: {img.size}")
     else:
-        print(f"Image is already grayscale. Size: {img.size}")
+        logger.info(f"Image is already grayscale. Size: {img.size}")
     
     # Get image dimensions
     width, height = img.size
@@ -108,27 +165,27 @@ def main():
     diff_img = Image.fromarray(np.clip(diff_array + 128, 0, 255).astype(np.uint8))
     diff_img.save("debug_difference_image.bmp")
     
+    # Clip difference values to -128 to 127 range
+    diff_array = np.clip(diff_array, -128, 127)
+    
     # Flatten the difference array
     diff_values = diff_array.flatten().tolist()
     
-    # Clip difference values to -128 to 127 range
-    diff_values = [max(-128, min(127, x)) for x in diff_values]
-    
     # Calculate entropy of original image
     original_entropy = calculate_entropy(img_array.flatten().tolist())
-    print(f"Original image entropy: {original_entropy:.4f} bits/pixel")
+    logger.info(f"Original image entropy: {original_entropy:.4f} bits/pixel")
     
     # Calculate entropy of difference image
     diff_entropy = calculate_entropy(diff_values)
-    print(f"Difference image entropy: {diff_entropy:.4f} bits/pixel")
+    logger.info(f"Difference image entropy: {diff_entropy:.4f} bits/pixel")
     
-    # Compress the difference values
-    compressed_codes = compress_lzw(diff_values)
+    # Compress the difference values (shifted to the 0-255 code range)
+    compressed_codes = lzw_numba.compress_lzw(diff_array + 128, max_size=4096)
     
     # Calculate average code length
     code_length = 12  # Standard LZW code length
     avg_code_length = (len(compressed_codes) * code_length) / len(diff_values)
-    print(f"Average code length: {avg_code_length:.4f} bits/pixel")
+    logger.info(f"Average code length: {avg_code_length:.4f} bits/pixel")
     
     # Save compressed data and image dimensions
     compressed_file_path = os.path.splitext(image_path)[0] + "_diff_compressed.lzw"
@@ -141,8 +198,7 @@ def main():
         f.write(len(compressed_codes).to_bytes(4, byteorder='big'))
         
         # Write compressed data
-        for code in compressed_codes:
-            f.write(code.to_bytes(2, byteorder='big'))
+        f.write(compressed_codes.astype('>u2').tobytes())
     
     # Calculate compression ratio
     original_size = os.path.getsize(image_path)
@@ -151,13 +207,14 @@ def main():
     compression_factor = original_size / compressed_size
     space_saving = 1 - compression_ratio
     
-    print(f"Original file size: {original_size} bytes")
-    print(f"Compressed file size: {compressed_size} bytes")
-    print(f"Compression Ratio (CR): {compression_ratio:.4f}")
-    print(f"Compression Factor (CF): {compression_factor:.4f}")
-    print(f"Space Saving (SS): {space_saving:.4f} ({space_saving*100:.2f}%)")
+    logger.info(f"Original file size: {original_size} bytes")
+    logger.info(f"Compressed file size: {compressed_size} bytes")
+    logger.info(f"Compression Ratio (CR): {compression_ratio:.4f}")
+    logger.info(f"Compression Factor (CF): {compression_factor:.4f}")
+    logger.info(f"Space Saving (SS): {space_saving:.4f} ({space_saving*100:.2f}%)")
     
-    print(f"Image compressed and saved as {compressed_file_path}")
+    logger.info(f"Image compressed and saved as {compressed_file_path}")
 
 if __name__ == "__main__":
+    lzw_logging.configure()
     main() 
\ No newline at end of file
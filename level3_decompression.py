@@ -2,25 +2,21 @@ import os
 import numpy as np
 from PIL import Image
 import image_tools
+import lzw_numba
+import lzw_segments
+import instrumentation
+import lzw_logging
+
+logger = lzw_logging.get_logger(__name__)
 
 def restore_from_difference_image(diff_array):
-    """Restore the original image from the difference image."""
-    height, width = diff_array.shape
-    restored_array = diff_array.copy().astype(np.int16)  # Ensure int16 type
-    
-    # Restore the first column (starting from the second pixel)
-    for i in range(1, height):
-        restored_array[i, 0] = int(restored_array[i, 0]) + int(restored_array[i-1, 0])
-    
-    # Restore each row (starting from the second pixel)
-    for i in range(height):
-        for j in range(1, width):
-            restored_array[i, j] = int(restored_array[i, j]) + int(restored_array[i, j-1])
-    
-    # Ensure values are within 0-255 range
-    restored_array = np.clip(restored_array, 0, 255).astype(np.uint8)
+    """Restore the original image from the difference image.
     
-    return restored_array
+    Runs over the whole image at once, so the first column is restored
+    across the band boundaries of segmented files too. The file decoder
+    uses image_tools.restore_differences on its own buffer instead.
+    """
+    return image_tools.restore_differences(diff_array.astype(np.int16)).astype(np.uint8)
 
 def decompress_lzw(compressed):
     """Decompress a list of codes using LZW algorithm."""
@@ -62,6 +58,93 @@ def decompress_lzw(compressed):
     
     return result
 
+def decode_image_file(compressed_file_path, errors):
+    """Difference image of a single-stream file."""
+    with instrumentation.stage("load"):
+        with open(compressed_file_path, 'rb') as f:
+            width = int.from_bytes(f.read(2), byteorder='big')
+            height = int.from_bytes(f.read(2), byteorder='big')
+            code_count = int.from_bytes(f.read(4), byteorder='big')
+            # Native uint16 codes: half the memory of int32 while decoding
+            compressed_data = np.fromfile(f, dtype='>u2', count=code_count).astype(np.uint16)
+    instrumentation.count("bytes_in", 8 + 2 * len(compressed_data))
+    instrumentation.count("codes_in", len(compressed_data))
+    
+    # Decoding straight to the expected pixel count truncates, or pads with
+    # symbol 128 (a zero residual) so a short stream holds its last value
+    with instrumentation.stage("lzw"):
+        diff_values = lzw_numba.decompress_lzw(compressed_data, 256, 4096,
+                                               length=width * height, dtype=np.int16,
+                                               lenient=not errors.strict, errors=errors,
+                                               fill=128)
+        diff_values -= 128
+    return diff_values.reshape((height, width))
+
+def decode_segmented_file(compressed_file_path, errors, workers=None):
+    """Difference image of a segmented file, its bands decoded by up to `workers` processes.
+    
+    16-bit files give the uint16 zigzag residuals of image_tools.difference_image16.
+    """
+    with instrumentation.stage("load"):
+        width, height, planes, segments = lzw_segments.read_file(compressed_file_path, 3)
+    instrumentation.count("bytes_in", os.path.getsize(compressed_file_path))
+    instrumentation.count("codes_in", sum(len(codes) for _, codes in segments))
+    logger.info(f"Decompressing: {width}x{height} {8 * planes}-bit image in {len(segments)} segments")
+    with instrumentation.stage("lzw"):
+        if planes == 2:
+            symbols = lzw_segments.decode(width, 2 * height, segments, 256, 4096, np.uint8,
+                                          lenient=not errors.strict, errors=errors,
+                                          workers=workers)
+            return image_tools.join_byte_planes(symbols.reshape((2, height, width)))
+        diff_array = lzw_segments.decode(width, height, segments, 256, 4096, np.int16,
+                                         lenient=not errors.strict, errors=errors,
+                                         workers=workers, fill=128)
+        diff_array -= 128
+    return diff_array
+
+def decompress_image_file(compressed_file_path, strict=False, workers=None, errors=None):
+    """Decompress a grayscale difference image file and save the restored image.
+    
+    Bad codes are repaired and a code stream decoding to the wrong pixel
+    count is truncated or zero-padded with a warning, or rejected when
+    `strict` is set. Pass a DecodeErrors as `errors` to read the counts
+    afterwards (its strict setting then applies). Segmented
+    files are decoded by up to `workers` processes (default: one per CPU).
+    
+    The residuals are decoded into one int16 buffer and restored in place;
+    the image is saved from a strided uint8 view of it, which PIL copies
+    once into a contiguous image. Segmented files also copy the decoded
+    buffer out of shared memory. 16-bit images are saved as
+    16-bit PNG, since BMP has no 16-bit grayscale.
+    """
+    try:
+        own_errors = errors is None
+        if own_errors:
+            errors = lzw_logging.DecodeErrors(strict, logger)
+        if lzw_segments.is_segmented(compressed_file_path):
+            diff_array = decode_segmented_file(compressed_file_path, errors, workers)
+        else:
+            diff_array = decode_image_file(compressed_file_path, errors)
+        if own_errors:
+            errors.summary()
+        with instrumentation.stage("transform"):
+            if diff_array.dtype == np.uint16:
+                restored_array = image_tools.restore_differences16(diff_array)
+            else:
+                restored_array = image_tools.uint8_view(image_tools.restore_differences(diff_array))
+        
+        extension = ".png" if restored_array.dtype == np.uint16 else ".bmp"
+        restored_file_path = os.path.splitext(compressed_file_path)[0] + "_restored" + extension
+        with instrumentation.stage("write"):
+            image_tools.arr_to_PIL(restored_array).save(restored_file_path)
+        instrumentation.count("bytes_out", restored_array.nbytes)
+        logger.info(f"Image decompressed and saved as {restored_file_path}")
+        return restored_file_path
+    
+    except Exception as e:
+        logger.error(f"Error during decompression: {e}")
+        return None
+
 def main():
     # Read the compressed file
     compressed_file_path = "big_image_diff_compressed.lzw"
@@ -75,30 +158,29 @@ def main():
         code_count = int.from_bytes(f.read(4), byteorder='big')
         
         # Read compressed data
-        compressed_data = []
-        for _ in range(code_count):
-            code = int.from_bytes(f.read(2), byteorder='big')
-            compressed_data.append(code)
+        compressed_data = np.frombuffer(f.read(2 * code_count), dtype='>u2').astype(np.int32)
     
-    print(f"Decompressing image with dimensions: {width}x{height}")
-    print(f"Number of compressed codes: {len(compressed_data)}")
-    print(f"First few codes: {compressed_data[:10]}")
+    logger.info(f"Decompressing image with dimensions: {width}x{height}")
+    logger.info(f"Number of compressed codes: {len(compressed_data)}")
+    logger.debug(f"First few codes: {compressed_data[:10].tolist()}")
     
     try:
-        # Decompress to get difference values
-        decompressed_diff_values = decompress_lzw(compressed_data)
+        # Decompress to get difference values (codes 0-255 map to -128 to 127)
+        decompressed_diff_values = lzw_numba.decompress_lzw(compressed_data, 256, 4096,
+                                                            dtype=np.int16) - 128
         
         # Ensure we have the correct number of pixels
         expected_pixels = width * height
         if len(decompressed_diff_values) > expected_pixels:
-            print(f"Warning: Got {len(decompressed_diff_values)} pixels, expected {expected_pixels}")
+            logger.warning(f"Got {len(decompressed_diff_values)} pixels, expected {expected_pixels}")
             decompressed_diff_values = decompressed_diff_values[:expected_pixels]
         elif len(decompressed_diff_values) < expected_pixels:
-            print(f"Warning: Got only {len(decompressed_diff_values)} pixels, expected {expected_pixels}")
-            decompressed_diff_values.extend([0] * (expected_pixels - len(decompressed_diff_values)))
+            logger.warning(f"Got only {len(decompressed_diff_values)} pixels, expected {expected_pixels}")
+            padding = np.zeros(expected_pixels - len(decompressed_diff_values), dtype=np.int16)
+            decompressed_diff_values = np.concatenate((decompressed_diff_values, padding))
         
         # Reshape to 2D array
-        diff_array = np.array(decompressed_diff_values, dtype=np.int16).reshape((height, width))
+        diff_array = decompressed_diff_values.reshape((height, width))
         
         # Save the difference image for debugging
         diff_img = Image.fromarray(np.clip(diff_array + 128, 0, 255).astype(np.uint8))
@@ -122,20 +204,21 @@ def main():
         original_array = image_tools.PIL2np(original_img)
         
         if np.array_equal(original_array, restored_array):
-            print("Decompression successful! Original and restored images are identical.")
+            logger.info("Decompression successful! Original and restored images are identical.")
         else:
-            print("Decompression failed! Original and restored images are different.")
+            logger.warning("Decompression failed! Original and restored images are different.")
             # Calculate the percentage of different pixels
             diff = np.sum(original_array != restored_array)
             total = original_array.size
-            print(f"Different pixels: {diff}/{total} ({diff/total*100:.2f}%)")
+            logger.info(f"Different pixels: {diff}/{total} ({diff/total*100:.2f}%)")
         
-        print(f"Image decompressed and saved as {restored_file_path}")
+        logger.info(f"Image decompressed and saved as {restored_file_path}")
     except Exception as e:
-        print(f"Error during decompression: {e}")
+        logger.error(f"Error during decompression: {e}")
         # Daha fazla hata ayıklama bilgisi
-        if compressed_data:
-            print(f"Min code: {min(compressed_data)}, Max code: {max(compressed_data)}")
+        if len(compressed_data):
+            logger.debug(f"Min code: {compressed_data.min()}, Max code: {compressed_data.max()}")
 
 if __name__ == "__main__":
+    lzw_logging.configure()
     main() 
\ No newline at end of file
@@ -3,6 +3,16 @@ import math
 import numpy as np
 from PIL import Image
 import image_tools
+import lzw_numba
+import instrumentation
+import lzw_logging
+
+logger = lzw_logging.get_logger(__name__)
+
+# Tuple mode: one stream of palette indices, one symbol per RGB pixel
+PALETTE_MAGIC = b"LZWP"
+PALETTE_LIMIT = 16384  # More colors than this are coded as planes
+TUPLE_MAX_SIZE = 65536  # Codes fit 2 bytes
 
 def calculate_entropy(pixel_values):
     """Calculate the entropy of the image."""
@@ -56,6 +66,79 @@ def compress_lzw(data):
     
     return result
 
+def write_tuple_file(output_file_path, width, height, palette, codes):
+    """Write a tuple mode file; returns its size in bytes.
+    
+    Layout: b"LZWP" | width (4) | height (4) | color count (4) | code count (4)
+    | palette (3 bytes RGB per color) | 2-byte big-endian codes
+    """
+    with open(output_file_path, 'wb') as f:
+        f.write(PALETTE_MAGIC)
+        f.write(width.to_bytes(4, byteorder='big'))
+        f.write(height.to_bytes(4, byteorder='big'))
+        f.write(len(palette).to_bytes(4, byteorder='big'))
+        f.write(len(codes).to_bytes(4, byteorder='big'))
+        f.write(palette.tobytes())
+        f.write(codes.astype('>u2').tobytes())
+    return 20 + palette.nbytes + 2 * len(codes)
+
+def compress_image_file(input_file_path, tuples=False):
+    """Compress the R, G, B channels of an image file.
+    
+    With `tuples` set, an image of at most PALETTE_LIMIT colors is coded
+    as one stream whose symbols are whole pixels (indices into its palette),
+    so repeated colors and color runs cost one code instead of three.
+    """
+    try:
+        with instrumentation.stage("load"):
+            img = image_tools.readPILimg(input_file_path)
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            width, height = img.size
+            img_array = image_tools.PIL2np(img)
+        
+        output_file_path = os.path.splitext(input_file_path)[0] + "_color_compressed.lzw"
+        if tuples:
+            with instrumentation.stage("transform"):
+                palette, indices = image_tools.palette_indices(img_array)
+            if len(palette) <= PALETTE_LIMIT:
+                with instrumentation.stage("lzw"):
+                    codes = lzw_numba.compress_lzw(indices, len(palette), TUPLE_MAX_SIZE)
+                instrumentation.count_lzw(indices.size, len(codes), len(palette), TUPLE_MAX_SIZE)
+                with instrumentation.stage("write"):
+                    size = write_tuple_file(output_file_path, width, height, palette, codes)
+                instrumentation.count("bytes_in", img_array.nbytes)
+                instrumentation.count("bytes_out", size)
+                logger.info(f"Image compressed as pixels of {len(palette)} colors: {output_file_path}")
+                return output_file_path
+            logger.info(f"{len(palette)} colors exceed the palette limit, coding channels")
+        
+        channels_compressed = []
+        for i in range(3):
+            with instrumentation.stage("lzw"):
+                compressed = lzw_numba.compress_lzw(img_array[:, :, i], max_size=4096)
+            instrumentation.count_lzw(width * height, len(compressed), 256, 4096)
+            channels_compressed.append(compressed)
+        
+        with instrumentation.stage("write"):
+            with open(output_file_path, 'wb') as f:
+                # 4-byte dimensions, as read by level4_decompression.read_compressed_file
+                f.write(width.to_bytes(4, byteorder='big'))
+                f.write(height.to_bytes(4, byteorder='big'))
+                for compressed in channels_compressed:
+                    f.write(len(compressed).to_bytes(4, byteorder='big'))
+                for compressed in channels_compressed:
+                    f.write(compressed.astype('>u2').tobytes())
+        instrumentation.count("bytes_in", img_array.nbytes)
+        instrumentation.count("bytes_out", os.path.getsize(output_file_path))
+        
+        logger.info(f"Image compressed successfully: {output_file_path}")
+        return output_file_path
+    
+    except Exception as e:
+        logger.error(f"Compression error: {e}")
+        return None
+
 def main():
     # Read the image file
     image_path = "small_image.bmp"
@@ -63,10 +146,10 @@ def main():
     
     # Ensure the image is in RGB mode
     if img.mode != "RGB":
-        print(f"Converting image to RGB mode")
+        logger.info(f"Converting image to RGB mode")
         img = img.convert("RGB")
     
-    print(f"Processing color image. Size: {img.size}")
+    logger.info(f"Processing color image. Size: {img.size}")
     
     # Get image dimensions
     width, height = img.size
@@ -84,14 +167,14 @@ def main():
     g_entropy = calculate_entropy(g_channel)
     b_entropy = calculate_entropy(b_channel)
     
-    print(f"Red channel entropy: {r_entropy:.4f} bits/pixel")
-    print(f"Green channel entropy: {g_entropy:.4f} bits/pixel")
-    print(f"Blue channel entropy: {b_entropy:.4f} bits/pixel")
+    logger.info(f"Red channel entropy: {r_entropy:.4f} bits/pixel")
+    logger.info(f"Green channel entropy: {g_entropy:.4f} bits/pixel")
+    logger.info(f"Blue channel entropy: {b_entropy:.4f} bits/pixel")
     
     # Compress each channel
-    r_compressed = compress_lzw(r_channel)
-    g_compressed = compress_lzw(g_channel)
-    b_compressed = compress_lzw(b_channel)
+    r_compressed = lzw_numba.compress_lzw(img_array[:, :, 0], max_size=4096)
+    g_compressed = lzw_numba.compress_lzw(img_array[:, :, 1], max_size=4096)
+    b_compressed = lzw_numba.compress_lzw(img_array[:, :, 2], max_size=4096)
     
     # Calculate average code length for each channel
     code_length = 12  # Standard LZW code length
@@ -99,9 +182,9 @@ def main():
     g_avg_code_length = (len(g_compressed) * code_length) / len(g_channel)
     b_avg_code_length = (len(b_compressed) * code_length) / len(b_channel)
     
-    print(f"Red channel average code length: {r_avg_code_length:.4f} bits/pixel")
-    print(f"Green channel average code length: {g_avg_code_length:.4f} bits/pixel")
-    print(f"Blue channel average code length: {b_avg_code_length:.4f} bits/pixel")
+    logger.info(f"Red channel average code length: {r_avg_code_length:.4f} bits/pixel")
+    logger.info(f"Green channel average code length: {g_avg_code_length:.4f} bits/pixel")
+    logger.info(f"Blue channel average code length: {b_avg_code_length:.4f} bits/pixel")
     
     # Save compressed data and image dimensions
     compressed_file_path = os.path.splitext(image_path)[0] + "_color_compressed.lzw"
@@ -116,12 +199,9 @@ def main():
         f.write(len(b_compressed).to_bytes(4, byteorder='big'))
         
         # Write compressed data for each channel
-        for code in r_compressed:
-            f.write(code.to_bytes(2, byteorder='big'))
-        for code in g_compressed:
-            f.write(code.to_bytes(2, byteorder='big'))
-        for code in b_compressed:
-            f.write(code.to_bytes(2, byteorder='big'))
+        f.write(r_compressed.astype('>u2').tobytes())
+        f.write(g_compressed.astype('>u2').tobytes())
+        f.write(b_compressed.astype('>u2').tobytes())
     
     # Calculate compression ratio
     original_size = os.path.getsize(image_path)
@@ -130,13 +210,14 @@ def main():
     compression_factor = original_size / compressed_size
     space_saving = 1 - compression_ratio
     
-    print(f"Original file size: {original_size} bytes")
-    print(f"Compressed file size: {compressed_size} bytes")
-    print(f"Compression Ratio (CR): {compression_ratio:.4f}")
-    print(f"Compression Factor (CF): {compression_factor:.4f}")
-    print(f"Space Saving (SS): {space_saving:.4f} ({space_saving*100:.2f}%)")
+    logger.info(f"Original file size: {original_size} bytes")
+    logger.info(f"Compressed file size: {compressed_size} bytes")
+    logger.info(f"Compression Ratio (CR): {compression_ratio:.4f}")
+    logger.info(f"Compression Factor (CF): {compression_factor:.4f}")
+    logger.info(f"Space Saving (SS): {space_saving:.4f} ({space_saving*100:.2f}%)")
     
-    print(f"Image compressed and saved as {compressed_file_path}")
+    logger.info(f"Image compressed and saved as {compressed_file_path}")
 
 if __name__ == "__main__":
+    lzw_logging.configure()
     main() 
\ No newline at end of file
@@ -2,11 +2,27 @@ import os
 import numpy as np
 from PIL import Image
 import image_tools
+import lzw_numba
+import lzw_cache
+import instrumentation
+import lzw_logging
 
-def decompress_lzw(compressed):
-    """Decompress a list of codes using LZW algorithm."""
+logger = lzw_logging.get_logger(__name__)
+
+PALETTE_MAGIC = b"LZWP"  # Tuple mode files written by level4_compression
+TUPLE_MAX_SIZE = 65536
+
+def decompress_lzw(compressed, strict=False, errors=None):
+    """Decompress a list of codes using LZW algorithm.
+    
+    Invalid codes are repaired as w + w[0] and counted in `errors`; with
+    `strict` set the first one raises lzw_logging.DecodeError instead.
+    """
     if not compressed:
         return []
+    own_errors = errors is None
+    if own_errors:
+        errors = lzw_logging.DecodeErrors(strict, logger)
     
     # Build the dictionary with single values
     dict_size = 256
@@ -22,6 +38,7 @@ def decompress_lzw(compressed):
         elif k == dict_size:
             entry = w + w[0]
         else:
+            errors.report("bad_codes", "Bad compressed code: %d", k)
             entry = w + w[0]  # Fallback for invalid codes
         
         # Add entry to result
@@ -34,6 +51,8 @@ def decompress_lzw(compressed):
         
         w = entry
     
+    if own_errors:
+        errors.summary()
     return result
 
 def read_compressed_file(compressed_file_path):
@@ -48,61 +67,123 @@ def read_compressed_file(compressed_file_path):
         g_length = int.from_bytes(f.read(4), byteorder='big')
         b_length = int.from_bytes(f.read(4), byteorder='big')
         
-        print(f"Reading image: {width}x{height}, channels: R={r_length}, G={g_length}, B={b_length}")
+        logger.debug(f"Reading image: {width}x{height}, channels: R={r_length}, G={g_length}, B={b_length}")
         
         # Read compressed data for each channel
         channels_compressed = []
         for length in [r_length, g_length, b_length]:
-            channel = []
-            for _ in range(length):
-                code = int.from_bytes(f.read(2), byteorder='big')
-                channel.append(code)
+            channel = np.frombuffer(f.read(2 * length), dtype='>u2').astype(np.int32)
             channels_compressed.append(channel)
     
     return width, height, channels_compressed
 
-def process_channel(compressed, width, height, channel_name=""):
-    """Process a single compressed channel."""
-    print(f"Decompressing {channel_name} channel...")
-    decompressed = decompress_lzw(compressed)
-    
-    # Adjust to expected pixel count
+def decode_tuple_file(compressed_file_path, errors):
+    """Decode a tuple mode file: palette indices looked up in its palette."""
+    with instrumentation.stage("load"):
+        with open(compressed_file_path, 'rb') as f:
+            header = f.read(20)
+            width = int.from_bytes(header[4:8], byteorder='big')
+            height = int.from_bytes(header[8:12], byteorder='big')
+            colors = int.from_bytes(header[12:16], byteorder='big')
+            count = int.from_bytes(header[16:20], byteorder='big')
+            palette = np.frombuffer(f.read(3 * colors), dtype=np.uint8).reshape(-1, 3)
+            codes = np.frombuffer(f.read(2 * count), dtype='>u2').astype(np.uint16)
+    if len(palette) != colors or colors == 0:
+        raise ValueError("Truncated palette")
+    instrumentation.count("codes_in", len(codes))
+    lenient = not errors.strict
+    with instrumentation.stage("lzw"):
+        indices = lzw_numba.decompress_lzw(codes, colors, TUPLE_MAX_SIZE, length=width * height,
+                                           dtype=np.int32, lenient=lenient, errors=errors)
+    with instrumentation.stage("transform"):
+        # Every decoded symbol (repaired or padding) is a valid index
+        return palette[indices].reshape((height, width, 3))
+
+def process_channel(compressed, width, height, channel_name="", errors=None):
+    """Process a single compressed channel (bad codes and length mismatches go to `errors`)."""
+    logger.debug(f"Decompressing {channel_name} channel...")
+    # Decoding straight to the expected pixel count truncates or zero-pads
     expected_pixels = width * height
-    if len(decompressed) != expected_pixels:
-        if len(decompressed) > expected_pixels:
-            decompressed = decompressed[:expected_pixels]
-        else:
-            decompressed.extend([0] * (expected_pixels - len(decompressed)))
+    lenient = errors is None or not errors.strict
+    with instrumentation.stage("lzw"):
+        decompressed = lzw_numba.decompress_lzw(compressed, 256, 4096, length=expected_pixels,
+                                                dtype=np.uint8, lenient=lenient, errors=errors)
     
-    return np.array(decompressed, dtype=np.uint8).reshape((height, width))
+    return decompressed.reshape((height, width))
 
-def decompress_image_file(compressed_file_path):
-    """Decompress a color image file compressed with LZW"""
-    try:
-        # Read the compressed file
+def decode_image_file(compressed_file_path, strict=False, errors=None):
+    """Read and decode a compressed color image file to an RGB uint8 array.
+    
+    Repaired codes and pixel count mismatches are counted in `errors`; with
+    `strict` set they raise instead.
+    """
+    own_errors = errors is None
+    if own_errors:
+        errors = lzw_logging.DecodeErrors(strict, logger)
+    with open(compressed_file_path, 'rb') as f:
+        magic = f.read(len(PALETTE_MAGIC))
+    if magic == PALETTE_MAGIC:
+        instrumentation.count("bytes_in", os.path.getsize(compressed_file_path))
+        rgb_array = decode_tuple_file(compressed_file_path, errors)
+        if own_errors:
+            errors.summary()
+        return rgb_array
+    # Read the compressed file
+    with instrumentation.stage("load"):
         width, height, channels_compressed = read_compressed_file(compressed_file_path)
+    instrumentation.count("bytes_in", os.path.getsize(compressed_file_path))
+    instrumentation.count("codes_in", sum(len(channel) for channel in channels_compressed))
+    
+    # Decompress each channel
+    channel_names = ["red", "green", "blue"]
+    channels = []
+    
+    for i, compressed in enumerate(channels_compressed):
+        channel_array = process_channel(compressed, width, height, channel_names[i], errors)
+        channels.append(channel_array)
+    
+    if own_errors:
+        errors.summary()
+    # Stack the channels to create a 3D array
+    return np.stack(channels, axis=2)
+
+def decompress_image_array(compressed_file_path, strict=False):
+    """Decoded RGB array, served from the in-process cache for hot files (read-only)."""
+    rgb_array, _ = lzw_cache.decoded_images.get_or_decode(compressed_file_path, decode_image_file,
+                                                          strict=strict)
+    return rgb_array
+
+def decompress_image_file(compressed_file_path, strict=False, errors=None):
+    """Decompress a color image file compressed with LZW
+    
+    Pass a DecodeErrors as `errors` to read the error counts afterwards
+    (its strict setting then applies); a cached image adds no counts.
+    """
+    try:
+        if errors is not None:
+            strict = errors.strict
+        rgb_array, cached = lzw_cache.decoded_images.get_or_decode(compressed_file_path,
+                                                                   decode_image_file,
+                                                                   errors=errors,
+                                                                   strict=strict)
+        restored_file_path = os.path.splitext(compressed_file_path)[0] + "_restored.bmp"
         
-        # Decompress each channel
-        channel_names = ["red", "green", "blue"]
-        channels = []
-        
-        for i, compressed in enumerate(channels_compressed):
-            channel_array = process_channel(compressed, width, height, channel_names[i])
-            channels.append(channel_array)
-        
-        # Stack the channels to create a 3D array
-        rgb_array = np.stack(channels, axis=2)
+        # A cache hit means the restored file was already written for this input
+        if cached and os.path.exists(restored_file_path):
+            logger.info(f"Image served from cache: {restored_file_path}")
+            return restored_file_path
         
         # Convert to PIL Image and save
-        restored_img = image_tools.np2PIL(rgb_array)
-        restored_file_path = os.path.splitext(compressed_file_path)[0] + "_restored.bmp"
-        restored_img.save(restored_file_path)
+        with instrumentation.stage("write"):
+            restored_img = image_tools.np2PIL(rgb_array)
+            restored_img.save(restored_file_path)
+        instrumentation.count("bytes_out", rgb_array.nbytes)
         
-        print(f"Image decompressed and saved as {restored_file_path}")
+        logger.info(f"Image decompressed and saved as {restored_file_path}")
         return restored_file_path
         
     except Exception as e:
-        print(f"Error decompressing image: {e}")
+        logger.error(f"Error decompressing image: {e}")
         return None
 
 def compare_images(original_path, restored_path):
@@ -123,7 +204,7 @@ def compare_images(original_path, restored_path):
         
         # Check dimensions
         if original_img.size != restored_img.size:
-            print("Images have different dimensions - cannot compare.")
+            logger.info("Images have different dimensions - cannot compare.")
             return False
         
         # Compare images
@@ -131,16 +212,16 @@ def compare_images(original_path, restored_path):
         restored_array = image_tools.PIL2np(restored_img)
         
         if np.array_equal(original_array, restored_array):
-            print("Images are identical!")
+            logger.info("Images are identical!")
             return True
         else:
             diff = np.sum(original_array != restored_array)
             total = original_array.size
-            print(f"Different pixels: {diff}/{total} ({diff/total*100:.2f}%)")
+            logger.info(f"Different pixels: {diff}/{total} ({diff/total*100:.2f}%)")
             return False
             
     except Exception as e:
-        print(f"Error comparing images: {e}")
+        logger.error(f"Error comparing images: {e}")
         return False
 
 def main():
@@ -152,4 +233,5 @@ def main():
         compare_images(original_image_path, restored_path)
 
 if __name__ == "__main__":
+    lzw_logging.configure()
     main() 
\ No newline at end of file
@@ -2,6 +2,11 @@ import os
 import numpy as np
 from PIL import Image
 import image_tools
+import lzw_numba
+import instrumentation
+import lzw_logging
+
+logger = lzw_logging.get_logger(__name__)
 
 def compress_lzw(data):
     """Compress a list of pixel values using LZW algorithm."""
@@ -29,6 +34,51 @@ def compress_lzw(data):
     if w: result.append(dictionary[w])
     return result
 
+def compress_image_file(input_file_path):
+    """Compress the difference images of the R, G, B channels of an image file."""
+    try:
+        with instrumentation.stage("load"):
+            img = image_tools.readPILimg(input_file_path)
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            width, height = img.size
+            img_array = image_tools.PIL2np(img).astype(np.int16)
+        
+        compressed_data = []
+        for i in range(3):
+            channel = img_array[:, :, i]
+            with instrumentation.stage("transform"):
+                # Row-wise differences, and column-wise for the first column
+                diff_array = np.zeros((height, width), dtype=np.int16)
+                diff_array[:, 1:] = channel[:, 1:] - channel[:, :-1]
+                diff_array[1:, 0] = channel[1:, 0] - channel[:-1, 0]
+                diff_array[0, 0] = channel[0, 0]
+                diff_values = np.clip(diff_array, -128, 127) + 128
+            
+            with instrumentation.stage("lzw"):
+                compressed = lzw_numba.compress_lzw(diff_values, max_size=4096)
+            instrumentation.count_lzw(diff_values.size, len(compressed), 256, 4096)
+            compressed_data.append(compressed)
+        
+        output_file_path = os.path.splitext(input_file_path)[0] + "_color_diff_compressed.lzw"
+        with instrumentation.stage("write"):
+            with open(output_file_path, 'wb') as f:
+                f.write(width.to_bytes(2, byteorder='big'))
+                f.write(height.to_bytes(2, byteorder='big'))
+                for compressed in compressed_data:
+                    f.write(len(compressed).to_bytes(4, byteorder='big'))
+                for compressed in compressed_data:
+                    f.write(compressed.astype('>u2').tobytes())
+        instrumentation.count("bytes_in", 3 * width * height)
+        instrumentation.count("bytes_out", os.path.getsize(output_file_path))
+        
+        logger.info(f"Image compressed successfully: {output_file_path}")
+        return output_file_path
+    
+    except Exception as e:
+        logger.error(f"Compression error: {e}")
+        return None
+
 def main():
     # Read the image file
     image_path = "small_image.bmp"
@@ -59,12 +109,11 @@ def main():
         for r in range(1, height):
             diff_array[r, 0] = int(channel[r, 0]) - int(channel[r-1, 0])
         
-        # Flatten and clip values
-        diff_values = diff_array.flatten().tolist()
-        diff_values = [max(-128, min(127, x)) for x in diff_values]
+        # Clip values and shift them to the 0-255 code range
+        diff_values = np.clip(diff_array, -128, 127) + 128
         
         # Compress
-        compressed = compress_lzw(diff_values)
+        compressed = lzw_numba.compress_lzw(diff_values, max_size=4096)
         compressed_data.append(compressed)
     
     # Save compressed data
@@ -80,18 +129,18 @@ def main():
         
         # Write compressed data
         for compressed in compressed_data:
-            for code in compressed:
-                f.write(code.to_bytes(2, byteorder='big'))
+            f.write(compressed.astype('>u2').tobytes())
     
     # Calculate compression metrics
     original_size = os.path.getsize(image_path)
     compressed_size = os.path.getsize(compressed_file_path)
     compression_ratio = compressed_size / original_size
     
-    print(f"Original: {original_size} bytes, Compressed: {compressed_size} bytes")
-    print(f"Compression Ratio: {compression_ratio:.4f}")
-    print(f"Space Saving: {(1-compression_ratio)*100:.2f}%")
-    print(f"Image compressed and saved as {compressed_file_path}")
+    logger.info(f"Original: {original_size} bytes, Compressed: {compressed_size} bytes")
+    logger.info(f"Compression Ratio: {compression_ratio:.4f}")
+    logger.info(f"Space Saving: {(1-compression_ratio)*100:.2f}%")
+    logger.info(f"Image compressed and saved as {compressed_file_path}")
 
 if __name__ == "__main__":
+    lzw_logging.configure()
     main() 
\ No newline at end of file
@@ -2,25 +2,15 @@ import os
 import numpy as np
 from PIL import Image
 import image_tools
+import lzw_numba
+import instrumentation
+import lzw_logging
+
+logger = lzw_logging.get_logger(__name__)
 
 def restore_from_difference_image(diff_array):
     """Restore the original image from the difference image."""
-    height, width = diff_array.shape
-    restored_array = diff_array.copy()
-    
-    # Restore the first column (starting from the second pixel)
-    for i in range(1, height):
-        restored_array[i, 0] = int(restored_array[i, 0]) + int(restored_array[i-1, 0])
-    
-    # Restore each row (starting from the second pixel)
-    for i in range(height):
-        for j in range(1, width):
-            restored_array[i, j] = int(restored_array[i, j]) + int(restored_array[i, j-1])
-    
-    # Ensure values are within 0-255 range
-    restored_array = np.clip(restored_array, 0, 255).astype(np.uint8)
-    
-    return restored_array
+    return image_tools.restore_differences(diff_array.astype(np.int16)).astype(np.uint8)
 
 def decompress_lzw(compressed):
     """Decompress a list of codes using LZW algorithm with integer values."""
@@ -58,6 +48,61 @@ def decompress_lzw(compressed):
     
     return result
 
+def decompress_image_file(compressed_file_path, strict=False, errors=None):
+    """Decompress a color difference image file and save the restored image.
+    
+    Bad codes are repaired and channels decoding to the wrong pixel count are
+    truncated or zero-padded with a warning, or rejected when `strict` is set.
+    Pass a DecodeErrors as `errors` to read the counts afterwards (its strict
+    setting then applies).
+    
+    The residuals of all channels are decoded into one int16 buffer and
+    restored in place; each channel is saved from a strided uint8 view of
+    it, which PIL copies into a contiguous plane. Only one channel's codes
+    are in memory at a time.
+    """
+    try:
+        own_errors = errors is None
+        if own_errors:
+            errors = lzw_logging.DecodeErrors(strict, logger)
+        with open(compressed_file_path, 'rb') as f:
+            with instrumentation.stage("load"):
+                width = int.from_bytes(f.read(2), byteorder='big')
+                height = int.from_bytes(f.read(2), byteorder='big')
+                lengths = [int.from_bytes(f.read(4), byteorder='big') for _ in range(3)]
+            
+            planes = np.empty((3, height, width), dtype=np.int16)
+            for channel, length in enumerate(lengths):
+                with instrumentation.stage("load"):
+                    compressed = np.fromfile(f, dtype='>u2', count=length).astype(np.uint16)
+                # Decoding straight into the plane truncates, or pads with zero residuals (128)
+                with instrumentation.stage("lzw"):
+                    lzw_numba.decompress_lzw(compressed, 256, 4096, lenient=not errors.strict,
+                                             errors=errors, out=planes[channel].reshape(-1),
+                                             fill=128)
+            del compressed
+        instrumentation.count("bytes_in", os.path.getsize(compressed_file_path))
+        instrumentation.count("codes_in", sum(lengths))
+        if own_errors:
+            errors.summary()
+        with instrumentation.stage("transform"):
+            planes -= 128
+            image_tools.restore_differences(planes)
+        
+        restored_file_path = os.path.splitext(compressed_file_path)[0] + "_restored.bmp"
+        with instrumentation.stage("write"):
+            # PIL copies the channels anyway, so the int16 buffer can go before merging them
+            channels = [image_tools.arr_to_PIL(plane) for plane in image_tools.uint8_view(planes)]
+            del planes
+            image_tools.merge_image(*channels).save(restored_file_path)
+        instrumentation.count("bytes_out", 3 * width * height)
+        logger.info(f"Image decompressed and saved as {restored_file_path}")
+        return restored_file_path
+    
+    except Exception as e:
+        logger.error(f"Error during decompression: {e}")
+        return None
+
 def main():
     # Read the compressed file
     compressed_file_path = "small_image_color_diff_compressed.lzw"
@@ -73,27 +118,18 @@ def main():
         b_length = int.from_bytes(f.read(4), byteorder='big')
         
         # Read compressed data for each channel
-        r_compressed = []
-        for _ in range(r_length):
-            code = int.from_bytes(f.read(2), byteorder='big')
-            r_compressed.append(code)
+        r_compressed = np.frombuffer(f.read(2 * r_length), dtype='>u2').astype(np.int32)
         
-        g_compressed = []
-        for _ in range(g_length):
-            code = int.from_bytes(f.read(2), byteorder='big')
-            g_compressed.append(code)
+        g_compressed = np.frombuffer(f.read(2 * g_length), dtype='>u2').astype(np.int32)
         
-        b_compressed = []
-        for _ in range(b_length):
-            code = int.from_bytes(f.read(2), byteorder='big')
-            b_compressed.append(code)
+        b_compressed = np.frombuffer(f.read(2 * b_length), dtype='>u2').astype(np.int32)
     
-    print(f"Decompressing color difference image with dimensions: {width}x{height}")
+    logger.info(f"Decompressing color difference image with dimensions: {width}x{height}")
     
     # Decompress each channel
-    r_decompressed = decompress_lzw(r_compressed)
-    g_decompressed = decompress_lzw(g_compressed)
-    b_decompressed = decompress_lzw(b_compressed)
+    r_decompressed = lzw_numba.decompress_lzw(r_compressed, 256, 4096, dtype=np.int16) - 128
+    g_decompressed = lzw_numba.decompress_lzw(g_compressed, 256, 4096, dtype=np.int16) - 128
+    b_decompressed = lzw_numba.decompress_lzw(b_compressed, 256, 4096, dtype=np.int16) - 128
     
     # Ensure we have the correct number of pixels for each channel
     expected_pixels = width * height
@@ -102,25 +138,25 @@ def main():
     if len(r_decompressed) > expected_pixels:
         r_decompressed = r_decompressed[:expected_pixels]
     elif len(r_decompressed) < expected_pixels:
-        print(f"Warning: Red channel has only {len(r_decompressed)} pixels, expected {expected_pixels}")
-        r_decompressed.extend([0] * (expected_pixels - len(r_decompressed)))
+        logger.warning(f"Red channel has only {len(r_decompressed)} pixels, expected {expected_pixels}")
+        r_decompressed = np.concatenate((r_decompressed, np.zeros(expected_pixels - len(r_decompressed), dtype=np.int16)))
     
     if len(g_decompressed) > expected_pixels:
         g_decompressed = g_decompressed[:expected_pixels]
     elif len(g_decompressed) < expected_pixels:
-        print(f"Warning: Green channel has only {len(g_decompressed)} pixels, expected {expected_pixels}")
-        g_decompressed.extend([0] * (expected_pixels - len(g_decompressed)))
+        logger.warning(f"Green channel has only {len(g_decompressed)} pixels, expected {expected_pixels}")
+        g_decompressed = np.concatenate((g_decompressed, np.zeros(expected_pixels - len(g_decompressed), dtype=np.int16)))
     
     if len(b_decompressed) > expected_pixels:
         b_decompressed = b_decompressed[:expected_pixels]
     elif len(b_decompressed) < expected_pixels:
-        print(f"Warning: Blue channel has only {len(b_decompressed)} pixels, expected {expected_pixels}")
-        b_decompressed.extend([0] * (expected_pixels - len(b_decompressed)))
+        logger.warning(f"Blue channel has only {len(b_decompressed)} pixels, expected {expected_pixels}")
+        b_decompressed = np.concatenate((b_decompressed, np.zeros(expected_pixels - len(b_decompressed), dtype=np.int16)))
     
     # Reshape to 2D arrays
-    r_diff_array = np.array(r_decompressed, dtype=np.int16).reshape((height, width))
-    g_diff_array = np.array(g_decompressed, dtype=np.int16).reshape((height, width))
-    b_diff_array = np.array(b_decompressed, dtype=np.int16).reshape((height, width))
+    r_diff_array = r_decompressed.reshape((height, width))
+    g_diff_array = g_decompressed.reshape((height, width))
+    b_diff_array = b_decompressed.reshape((height, width))
     
     # Restore original channels from differences
     r_restored = restore_from_difference_image(r_diff_array)
@@ -145,15 +181,16 @@ def main():
     original_array = image_tools.PIL2np(original_img)
     
     if np.array_equal(original_array, rgb_array):
-        print("Decompression successful! Original and restored images are identical.")
+        logger.info("Decompression successful! Original and restored images are identical.")
     else:
-        print("Decompression completed, but original and restored images are different.")
+        logger.info("Decompression completed, but original and restored images are different.")
         # Calculate the percentage of different pixels
         diff = np.sum(original_array != rgb_array)
         total = original_array.size
-        print(f"Different pixels: {diff}/{total} ({diff/total*100:.2f}%)")
+        logger.info(f"Different pixels: {diff}/{total} ({diff/total*100:.2f}%)")
     
-    print(f"Image decompressed and saved as {restored_file_path}")
+    logger.info(f"Image decompressed and saved as {restored_file_path}")
 
 if __name__ == "__main__":
+    lzw_logging.configure()
     main() 
\ No newline at end of file
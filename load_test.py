@@ -0,0 +1,88 @@
+"""Load test for lzw_server: reports p50/p99 latency and requests per second.
+
+Without --port a local server is started on a free loopback port.
+
+    python load_test.py --requests 200 --concurrency 8 --level 5 --file big_image.bmp
+"""
+import argparse
+import asyncio
+import time
+import lzw_server
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def run_load(host, port, path, body, total, concurrency):
+    """Send `total` requests, `concurrency` at a time; returns (latencies, statuses, seconds)."""
+    latencies = []
+    statuses = {}
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            status, _, _ = await lzw_server.request(host, port, "POST", path, body)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, statuses, time.perf_counter() - start
+
+
+async def main_async(args):
+    with open(args.file, 'rb') as f:
+        body = f.read()
+
+    server = None
+    host, port = args.host, args.port
+    if port is None:
+        server = await lzw_server.CompressionServer(host, 0, args.workers).start()
+        port = server.port
+        print(f"Started local server on port {port}")
+
+    try:
+        path = f"/compress?level={args.level}"
+        if args.decompress:
+            # Decompression is measured on a container made by the server itself
+            _, _, body = await lzw_server.request(host, port, "POST", path, body)
+            path = "/decompress"
+
+        # One request per worker first, so process start-up is not measured
+        await run_load(host, port, path, body, args.concurrency, args.concurrency)
+        latencies, statuses, elapsed = await run_load(host, port, path, body,
+                                                      args.requests, args.concurrency)
+    finally:
+        if server is not None:
+            await server.close()
+
+    print(f"Requests: {len(latencies)}, concurrency: {args.concurrency}, statuses: {statuses}")
+    print(f"p50 latency: {percentile(latencies, 0.50) * 1000:.1f} ms")
+    print(f"p99 latency: {percentile(latencies, 0.99) * 1000:.1f} ms")
+    print(f"Throughput: {len(latencies) / elapsed:.1f} requests/s "
+          f"({len(body) * len(latencies) / elapsed / 1e6:.1f} MB/s of input)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LZW server load test")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None, help="existing server (default: start one)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--file", default="big_image.bmp")
+    parser.add_argument("--level", type=int, default=5)
+    parser.add_argument("--decompress", action="store_true", help="load test /decompress instead")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
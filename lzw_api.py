@@ -0,0 +1,782 @@
+"""In-memory LZW compression API.
+
+compress() and decompress() work on bytes and NumPy arrays only: nothing is
+read from or written to disk and nothing is printed, so they can be embedded
+in other programs and services.
+
+Container layout::
+
+    b"LZWC" | header length (4 bytes, big endian) | JSON header | code streams
+
+Each code stream is a sequence of variable-width LZW codes (the width grows
+with the dictionary, from 8 bits up to the dictionary limit), packed MSB
+first and padded to a whole byte. The header holds the CRC32 of every packed
+stream ("crc32") and of the uncompressed data ("data_crc32"); streams are
+checked whenever they are read, and verify() checks a container without
+(or, optionally, with) decoding it.
+
+Progressive containers (compress(..., progressive=True), header version 2)
+store images Adam7-interlaced: one set of streams per pass, coarsest pass
+first, each with its own dictionary. preview() renders whatever passes a
+prefix of the container holds, so a viewer can show a 1/8 resolution image
+after the first few percent of the file.
+
+Pyramid containers (compress(..., pyramid=n), header version 2) store the
+image downsampled n times (2x2 mean), smallest level first, then each larger
+level as residuals against the nearest-neighbour upsampled level below it.
+decompress(blob, reduction=4) decodes only the levels up to 1/4 size, which
+is all a thumbnail needs.
+
+Restart containers (compress(..., restart_interval=n), header version 2)
+split the data into segments of n rows (n bytes for level 1), each coded
+with a fresh dictionary and its own prediction, preceded by a byte-aligned
+restart marker and listed in the header "offsets". Segments decode in
+parallel, and recover() decodes a damaged container by skipping the bad
+segments and resynchronizing on the markers of the following ones.
+
+Scanned containers (compress(..., scan="hilbert"), header version 2) feed
+each channel to LZW in another pixel order than row by row (see lzw_scan);
+the header "scan" and "tile" fields name the order. Levels 3 and 5 then
+predict every pixel from the one before it in that order.
+
+Containers coded with a preset dictionary (compress(..., dictionary=d),
+header version 2) record its ID in the header "dictionary" field, and
+codes are packed from the first code after the preset ("first_code"). The
+decoder loads the dictionary from its directory unless it is passed in
+(see lzw_dictionary).
+
+Color images (levels 4 and 5) with at most PALETTE_COLORS distinct colors
+are coded as one plane of palette indices with the level 2 (from level 4)
+or level 3 (from 5) engine: the header "level" is then 2 or 3, "palette"
+holds the colors as hex RRGGBB and the decoder maps the indices back to
+RGB. compress(..., palette=False) keeps the three channel planes.
+
+Streams that LZW would not shrink (noise, already compressed data) are
+stored: the header "stored" field lists them and they hold the raw
+symbols. Large streams are sampled first: when the sample has near 8 bits
+of entropy and LZW does not shrink it either, the stream is stored without
+coding the rest. A container is never larger than its data plus the header.
+"""
+import concurrent.futures
+import contextvars
+import io
+import json
+import os
+import zlib
+import numpy as np
+import image_tools
+import instrumentation
+import lzw_dictionary
+import lzw_numba
+import lzw_scan
+
+MAGIC = b"LZWC"
+VERSION = 2  # Highest version read; version 1 containers have no interlace or pyramid
+
+# Dictionary limits used by each level, same as the level modules
+MAX_DICT_SIZE = {1: 65536, 2: 65535, 3: 4096, 4: 4096, 5: 4096}
+ALPHABET = 256
+RESIDUAL_OFFSET = 128  # Differences are stored as (diff + 128) mod 256
+PALETTE_COLORS = 256  # Color images with at most this many colors are coded as indices
+INDEX_LEVEL = {4: 2, 5: 3}  # Level coding the index plane of a color level
+
+SAMPLE_RUNS = 16  # Runs of SAMPLE_RUN symbols read by the compressibility estimate
+SAMPLE_RUN = 4096
+STORE_ENTROPY = 7.9  # Bits per symbol above which a stream is stored without trying LZW
+
+RESYNC_WINDOW = 64 * 1024  # How far recover() searches for a displaced restart marker
+
+# Adam7 passes: x start, y start, x step, y step, preview block width and height
+ADAM7 = [(0, 0, 8, 8, 8, 8), (4, 0, 8, 8, 4, 8), (0, 4, 4, 8, 4, 4), (2, 0, 4, 4, 2, 4),
+         (0, 2, 2, 4, 2, 2), (1, 0, 2, 2, 1, 2), (0, 1, 1, 2, 1, 1)]
+
+
+def code_widths(count, first_code=ALPHABET, max_size=4096):
+    """Bit width of each code: enough for the largest code possible at that point."""
+    entries = np.minimum(first_code + np.arange(count, dtype=np.int64), max_size)
+    return np.maximum(1, np.ceil(np.log2(np.maximum(entries, 1)))).astype(np.int64)
+
+
+def pack_codes(codes, first_code=ALPHABET, max_size=4096):
+    """Pack LZW codes into bytes using the growing code width."""
+    codes = np.asarray(codes, dtype=np.int64)
+    if len(codes) == 0:
+        return b""
+    widths = code_widths(len(codes), first_code, max_size)
+    ends = np.cumsum(widths)
+    bits = np.zeros(int(ends[-1]), dtype=np.uint8)
+    # Widths never decrease, so the codes having bit b form a suffix
+    for b in range(int(widths[-1])):
+        start = np.searchsorted(widths, b, side='right')
+        bits[ends[start:] - 1 - b] = (codes[start:] >> b) & 1
+    return np.packbits(bits).tobytes()
+
+
+def unpack_codes(data, count, first_code=ALPHABET, max_size=4096):
+    """Inverse of pack_codes for a stream holding `count` codes."""
+    if count == 0:
+        return np.zeros(0, dtype=np.int32)
+    widths = code_widths(count, first_code, max_size)
+    ends = np.cumsum(widths)
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8))
+    if len(bits) < ends[-1]:
+        raise ValueError("Code stream is truncated")
+    codes = np.zeros(count, dtype=np.int64)
+    for b in range(int(widths[-1])):
+        start = np.searchsorted(widths, b, side='right')
+        codes[start:] |= bits[ends[start:] - 1 - b].astype(np.int64) << b
+    return codes.astype(np.int32)
+
+
+def encode_residuals(channel):
+    """Difference image of a uint8 channel as LZW symbols (lossless, mod 256).
+
+    Same predictor as level 3/5: the left neighbour, and the pixel above
+    for the first column. Differences wrap around instead of being clipped.
+    """
+    channel = np.asarray(channel, dtype=np.uint8)
+    diff = np.empty_like(channel)
+    diff[:, 1:] = channel[:, 1:] - channel[:, :-1]
+    diff[1:, 0] = channel[1:, 0] - channel[:-1, 0]
+    diff[:1, :1] = channel[:1, :1]
+    diff += RESIDUAL_OFFSET
+    return diff
+
+
+def decode_residuals(symbols):
+    """Restore a uint8 channel from the symbols made by encode_residuals."""
+    diff = np.asarray(symbols, dtype=np.uint8) - np.uint8(RESIDUAL_OFFSET)
+    # Restore the first column, then each row (uint8 arithmetic wraps mod 256)
+    np.cumsum(diff[:, 0], out=diff[:, 0], dtype=np.uint8)
+    return np.cumsum(diff, axis=1, dtype=np.uint8)
+
+
+def _as_image(data, level):
+    """Convert the input of an image level to a uint8 array of the right shape."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        # Encoded image file contents (BMP, PNG, ...)
+        from PIL import Image
+        img = Image.open(io.BytesIO(bytes(data)))
+        img = img.convert("L" if level in (2, 3) else "RGB")
+        data = np.array(img)
+    arr = np.asarray(data)
+    if arr.dtype != np.uint8:
+        raise ValueError(f"Level {level} expects 8-bit pixels, got {arr.dtype}")
+    if level in (2, 3) and arr.ndim != 2:
+        raise ValueError(f"Level {level} expects a 2D grayscale array, got shape {arr.shape}")
+    if level in (4, 5) and (arr.ndim != 3 or arr.shape[2] != 3):
+        raise ValueError(f"Level {level} expects an RGB array (H, W, 3), got shape {arr.shape}")
+    return arr
+
+
+def _image_planes(img, level):
+    """Symbol planes of one image (or interlace pass): channels, as residuals for 3 and 5."""
+    channels = [img] if level in (2, 3) else [img[:, :, i] for i in range(3)]
+    if level in (3, 5):
+        # An empty pass of a very small image has nothing to predict
+        channels = [encode_residuals(c) if c.size else c for c in channels]
+    return channels
+
+
+def downsample(img):
+    """Halve an image with a rounded 2x2 mean; odd edges are replicated."""
+    height, width = img.shape[:2]
+    pad = ((0, height % 2), (0, width % 2)) + ((0, 0),) * (img.ndim - 2)
+    padded = np.pad(img, pad, mode="edge").astype(np.uint16)
+    total = padded[0::2, 0::2] + padded[1::2, 0::2] + padded[0::2, 1::2] + padded[1::2, 1::2]
+    return ((total + 2) // 4).astype(np.uint8)
+
+
+def upsample(img, shape):
+    """Nearest-neighbour double an image and crop it to `shape` (height, width, ...)."""
+    return img.repeat(2, axis=0).repeat(2, axis=1)[:shape[0], :shape[1]]
+
+
+def pyramid_shapes(shape, levels):
+    """Shapes of the full image and its `levels` downsampled versions, largest first."""
+    shapes = [list(shape)]
+    for _ in range(levels):
+        height, width = shapes[-1][:2]
+        shapes.append([(height + 1) // 2, (width + 1) // 2] + shapes[-1][2:])
+    return shapes
+
+
+def _split_channels(img):
+    return [img] if img.ndim == 2 else [img[:, :, i] for i in range(img.shape[2])]
+
+
+def restart_marker(index):
+    """Two-byte marker written before restart segment stream `index` (like JPEG RST0-7)."""
+    return bytes([0xFF, 0xD0 + index % 8])
+
+
+def _scanned_planes(img, level, order):
+    """Symbol planes of an image read in a scan order, residuals along the scan for 3 and 5."""
+    planes = [lzw_scan.scan(channel, order) for channel in _split_channels(img)]
+    if level in (3, 5):
+        # A one-row image: each pixel is predicted from the one before it in the scan
+        planes = [encode_residuals(plane[np.newaxis])[0] if plane.size else plane
+                  for plane in planes]
+    return planes
+
+
+def _planes(data, level, progressive=False, pyramid=0, restart_interval=0, scan="raster"):
+    """Symbol planes to be LZW-compressed for a level, and the output header fields."""
+    scanned = scan != "raster"
+    if sum(1 for mode in (progressive, pyramid, restart_interval, scanned) if mode) > 1:
+        raise ValueError("Choose only one of progressive, pyramid, restart and scan modes")
+    if scan not in lzw_scan.ORDERS:
+        raise ValueError(f"Unknown scan order: {scan}")
+    if level == 1:
+        if progressive or pyramid or scanned:
+            raise ValueError("Progressive, pyramid and scan modes need an image level (2-5)")
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        symbols = np.frombuffer(bytes(data), dtype=np.uint8)
+        header = {"length": len(symbols), "data_crc32": zlib.crc32(symbols)}
+        if restart_interval:
+            segments = [symbols[start:start + restart_interval]
+                        for start in range(0, len(symbols), restart_interval)]
+            return segments, dict(header, restart_interval=restart_interval)
+        return [symbols], header
+
+    arr = _as_image(data, level)
+    header = {"shape": list(arr.shape), "data_crc32": zlib.crc32(np.ascontiguousarray(arr))}
+    if restart_interval:
+        # Each segment of rows is predicted on its own, so it decodes independently
+        planes = []
+        for row in range(0, arr.shape[0], restart_interval):
+            planes.extend(_image_planes(arr[row:row + restart_interval], level))
+        return planes, dict(header, restart_interval=restart_interval)
+    if pyramid:
+        images = [arr]
+        for _ in range(pyramid):
+            images.append(downsample(images[-1]))
+        # Smallest level coded like a normal image, then residuals of each larger one
+        planes = _image_planes(images[-1], level)
+        for k in range(pyramid - 1, -1, -1):
+            residual = images[k] - upsample(images[k + 1], images[k].shape) + np.uint8(RESIDUAL_OFFSET)
+            planes.extend(_split_channels(residual))
+        return planes, dict(header, pyramid=pyramid)
+    if scanned:
+        return _scanned_planes(arr, level, scan), dict(header, scan=scan, tile=lzw_scan.TILE)
+    if not progressive:
+        return _image_planes(arr, level), header
+    planes = []
+    for x, y, x_step, y_step, _, _ in ADAM7:
+        planes.extend(_image_planes(arr[y::y_step, x::x_step], level))
+    return planes, dict(header, interlace="adam7")
+
+
+def symbol_planes(data, level):
+    """Symbol planes that compress(data, level) would LZW-code in raster order.
+
+    Level 1 gives the bytes of the text, image levels their channels, as
+    residuals for levels 3 and 5. Used to train dictionaries and to sample.
+    """
+    return _planes(data, level)[0]
+
+
+def incompressible(symbols, first_code=ALPHABET, max_size=4096, preset=None):
+    """Whether evenly spaced runs of a large symbol array look incompressible to LZW.
+
+    The entropy of the sample rules most data out cheaply; a flat histogram
+    can still hide repeats (ramps, tiles), so the sample is then LZW coded.
+    """
+    symbols = symbols.ravel()
+    if len(symbols) <= SAMPLE_RUNS * SAMPLE_RUN:
+        return False  # Small enough to just try
+    starts = np.linspace(0, len(symbols) - SAMPLE_RUN, SAMPLE_RUNS).astype(np.intp)
+    sample = symbols[(starts[:, np.newaxis] + np.arange(SAMPLE_RUN)).ravel()]
+    if image_tools.entropy(sample) < STORE_ENTROPY:
+        return False
+    codes = lzw_numba.compress_lzw(sample, ALPHABET, max_size, preset)
+    return len(pack_codes(codes, first_code, max_size)) >= sample.nbytes
+
+
+def _preset(header, dictionary=None):
+    """Preset entries of the dictionary a container was coded with, or None.
+
+    `dictionary` (a lzw_dictionary.Dictionary) is used instead of loading
+    the one named in the header, and must be that one.
+    """
+    if "dictionary" not in header:
+        return None
+    if dictionary is None:
+        dictionary = lzw_dictionary.load(header["dictionary"])
+    elif dictionary.id != header["dictionary"]:
+        raise ValueError(f"Container needs dictionary {header['dictionary']:08x}, "
+                         f"not {dictionary.id:08x}")
+    return dictionary.entries
+
+
+def compress(data, level=5, progressive=False, pyramid=0, restart_interval=0, scan="raster",
+             dictionary=None, max_size=None, palette=True):
+    """Compress bytes (level 1) or an image array (levels 2-5) to a container blob.
+
+    Levels 2-5 also accept the bytes of an encoded image file, which is
+    converted to grayscale (2, 3) or RGB (4, 5) like the level modules do.
+    With `progressive` set, images are stored in Adam7 interlaced passes
+    (see preview()); with `pyramid` set to n, 1/2 ... 1/2**n size versions
+    are stored too (see decompress()); with `restart_interval` set, the data
+    is split into independently decodable segments (see recover()); with
+    `scan` set to one of lzw_scan.ORDERS, pixels are coded in that order.
+    `dictionary`, a lzw_dictionary.Dictionary trained for the level or the
+    ID of a stored one, presets the dictionary of every stream. `max_size`
+    overrides the dictionary size of the level (up to 65536, 16-bit codes).
+    With `palette` set, color images with few colors are coded as palette
+    indices (not with pyramid or dictionary).
+    """
+    if level not in MAX_DICT_SIZE:
+        raise ValueError(f"Unknown compression level: {level}")
+    colors = None
+    if palette and level in INDEX_LEVEL and not pyramid and dictionary is None:
+        with instrumentation.stage("transform"):
+            data = _as_image(data, level)
+            colors, indices = image_tools.palette_indices(data)
+        if len(colors) <= PALETTE_COLORS:
+            original, data, level = data, indices.astype(np.uint8), INDEX_LEVEL[level]
+        else:
+            colors = None
+    max_size = max_size or MAX_DICT_SIZE[level]
+    if not ALPHABET < max_size <= 65536:
+        raise ValueError(f"Dictionary size must be between {ALPHABET + 1} and 65536, got {max_size}")
+    preset = None
+    if dictionary is not None:
+        if isinstance(dictionary, int):
+            dictionary = lzw_dictionary.load(dictionary)
+        if dictionary.level != level:
+            raise ValueError(f"Dictionary {dictionary.id:08x} is for level {dictionary.level}")
+        if progressive or pyramid or restart_interval:
+            raise ValueError("Preset dictionaries are for plain containers only")
+        preset = dictionary.entries
+    with instrumentation.stage("transform"):
+        planes, header = _planes(data, level, progressive, pyramid, restart_interval, scan)
+    if colors is not None:
+        # The header describes the RGB image the decoder returns
+        header.update({"shape": list(original.shape), "palette": colors.tobytes().hex(),
+                       "data_crc32": zlib.crc32(np.ascontiguousarray(original))})
+
+    streams = []
+    position = 0  # Offset in the payload
+    header.update({"level": level, "max_size": max_size, "streams": [], "crc32": [],
+                   "stored": []})
+    first_code = ALPHABET
+    if preset is not None:
+        # Preset entries take the codes after the single symbols
+        first_code += len(preset)
+        if first_code >= max_size:
+            raise ValueError(f"Dictionary {dictionary.id:08x} does not fit {max_size} codes")
+        header.update({"dictionary": dictionary.id, "first_code": first_code})
+    if restart_interval:
+        header["offsets"] = []
+    for i, plane in enumerate(planes):
+        with instrumentation.stage("estimate"):
+            stored = incompressible(plane, first_code, max_size, preset)
+        if not stored:
+            with instrumentation.stage("lzw"):
+                codes = lzw_numba.compress_lzw(plane, ALPHABET, max_size, preset)
+            instrumentation.count_lzw(plane.size, len(codes), ALPHABET, max_size)
+            with instrumentation.stage("pack"):
+                packed = pack_codes(codes, first_code, max_size)
+            stored = len(packed) >= plane.nbytes
+        if stored:
+            # Raw symbols; their count takes the place of the code count
+            packed = np.ascontiguousarray(plane, dtype=np.uint8).tobytes()
+            codes = packed
+            header["stored"].append(i)
+        if restart_interval:
+            streams.append(restart_marker(i))
+            position += 2
+            header["offsets"].append(position)
+        header["streams"].append([len(codes), len(packed)])
+        header["crc32"].append(zlib.crc32(packed))
+        streams.append(packed)
+        position += len(packed)
+    instrumentation.count("stored_streams", len(header["stored"]))
+    if not header["stored"]:
+        del header["stored"]
+
+    modes = (progressive, pyramid, restart_interval, scan != "raster", preset is not None,
+             "stored" in header, colors is not None)
+    header["version"] = 2 if any(modes) else 1
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("ascii")
+    blob = b"".join([MAGIC, len(header_bytes).to_bytes(4, byteorder='big'), header_bytes] + streams)
+    instrumentation.count("bytes_in", sum(plane.nbytes for plane in planes))
+    instrumentation.count("bytes_out", len(blob))
+    return blob
+
+
+def read_header(blob):
+    """Parse the container header; returns (header dict, payload offset)."""
+    blob = memoryview(blob)
+    if bytes(blob[:4]) != MAGIC:
+        raise ValueError("Not an LZW container (bad magic)")
+    header_length = int.from_bytes(blob[4:8], byteorder='big')
+    if len(blob) < 8 + header_length:
+        raise ValueError("Container header is truncated")
+    header = json.loads(bytes(blob[8:8 + header_length]).decode("ascii"))
+    if header.get("version", 0) > VERSION:
+        raise ValueError(f"Unsupported container version: {header['version']}")
+    return header, 8 + header_length
+
+
+def stream_offsets(header, payload_offset):
+    """Absolute start of every stream: listed in restart containers, else back to back."""
+    if "offsets" in header:
+        return [payload_offset + offset for offset in header["offsets"]]
+    starts = np.cumsum([0] + [size for _, size in header["streams"]])[:-1]
+    return [payload_offset + int(start) for start in starts]
+
+
+def check_streams(blob, partial=False, limit=None):
+    """Byte ranges of the streams of a container after checking their CRC32.
+
+    Returns (header, list of memoryviews). Raises ValueError for a truncated
+    container (unless `partial`) or a stream whose checksum does not match.
+    Containers written before checksums were added are not checked.
+    """
+    header, payload_offset = read_header(blob)
+    blob = memoryview(blob)
+    checksums = header.get("crc32")
+    ranges = []
+    offsets = stream_offsets(header, payload_offset)
+    for i, ((_, size), offset) in enumerate(zip(header["streams"][:limit], offsets)):
+        if offset + size > len(blob):
+            if partial:
+                break
+            raise ValueError("Container is truncated")
+        data = blob[offset:offset + size]
+        if checksums is not None and zlib.crc32(data) != checksums[i]:
+            raise ValueError(f"Checksum mismatch in stream {i}")
+        ranges.append(data)
+    return header, ranges
+
+
+def _unpack(header, index, data):
+    """Codes of stream `index`; a stored stream gives its raw symbols as a uint8 array."""
+    count = header["streams"][index][0]
+    if index in header.get("stored", ()):
+        return np.frombuffer(data, dtype=np.uint8)
+    return unpack_codes(data, count, header.get("first_code", ALPHABET), header["max_size"])
+
+
+def _expand(stream, max_size, length, preset=None):
+    """The `length` symbols of an unpacked stream: LZW decoded, or copied if it was stored."""
+    if stream.dtype == np.uint8:
+        symbols = np.zeros(length, dtype=np.uint8)
+        symbols[:len(stream)] = stream[:length]
+        return symbols
+    with instrumentation.stage("lzw"):
+        return lzw_numba.decompress_lzw(stream, ALPHABET, max_size, length=length,
+                                        dtype=np.uint8, preset=preset)
+
+
+def read_streams(blob, partial=False, limit=None):
+    """Unpack the code streams of a container; returns (header, list of code arrays).
+
+    With `partial` set, a truncated container yields only its complete
+    streams; `limit` stops after that many streams. Stored streams are
+    returned as uint8 symbols.
+    """
+    header, ranges = check_streams(blob, partial, limit)
+    streams = []
+    with instrumentation.stage("unpack"):
+        for index, data in enumerate(ranges):
+            streams.append(_unpack(header, index, data))
+    instrumentation.count("bytes_in", len(blob))
+    return header, streams
+
+
+def _decode_plane(codes, level, max_size, height, width, preset=None):
+    """Decode one code stream to a (height, width) uint8 plane (level 0: raw symbols)."""
+    plane = _expand(codes, max_size, height * width, preset).reshape((height, width))
+    if level in (3, 5) and plane.size:
+        with instrumentation.stage("transform"):
+            plane = decode_residuals(plane)
+    return plane
+
+
+def _decode_image(header, streams, fill=False, dictionary=None):
+    """Decode the image streams of a container; returns (image, passes decoded).
+
+    Interlaced passes are decoded while all their streams are present. With
+    `fill` set, every pixel not decoded yet copies the nearest decoded pixel
+    above and to the left (Adam7 block preview).
+    """
+    level, max_size, shape = header["level"], header["max_size"], header["shape"]
+    height, width = shape[0], shape[1]
+    preset = _preset(header, dictionary)
+    channels = 1 if level in (2, 3) else 3
+    passes = ADAM7 if header.get("interlace") == "adam7" else [(0, 0, 1, 1, 1, 1)]
+
+    # A palette image decodes to indices first
+    result = np.zeros(shape[:2] if "palette" in header else shape, dtype=np.uint8)
+    decoded = 0
+    for p, (x, y, x_step, y_step, block_width, block_height) in enumerate(passes):
+        codes = streams[p * channels:(p + 1) * channels]
+        if len(codes) < channels:
+            break
+        sub_height, sub_width = len(range(y, height, y_step)), len(range(x, width, x_step))
+        if "scan" in header:
+            # Decoded as one row, so residuals are restored along the scan
+            order, tile = header["scan"], header["tile"]
+            planes = [lzw_scan.unscan(_decode_plane(c, level, max_size, 1, height * width, preset)[0],
+                                      order, (height, width), tile) for c in codes]
+        else:
+            planes = [_decode_plane(c, level, max_size, sub_height, sub_width, preset)
+                      for c in codes]
+        sub = planes[0] if channels == 1 else np.stack(planes, axis=2)
+        if not fill:
+            block_width = block_height = 1
+        for dy in range(block_height):
+            for dx in range(block_width):
+                target = result[y + dy::y_step, x + dx::x_step]
+                target[...] = sub[:target.shape[0], :target.shape[1]]
+        decoded += 1
+    if "palette" in header:
+        with instrumentation.stage("transform"):
+            # Padded to 256 colors, so indices from damaged streams stay in range
+            colors = np.zeros((256, 3), dtype=np.uint8)
+            stored = np.frombuffer(bytes.fromhex(header["palette"]), dtype=np.uint8).reshape(-1, 3)
+            colors[:len(stored)] = stored
+            result = colors[result]
+    return result, decoded
+
+
+def _decode_pyramid(header, streams, reduction):
+    """Decode a pyramid container up to the level `reduction` times smaller than the image."""
+    levels = header.get("pyramid", 0)
+    steps = reduction.bit_length() - 1
+    if reduction < 1 or reduction != 1 << steps or steps > levels:
+        raise ValueError(f"Reduction {reduction} not stored; the container has "
+                         f"{levels} pyramid levels (reductions 1 to {1 << levels})")
+    shapes = pyramid_shapes(header["shape"], levels)
+    channels = 1 if header["level"] in (2, 3) else 3
+    if len(streams) < channels * (levels - steps + 1):
+        raise ValueError("Container is truncated")
+
+    base_header = dict(header, shape=shapes[levels])
+    image, _ = _decode_image(base_header, streams[:channels])
+    for k in range(levels - 1, steps - 1, -1):
+        height, width = shapes[k][:2]
+        chunk = streams[channels * (levels - k):channels * (levels - k + 1)]
+        planes = [_decode_plane(codes, 0, header["max_size"], height, width) for codes in chunk]
+        residual = planes[0] if channels == 1 else np.stack(planes, axis=2)
+        with instrumentation.stage("transform"):
+            image = upsample(image, shapes[k]) + residual - np.uint8(RESIDUAL_OFFSET)
+    return image
+
+
+def _decode_segments(header, streams, workers=None, damaged=None):
+    """Decode a restart container segment by segment, in parallel threads.
+
+    `streams` are the packed streams (unpacked in the worker threads too) and
+    may hold None for streams that were lost. A segment that
+    cannot be decoded raises ValueError, or is left zeroed and its
+    (start, end) rows (bytes for level 1) appended to `damaged` if given.
+    """
+    level, interval = header["level"], header["restart_interval"]
+    if level == 1:
+        channels, total, result = 1, header["length"], np.zeros(header["length"], dtype=np.uint8)
+    else:
+        channels = 1 if level in (2, 3) else 3
+        total, result = header["shape"][0], np.zeros(header["shape"], dtype=np.uint8)
+
+    def decode(index):
+        start, end = index * interval, min((index + 1) * interval, total)
+        packed = streams[index * channels:(index + 1) * channels]
+        if any(data is None for data in packed):
+            return start, end, None
+        try:
+            with instrumentation.stage("unpack"):
+                codes = [_unpack(header, index * channels + i, data)
+                         for i, data in enumerate(packed)]
+            if level == 1:
+                piece = _expand(codes[0], header["max_size"], end - start)
+            else:
+                piece, _ = _decode_image(dict(header, shape=[end - start] + header["shape"][1:]),
+                                         codes)
+        except ValueError:
+            if damaged is None:
+                raise
+            piece = None
+        return start, end, piece
+
+    segments = range(len(header["streams"]) // channels)
+    # The kernels release the GIL; each task gets a copy of the metrics context
+    tasks = [(contextvars.copy_context(), index) for index in segments]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        for start, end, piece in executor.map(lambda task: task[0].run(decode, task[1]), tasks):
+            if piece is None:
+                if damaged is None:
+                    raise ValueError(f"Segment {start}-{end} is missing")
+                damaged.append((start, end))
+            else:
+                result[start:end] = piece
+    return result
+
+
+def decompress(blob, reduction=1, workers=None, dictionary=None):
+    """Decompress a container blob: bytes for level 1, a uint8 array otherwise.
+
+    For pyramid containers `reduction` (2, 4, ...) selects a stored smaller
+    version; only the streams it depends on are decoded, so a prefix of
+    the blob holding them is enough. Restart containers are decoded with
+    up to `workers` threads. Containers coded with a preset dictionary use
+    `dictionary` if given, else the stored one named in the header.
+    """
+    if reduction != 1:
+        header, _ = read_header(blob)
+        channels = 1 if header["level"] in (2, 3) else 3
+        # Streams of the levels up to the requested one: the smallest first
+        needed = channels * (header.get("pyramid", 0) - (reduction.bit_length() - 1) + 1)
+        header, streams = read_streams(blob, partial=True, limit=max(needed, 0))
+        result = _decode_pyramid(header, streams, reduction)
+        instrumentation.count("bytes_out", result.nbytes)
+        return result
+
+    header, _ = read_header(blob)
+    if header.get("restart_interval"):
+        header, ranges = check_streams(blob)
+        instrumentation.count("bytes_in", len(blob))
+        result = _decode_segments(header, ranges, workers)
+        instrumentation.count("bytes_out", result.nbytes)
+        return result.tobytes() if header["level"] == 1 else result
+
+    header, streams = read_streams(blob)
+    level = header["level"]
+    max_size = header["max_size"]
+
+    if level == 1:
+        data = _expand(streams[0], max_size, header["length"], _preset(header, dictionary))
+        instrumentation.count("bytes_out", data.nbytes)
+        return data.tobytes()
+
+    if header.get("pyramid"):
+        result = _decode_pyramid(header, streams, 1)
+    else:
+        result, _ = _decode_image(header, streams, dictionary=dictionary)
+    instrumentation.count("bytes_out", result.nbytes)
+    return result
+
+
+def verify(blob, decode=False):
+    """Check a container without the original data; returns a list of problems.
+
+    Checks the header, that every stream is present and matches its CRC32
+    and that nothing follows the last stream. With `decode` set, a container
+    that passes is also decoded and compared with the stored data checksum.
+    An empty list means the container is intact.
+    """
+    try:
+        header, payload_offset = read_header(blob)
+    except ValueError as e:
+        return [str(e)]
+    blob = memoryview(blob)
+    checksums = header.get("crc32")
+    problems = [] if checksums is not None else ["No checksums stored (container predates them)"]
+    end = payload_offset
+    offsets = stream_offsets(header, payload_offset)
+    for i, ((_, size), offset) in enumerate(zip(header["streams"], offsets)):
+        data = blob[offset:offset + size]
+        if len(data) < size:
+            problems.append(f"Stream {i} is truncated")
+            return problems
+        if "offsets" in header and bytes(blob[offset - 2:offset]) != restart_marker(i):
+            problems.append(f"Restart marker missing before stream {i}")
+        if checksums is not None and zlib.crc32(data) != checksums[i]:
+            problems.append(f"Checksum mismatch in stream {i}")
+        end = offset + size
+    if end < len(blob):
+        problems.append(f"{len(blob) - end} unexpected bytes after the last stream")
+
+    if decode and not problems:
+        try:
+            result = decompress(blob)
+        except ValueError as e:
+            return [f"Decoding failed: {e}"]
+        if not isinstance(result, bytes):
+            result = np.ascontiguousarray(result)
+        if "data_crc32" in header and zlib.crc32(result) != header["data_crc32"]:
+            problems.append("Decoded data does not match its checksum")
+    return problems
+
+
+def _find_stream(blob, index, expected, size, checksum):
+    """Start of stream `index` near `expected`, resynchronizing on its restart marker.
+
+    A candidate is accepted only if the following `size` bytes match the
+    stream checksum; returns None when the stream cannot be found intact.
+    """
+    marker = restart_marker(index)
+    candidates = [expected]
+    position = blob.find(marker, max(0, expected - RESYNC_WINDOW))
+    while position != -1 and position <= expected + RESYNC_WINDOW:
+        candidates.append(position + len(marker))
+        position = blob.find(marker, position + 1)
+    for start in candidates:
+        data = blob[start:start + size]
+        if len(data) == size and zlib.crc32(data) == checksum:
+            return data
+    return None
+
+
+def recover(blob, workers=None):
+    """Decode a damaged restart container; returns (data, damaged segments).
+
+    Segments whose stream is corrupted or missing are skipped (left zeroed);
+    bytes inserted or lost before a segment are found again through its
+    restart marker. damaged lists (start, end) rows (byte offsets for level
+    1). The header itself must be intact.
+    """
+    header, payload_offset = read_header(blob)
+    if not header.get("restart_interval") or "crc32" not in header:
+        raise ValueError("Container has no restart segments; use decompress()")
+    blob = bytes(blob)
+    offsets = stream_offsets(header, payload_offset)
+    streams = [_find_stream(blob, i, offset, size, header["crc32"][i])
+               for i, ((_, size), offset) in enumerate(zip(header["streams"], offsets))]
+    instrumentation.count("bytes_in", len(blob))
+    damaged = []
+    result = _decode_segments(header, streams, workers, damaged)
+    instrumentation.count("damaged_segments", len(damaged))
+    return (result.tobytes() if header["level"] == 1 else result), damaged
+
+
+def thumbnail(blob, size):
+    """Smallest stored pyramid level whose longer side is at least `size` pixels.
+
+    Falls back to the full image when no stored level is large enough.
+    """
+    header, _ = read_header(blob)
+    shapes = pyramid_shapes(header["shape"], header.get("pyramid", 0))
+    reduction = 1
+    for k, shape in enumerate(shapes):
+        if max(shape[:2]) >= size:
+            reduction = 1 << k
+    return decompress(blob, reduction)
+
+
+def prefix_length(blob, passes):
+    """Bytes of a progressive container needed to preview its first `passes` passes.
+
+    Only the header has to be present in `blob`.
+    """
+    header, offset = read_header(blob)
+    channels = 1 if header["level"] in (2, 3) else 3
+    return offset + sum(size for _, size in header["streams"][:passes * channels])
+
+
+def preview(blob):
+    """Render a possibly truncated progressive container; returns (image, passes).
+
+    `image` has the full shape, with pixels of missing passes filled in from
+    the decoded ones; passes is how many of the 7 Adam7 passes it holds.
+    """
+    header, streams = read_streams(blob, partial=True)
+    if header["level"] == 1:
+        raise ValueError("Only image containers can be previewed")
+    if header.get("interlace") != "adam7" and len(streams) < len(header["streams"]):
+        raise ValueError("Container is truncated and not progressive")
+    return _decode_image(header, streams, fill=True)
@@ -0,0 +1,143 @@
+"""Automatic choice of level and parameters for an image.
+
+Whether the left-neighbour predictor (levels 3 and 5) pays off, and which
+scan order and dictionary size suit an image, depends on its content.
+choose() cuts a few evenly spaced stripes of rows out of the image, stacks
+them into a small sample and trial-compresses it with lzw_api under every
+candidate configuration, in threads (the LZW kernels release the GIL). The
+configuration with the lowest score wins:
+
+    compressed size / raw size + speed_weight * seconds per MB of raw data
+
+so speed_weight=0 picks the smallest output and a speed_weight of 0.01
+trades a second per MB for 1% of size.
+
+    python lzw_auto.py big_image.bmp big_image.lzc
+"""
+import argparse
+import concurrent.futures
+import contextvars
+import io
+import itertools
+import os
+import sys
+import time
+import numpy as np
+import image_tools
+import lzw_api
+import lzw_logging
+
+logger = lzw_logging.get_logger(__name__)
+
+STRIPES = 8
+STRIPE_ROWS = 32  # A whole row of lzw_scan tiles
+SCANS = ("raster", "serpentine", "hilbert")
+DICT_SIZES = (4096, 65536)
+
+
+def _as_image(data):
+    """A uint8 grayscale or RGB array from an array or the bytes of an image file."""
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        from PIL import Image
+        img = Image.open(io.BytesIO(bytes(data)))
+        data = np.array(img.convert("L" if img.mode in ("1", "L") else "RGB"))
+    arr = np.asarray(data)
+    if arr.dtype != np.uint8 or not (arr.ndim == 2 or (arr.ndim == 3 and arr.shape[2] == 3)):
+        raise ValueError(f"Expected a uint8 grayscale or RGB image, got {arr.dtype} {arr.shape}")
+    return arr
+
+
+def sample_stripes(img, stripes=STRIPES, rows=STRIPE_ROWS):
+    """Evenly spaced stripes of `rows` rows stacked into one image (or the whole small image)."""
+    if img.shape[0] <= stripes * rows:
+        return img
+    starts = np.linspace(0, img.shape[0] - rows, stripes).astype(np.intp)
+    return np.concatenate([img[start:start + rows] for start in starts])
+
+
+def candidates(img):
+    """(level, scan, max_size) configurations worth trying for an image."""
+    levels = (2, 3) if img.ndim == 2 else (4, 5)
+    return list(itertools.product(levels, SCANS, DICT_SIZES))
+
+
+def _trial(sample, level, scan, max_size):
+    start = time.perf_counter()
+    blob = lzw_api.compress(sample, level, scan=scan, max_size=max_size)
+    return len(blob), time.perf_counter() - start
+
+
+def choose(data, speed_weight=0.0, stripes=STRIPES, rows=STRIPE_ROWS, configurations=None,
+           workers=None):
+    """Pick the configuration for an image by trial-compressing a sample of it.
+
+    Returns a dict with the chosen level, scan and max_size, the estimated
+    ratio (raw / compressed) and compression speed (MB/s), the sample's
+    entropy in bits per symbol for that level, and every trial as rows of
+    (level, scan, max_size, ratio, MB/s).
+    """
+    img = _as_image(data)
+    sample = sample_stripes(img, stripes, rows)
+    configurations = configurations or candidates(img)
+    megabytes = sample.nbytes / 2 ** 20
+    _trial(sample[:2, :2], *configurations[0])  # Load the kernels before timing anything
+    # Each task gets a copy of the metrics context, like lzw_blocks.decode
+    tasks = [(contextvars.copy_context(), configuration) for configuration in configurations]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        results = list(executor.map(lambda task: task[0].run(_trial, sample, *task[1]), tasks))
+
+    trials = []
+    best = None
+    for (level, scan, max_size), (size, seconds) in zip(configurations, results):
+        score = size / sample.nbytes + speed_weight * seconds / max(megabytes, 1e-9)
+        trials.append((level, scan, max_size, sample.nbytes / size, megabytes / max(seconds, 1e-9)))
+        if best is None or score < best[0]:
+            best = (score, len(trials) - 1)
+    level, scan, max_size, ratio, speed = trials[best[1]]
+    planes = lzw_api.symbol_planes(sample, level)
+    symbols = np.concatenate([plane.ravel() for plane in planes])
+    decision = {"level": level, "scan": scan, "max_size": max_size, "ratio": ratio,
+                "speed": speed, "entropy": image_tools.entropy(symbols), "trials": trials}
+    logger.info(f"Chose level {level}, {scan} scan, {max_size} codes: "
+                f"estimated ratio {ratio:.2f} ({decision['entropy']:.2f} bits/symbol)")
+    return decision
+
+
+def compress(data, speed_weight=0.0, **options):
+    """Compress an image with the configuration choose() picks; returns (blob, decision)."""
+    img = _as_image(data)
+    decision = choose(img, speed_weight, **options)
+    blob = lzw_api.compress(img, decision["level"], scan=decision["scan"],
+                            max_size=decision["max_size"])
+    return blob, decision
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compress an image with automatically chosen "
+                                                 "settings")
+    parser.add_argument("input")
+    parser.add_argument("output", nargs="?", help="container to write (only report if omitted)")
+    parser.add_argument("--speed-weight", type=float, default=0.0,
+                        help="score cost of one second per MB, as a fraction of the raw size")
+    parser.add_argument("--stripes", type=int, default=STRIPES)
+    args = parser.parse_args(argv)
+
+    with open(args.input, 'rb') as f:
+        img = _as_image(f.read())
+    if args.output:
+        blob, decision = compress(img, args.speed_weight, stripes=args.stripes)
+        with open(args.output, 'wb') as f:
+            f.write(blob)
+    else:
+        decision = choose(img, args.speed_weight, stripes=args.stripes)
+    for level, scan, max_size, ratio, speed in decision["trials"]:
+        print(f"level {level} {scan:10} {max_size:6} codes: ratio {ratio:6.3f}, {speed:7.1f} MB/s")
+    print(f"Chose level {decision['level']}, {decision['scan']} scan, "
+          f"{decision['max_size']} codes: estimated ratio {decision['ratio']:.3f}")
+    if args.output:
+        print(f"{args.output}: ratio {img.nbytes / len(blob):.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""Block-structured text files (level 1) with random access.
+
+With `block_size` set, compress_text_file cuts the UTF-8 bytes of the text
+into blocks of at most that many bytes, each ending after a newline when
+the block holds one, and LZW codes every block with a fresh dictionary.
+An index in front of the codes maps text offsets and line numbers to
+blocks, so read_range() and read_lines() decode only the blocks they need
+and decode() spreads a whole file over threads. Layout:
+
+    b"LZWT" | block count (4) | text size (8) | line count (8)
+    | per block: text offset (8), first line (8), file offset (8), code count (4)
+    | 2-byte big-endian codes of every block
+
+The first line of a block is the number of newlines before it (lines are
+counted from 0 in the file). Offsets count from the start of the file.
+"""
+import bisect
+import concurrent.futures
+import contextvars
+import os
+import numpy as np
+import instrumentation
+import lzw_numba
+
+MAGIC = b"LZWT"
+HEADER_SIZE = 24
+ENTRY_SIZE = 28
+MAX_DICT_SIZE = 65536  # Codes fit in 2 bytes
+
+
+def split_blocks(data, block_size):
+    """Start offsets of the blocks of `data`: cut after the last newline within block_size."""
+    starts = []
+    start = 0
+    while start < len(data):
+        starts.append(start)
+        end = start + block_size
+        if end < len(data):
+            newline = data.rfind(b"\n", start, end)
+            if newline >= 0:
+                end = newline + 1
+        start = end
+    return starts or [0]
+
+
+def write_file(path, data, block_size):
+    """LZW code `data` (bytes) in blocks and write a block file; returns its size in bytes."""
+    starts = split_blocks(data, block_size)
+    ends = starts[1:] + [len(data)]
+    symbols = np.frombuffer(data, dtype=np.uint8)
+    streams = []
+    for start, end in zip(starts, ends):
+        codes = lzw_numba.compress_lzw(symbols[start:end], 256, MAX_DICT_SIZE)
+        instrumentation.count_lzw(end - start, len(codes), 256, MAX_DICT_SIZE)
+        streams.append(codes)
+
+    offset = HEADER_SIZE + ENTRY_SIZE * len(streams)
+    line = 0
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(streams).to_bytes(4, byteorder='big'))
+        f.write(len(data).to_bytes(8, byteorder='big'))
+        f.write(data.count(b"\n").to_bytes(8, byteorder='big'))
+        for start, end, codes in zip(starts, ends, streams):
+            f.write(start.to_bytes(8, byteorder='big'))
+            f.write(line.to_bytes(8, byteorder='big'))
+            f.write(offset.to_bytes(8, byteorder='big'))
+            f.write(len(codes).to_bytes(4, byteorder='big'))
+            offset += 2 * len(codes)
+            line += data.count(b"\n", start, end)
+        for codes in streams:
+            f.write(np.asarray(codes).astype('>u2').tobytes())
+    return offset
+
+
+class BlockIndex:
+    """Index of a block file: text size, line count and per block offsets, lines and code counts."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+            if header[:len(MAGIC)] != MAGIC or len(header) < HEADER_SIZE:
+                raise ValueError("Not a block LZW file")
+            count = int.from_bytes(header[4:8], byteorder='big')
+            table = f.read(ENTRY_SIZE * count)
+            file_size = f.seek(0, os.SEEK_END)
+        if count == 0 or len(table) < ENTRY_SIZE * count:
+            raise ValueError("Missing or truncated block index")
+        self.path = path
+        self.text_size = int.from_bytes(header[8:16], byteorder='big')
+        self.line_count = int.from_bytes(header[16:24], byteorder='big')
+        entries = [table[ENTRY_SIZE * i:ENTRY_SIZE * (i + 1)] for i in range(count)]
+        self.text_offsets = [int.from_bytes(e[0:8], byteorder='big') for e in entries]
+        self.first_lines = [int.from_bytes(e[8:16], byteorder='big') for e in entries]
+        self.file_offsets = [int.from_bytes(e[16:24], byteorder='big') for e in entries]
+        self.code_counts = [int.from_bytes(e[24:28], byteorder='big') for e in entries]
+        ends = self.text_offsets[1:] + [self.text_size]
+        for i, (start, end) in enumerate(zip(self.text_offsets, ends)):
+            if start > end or (i == 0 and start):
+                raise ValueError(f"Bad text offset {start} for block {i}")
+            if self.file_offsets[i] + 2 * self.code_counts[i] > file_size:
+                raise ValueError(f"Block {i} runs past the end of the file")
+
+    def __len__(self):
+        return len(self.text_offsets)
+
+    def block_size(self, block):
+        end = self.text_offsets[block + 1] if block + 1 < len(self) else self.text_size
+        return end - self.text_offsets[block]
+
+    def line_start(self, line):
+        """(block, newlines to skip from its start) where line `line` (from 0) starts.
+
+        Blocks end after a newline unless they hold none, so a block whose
+        first line is new starts exactly at that line.
+        """
+        block = bisect.bisect_left(self.first_lines, line)
+        if block < len(self) and self.first_lines[block] == line:
+            return block, 0
+        block = max(block - 1, 0)
+        return block, line - self.first_lines[block]
+
+
+def decode_block(index, block, f=None, errors=None):
+    """Decoded bytes of one block; `f` is an open file to read its codes from."""
+    if f is None:
+        with open(index.path, 'rb') as f:
+            return decode_block(index, block, f, errors)
+    f.seek(index.file_offsets[block])
+    count = index.code_counts[block]
+    codes = np.frombuffer(f.read(2 * count), dtype='>u2').astype(np.uint16)
+    size = index.block_size(block)
+    out = np.empty(size, dtype=np.uint8)
+    lenient = errors is None or not errors.strict
+    total, bad = lzw_numba.decode_into(codes, out, 256, MAX_DICT_SIZE, lenient)
+    if errors is not None:
+        errors.add("bad_codes", bad, "%d bad codes repaired in block %d", bad, block)
+        if total != size:
+            errors.report("length_mismatch", "Block %d decoded %d bytes, expected %d",
+                          block, total, size)
+    return out.tobytes()
+
+
+def _decode_blocks(index, blocks, errors=None):
+    with open(index.path, 'rb') as f:
+        return b"".join(decode_block(index, block, f, errors) for block in blocks)
+
+
+def read_range(path, start, end):
+    """Bytes start to end (exclusive) of the original text, decoding only the blocks holding them."""
+    index = BlockIndex(path)
+    start, end = max(start, 0), min(end, index.text_size)
+    if start >= end:
+        return b""
+    first = bisect.bisect_right(index.text_offsets, start) - 1
+    last = bisect.bisect_left(index.text_offsets, end) - 1
+    data = _decode_blocks(index, range(first, last + 1))
+    base = index.text_offsets[first]
+    return data[start - base:end - base]
+
+
+def _skip_lines(data, position, count):
+    """Offset in `data` after `count` more newlines from `position` (len(data) if it runs out)."""
+    for _ in range(count):
+        position = data.find(b"\n", position)
+        if position < 0:
+            return len(data)
+        position += 1
+    return position
+
+
+def read_lines(path, first, last):
+    """Lines first to last (counted from 1, inclusive) of the original text, as a string."""
+    index = BlockIndex(path)
+    first, last = max(first, 1), min(last, index.line_count + 1)
+    if first > last:
+        return ""
+    start_block, start_skip = index.line_start(first - 1)
+    end_block, end_skip = index.line_start(last)
+    if end_skip == 0 and end_block > start_block:
+        end_block -= 1  # The next line starts a block: these lines end with the one before
+        end_skip = None
+    data = _decode_blocks(index, range(start_block, end_block + 1))
+    start = _skip_lines(data, 0, start_skip)
+    if end_skip is None:
+        end = len(data)
+    else:
+        end_base = len(data) - index.block_size(end_block)
+        end = _skip_lines(data, end_base, end_skip)
+    return data[start:end].decode('utf-8')
+
+
+def decode(path, errors=None, workers=None):
+    """Decode a whole block file to bytes, blocks in parallel threads."""
+    index = BlockIndex(path)
+    # The kernels release the GIL; each task gets a copy of the metrics context
+    tasks = [(contextvars.copy_context(), block) for block in range(len(index))]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        blocks = executor.map(lambda task: task[0].run(decode_block, index, task[1], None, errors),
+                              tasks)
+        return b"".join(blocks)
@@ -0,0 +1,330 @@
+"""Caches for compressed outputs.
+
+CompressionCache sits in front of the compressors: results are stored under a
+key made of a fast hash of the input bytes plus the level and parameters, in
+a size-bounded in-process LRU tier backed by a size-bounded on-disk LRU tier.
+Repeat requests for the same input are served without compressing again.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+DEFAULT_CACHE_DIR = os.environ.get("LZW_CACHE_DIR",
+                                   os.path.join(os.path.expanduser("~"), ".cache", "lzw"))
+
+# level: (module, file compressor, output suffix, file format version). Bump the
+# version whenever a level's output changes so stale cached files are not served.
+FILE_COMPRESSORS = {
+    1: ("level1_compression", "compress_text_file", "_compressed.lzw", 2),
+    2: ("level2_compression", "compress_image_file", "_compressed.lzw", 3),
+    3: ("level3_compression", "compress_image_file", "_diff_compressed.lzw", 3),
+    4: ("level4_compression", "compress_image_file", "_color_compressed.lzw", 2),
+    5: ("level5_compression", "compress_image_file", "_color_diff_compressed.lzw", 1),
+}
+
+
+def cache_key(data, **params):
+    """Hex key for input bytes and compression parameters (xxh3 if available, else BLAKE2b)."""
+    h = xxhash.xxh3_128() if xxhash is not None else hashlib.blake2b(digest_size=16)
+    h.update(data)
+    h.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+def value_size(value):
+    """Bytes used by a cached value (bytes or NumPy array)."""
+    return value.nbytes if hasattr(value, "nbytes") else len(value)
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache bounded by the total size of its values."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = value_size(value)
+        if size > self.max_bytes:
+            return  # Would evict everything else and still not fit
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= value_size(old)
+            self.entries[key] = value
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.current_bytes -= value_size(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "entries": len(self.entries), "bytes": self.current_bytes}
+
+
+class DiskCache:
+    """Directory of cached blobs; least recently used files are evicted above max_bytes.
+
+    Recency is the file modification time, refreshed on every hit, so the
+    cache survives restarts and can be shared by several processes.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self.current_bytes = sum(size for _, _, size in self._scan())
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _scan(self):
+        """(mtime, path, size) of every cached file."""
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue  # Evicted by another process
+                files.append((stat.st_mtime, path, stat.st_size))
+        return files
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = f.read()
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so readers never see partial data
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(value)
+        with self.lock:
+            existed = os.path.exists(path)
+            os.replace(tmp_path, path)
+            if not existed:
+                self.current_bytes += len(value)
+            if self.current_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Remove the oldest files until the cache is 10% below its limit."""
+        files = sorted(self._scan())
+        self.current_bytes = sum(size for _, _, size in files)
+        target = self.max_bytes * 0.9
+        for _, path, size in files:
+            if self.current_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self.current_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            os.makedirs(self.directory, exist_ok=True)
+            self.current_bytes = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "bytes": self.current_bytes}
+
+
+class CompressionCache:
+    """Two-tier (memory, then disk) cache of compressed outputs."""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_disk_bytes=1024 ** 3,
+                 max_memory_bytes=64 * 1024 ** 2):
+        self.memory = LRUCache(max_memory_bytes)
+        self.disk = DiskCache(directory, max_disk_bytes) if directory else None
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.put(key, value)  # Promote to the memory tier
+        return value
+
+    def put(self, key, value):
+        self.memory.put(key, value)
+        if self.disk is not None:
+            self.disk.put(key, value)
+
+    def compress(self, data, level=5, progressive=False, pyramid=0, restart_interval=0,
+                 scan="raster", dictionary=None, max_size=None, palette=True):
+        """Cached lzw_api.compress for bytes or uint8 arrays."""
+        import numpy as np
+        import lzw_api
+        if isinstance(data, np.ndarray):
+            key_data = data.tobytes()
+            params = {"shape": list(data.shape), "dtype": str(data.dtype)}
+        else:
+            key_data = data.encode("utf-8") if isinstance(data, str) else bytes(data)
+            params = {}
+        if progressive:
+            params["progressive"] = True
+        if pyramid:
+            params["pyramid"] = pyramid
+        if restart_interval:
+            params["restart_interval"] = restart_interval
+        if scan != "raster":
+            params["scan"] = scan
+        if dictionary is not None:
+            params["dictionary"] = dictionary if isinstance(dictionary, int) else dictionary.id
+        if max_size:
+            params["max_size"] = max_size
+        if not palette:
+            params["palette"] = False
+        key = cache_key(key_data, function="lzw_api.compress", version=lzw_api.VERSION,
+                        level=level, **params)
+        blob = self.get(key)
+        if blob is None:
+            blob = lzw_api.compress(data, level, progressive, pyramid, restart_interval, scan,
+                                    dictionary, max_size, palette)
+            self.put(key, blob)
+        return blob
+
+    def compress_file(self, input_file_path, level, **options):
+        """Cached compress_text_file (level 1) or compress_image_file (levels 2-5).
+
+        `options` (block_size, segments, tuples) are passed to the compressor
+        and are part of the key. On a hit the cached output is written to the
+        path the compressor would have produced, and that path is returned.
+        """
+        import importlib
+        if level not in FILE_COMPRESSORS:
+            raise ValueError(f"No file compressor for level {level}")
+        module_name, function_name, suffix, version = FILE_COMPRESSORS[level]
+        compress_file = getattr(importlib.import_module(module_name), function_name)
+
+        output_file_path = os.path.splitext(input_file_path)[0] + suffix
+        with open(input_file_path, 'rb') as f:
+            key = cache_key(f.read(), level=level, version=version,
+                            function=f"{module_name}.{function_name}", **options)
+
+        blob = self.get(key)
+        if blob is not None:
+            with open(output_file_path, 'wb') as f:
+                f.write(blob)
+            return output_file_path
+
+        result = compress_file(input_file_path, **options)
+        if result is not None:
+            with open(result, 'rb') as f:
+                self.put(key, f.read())
+        return result
+
+    def stats(self):
+        stats = {"memory": self.memory.stats()}
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
+
+
+class DecodedImageCache:
+    """LRU cache of decoded image arrays, bounded by bytes.
+
+    Entries are keyed by absolute path, modification time, file size,
+    decoder and the decoder options that change its output (e.g. strict),
+    so a rewritten file is decoded again.
+    Cached arrays are read-only because every caller shares them.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 ** 2):
+        self.lru = LRUCache(max_bytes)
+
+    @property
+    def hits(self):
+        return self.lru.hits
+
+    @property
+    def misses(self):
+        return self.lru.misses
+
+    def key(self, path, decode, **options):
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size,
+                f"{decode.__module__}.{decode.__name__}", tuple(sorted(options.items())))
+
+    def get_or_decode(self, path, decode, errors=None, workers=None, **options):
+        """Return (array, cached): the cached array, or decode(path, **options) stored for next time.
+
+        `errors` (an lzw_logging.DecodeErrors) and `workers` are passed to
+        decode but are not part of the key: workers only sets parallelism,
+        and a cache hit decodes nothing, so it counts no errors.
+        """
+        key = self.key(path, decode, **options)
+        array = self.lru.get(key)
+        if array is not None:
+            return array, True
+        if errors is not None:
+            options["errors"] = errors
+        if workers is not None:
+            options["workers"] = workers
+        array = decode(path, **options)
+        array.flags.writeable = False
+        self.lru.put(key, array)
+        return array, False
+
+    def clear(self):
+        self.lru.clear()
+
+    def stats(self):
+        return self.lru.stats()
+
+
+# Shared by the level decoders; size it with LZW_DECODED_CACHE_BYTES
+decoded_images = DecodedImageCache(int(os.environ.get("LZW_DECODED_CACHE_BYTES", 256 * 1024 ** 2)))
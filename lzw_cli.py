@@ -0,0 +1,127 @@
+"""Single command-line entry point for all compression levels.
+
+    python lzw_cli.py compress --level 1 notes.txt more_notes.txt
+    python lzw_cli.py decompress --level 3 big_image_diff_compressed.lzw
+
+Level modules are imported only when a command needs them, so text jobs
+(level 1) never load NumPy, PIL, OpenCV or Numba. Several files can be
+given at once to pay the interpreter startup only once.
+
+--metrics PATH writes one JSON line of stage timings and counters per file
+("-" for standard output); --profile adds a cProfile and tracemalloc summary.
+Progress goes to stderr through logging: -q shows only warnings and errors,
+-v adds debug details. --strict makes decompression fail on the first bad
+code instead of repairing and counting it.
+
+--segments N (levels 2 and 3) codes images as N bands of rows with separate
+dictionaries; --workers sets how many processes decode such files.
+--block-size N (level 1) codes text in indexed blocks of about N bytes for
+random access (see lzw_blocks); --workers sets the decoding threads.
+--tuples (level 4) codes whole pixels through a palette instead of three
+channel planes, for images with few colors.
+"""
+import argparse
+import importlib
+import os
+import sys
+import instrumentation
+import lzw_logging
+
+# level: (compression module, function, decompression module, function)
+LEVELS = {
+    1: ("level1_compression", "compress_text_file", "level1_decompression", "decompress_text_file"),
+    2: ("level2_compression", "compress_image_file", "level2_decompression", "decompress_image_file"),
+    3: ("level3_compression", "compress_image_file", "level3_decompression", "decompress_image_file"),
+    4: ("level4_compression", "compress_image_file", "level4_decompression", "decompress_image_file"),
+    5: ("level5_compression", "compress_image_file", "level5_decompression", "decompress_image_file"),
+}
+
+
+def load_function(level, action):
+    """Import the module for a level on demand and return its file function."""
+    compress_module, compress_function, decompress_module, decompress_function = LEVELS[level]
+    if action == "compress":
+        module_name, function_name = compress_module, compress_function
+    else:
+        module_name, function_name = decompress_module, decompress_function
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LZW text and image compression")
+    parser.add_argument("action", choices=["compress", "decompress"])
+    parser.add_argument("files", nargs="+", help="input files")
+    parser.add_argument("-l", "--level", type=int, choices=sorted(LEVELS), default=1,
+                        help="1: text, 2: grayscale, 3: grayscale difference, "
+                             "4: color, 5: color difference")
+    parser.add_argument("--metrics", default=os.environ.get("LZW_METRICS"),
+                        help="append per-file metrics as JSON lines to this file ('-' for stdout)")
+    parser.add_argument("--profile", action="store_true",
+                        help="include cProfile and tracemalloc summaries in the metrics")
+    parser.add_argument("--strict", action="store_true",
+                        help="fail on the first bad code when decompressing")
+    parser.add_argument("--segments", type=int, default=1,
+                        help="levels 2 and 3: code images as this many independently decodable bands")
+    parser.add_argument("--block-size", type=int, default=0,
+                        help="level 1: code text as indexed blocks of about this many bytes")
+    parser.add_argument("--tuples", action="store_true",
+                        help="level 4: code palette indices of whole pixels (few-color images)")
+    parser.add_argument("--workers", type=int,
+                        help="levels 1-3: processes (threads for level 1) decoding a segmented "
+                             "or block file (default: CPUs)")
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument("-v", "--verbose", action="store_true", help="show debug messages")
+    verbosity.add_argument("-q", "--quiet", action="store_true",
+                           help="show only warnings and errors")
+    args = parser.parse_args(argv)
+    if args.segments > 1 and args.level not in (2, 3):
+        parser.error("--segments needs level 2 or 3")
+    if args.block_size and args.level != 1:
+        parser.error("--block-size needs level 1")
+    if args.tuples and args.level != 4:
+        parser.error("--tuples needs level 4")
+    if args.workers and args.level not in (1, 2, 3):
+        parser.error("--workers needs level 1, 2 or 3")
+
+    lzw_logging.configure("DEBUG" if args.verbose else "WARNING" if args.quiet else None)
+    process = load_function(args.level, args.action)
+    options = {}
+    if args.action == "compress" and args.segments > 1:
+        options["segments"] = args.segments
+    if args.action == "compress" and args.block_size:
+        options["block_size"] = args.block_size
+    if args.action == "compress" and args.tuples:
+        options["tuples"] = True
+    if args.action == "decompress":
+        if args.strict:
+            options["strict"] = True
+        if args.workers:
+            options["workers"] = args.workers
+    profile = "cprofile,tracemalloc" if args.profile else None
+    failed = 0
+    for path in args.files:
+        with instrumentation.collect(label=path, profile=profile) as metrics:
+            try:
+                result = process(path, **options)
+            except lzw_logging.DecodeError as e:
+                # --strict: report the bad file and go on with the others
+                lzw_logging.get_logger("cli").error(f"{path}: {e}")
+                result = None
+        if result is None:
+            failed += 1
+        if args.metrics:
+            write_metrics(args.metrics, metrics)
+    return 1 if failed else 0
+
+
+def write_metrics(destination, metrics):
+    """Append one JSON line of metrics to a file, or print it for '-'."""
+    if destination == "-":
+        print(metrics.to_json())
+        return
+    with open(destination, 'a') as f:
+        f.write(metrics.to_json() + "\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""Preset LZW dictionaries trained on sample data.
+
+LZW starts every stream with only the 256 single symbols, so a small file
+is over before its dictionary holds anything useful. A preset dictionary
+adds phrases that are common in a corpus (of texts, or of the symbol planes
+of an image level, residuals for levels 3 and 5) as the first codes after
+the single symbols. Encoder and decoder both start from it, like zstd
+dictionaries; lzw_api.compress(..., dictionary=d) records its ID in the
+container header and decompress() loads it by that ID.
+
+Dictionaries are stored one per file, named after their ID:
+
+    b"LZWD" | format version (1 byte) | level (1) | phrase count (4)
+    | per phrase: length (2), symbols
+
+The ID is the CRC32 of the whole file, so retraining on another corpus
+gives a new ID and containers keep finding the dictionary they need.
+
+    python lzw_dictionary.py train --level 1 samples/*.txt
+    python lzw_dictionary.py list
+"""
+import argparse
+import collections
+import functools
+import os
+import sys
+import zlib
+import numpy as np
+
+MAGIC = b"LZWD"
+FORMAT_VERSION = 1
+ALPHABET = 256
+DEFAULT_SIZE = 1024  # Phrases; leaves 2816 adaptive codes for levels 3-5
+DICTIONARY_DIR = os.environ.get("LZW_DICTIONARY_DIR",
+                                os.path.join(os.path.expanduser("~"), ".lzw", "dictionaries"))
+
+
+class Dictionary:
+    """Phrases (bytes of symbols) for one level, in code order from ALPHABET on.
+
+    Every phrase has at least two symbols and comes after the phrase one
+    symbol shorter, which is its prefix in the LZW dictionary.
+    """
+
+    def __init__(self, level, phrases):
+        self.level = level
+        self.phrases = [bytes(phrase) for phrase in phrases]
+        codes = {}
+        entries = np.empty((len(self.phrases), 2), dtype=np.int32)
+        for i, phrase in enumerate(self.phrases):
+            if len(phrase) < 2 or phrase in codes:
+                raise ValueError(f"Phrase {i} is too short or repeated")
+            prefix = phrase[:-1]
+            prefix_code = prefix[0] if len(prefix) == 1 else codes.get(prefix)
+            if prefix_code is None:
+                raise ValueError(f"Phrase {i} comes before its prefix")
+            entries[i] = prefix_code, phrase[-1]
+            codes[phrase] = ALPHABET + i
+        entries.flags.writeable = False
+        self.entries = entries  # (prefix code, symbol) rows for lzw_numba
+        self.id = zlib.crc32(self.to_bytes())
+
+    def to_bytes(self):
+        parts = [MAGIC, bytes([FORMAT_VERSION, self.level]),
+                 len(self.phrases).to_bytes(4, byteorder='big')]
+        for phrase in self.phrases:
+            parts.append(len(phrase).to_bytes(2, byteorder='big'))
+            parts.append(phrase)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:4] != MAGIC or len(data) < 10:
+            raise ValueError("Not an LZW dictionary")
+        if data[4] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported dictionary format version: {data[4]}")
+        count = int.from_bytes(data[6:10], byteorder='big')
+        phrases = []
+        position = 10
+        for _ in range(count):
+            size = int.from_bytes(data[position:position + 2], byteorder='big')
+            phrases.append(data[position + 2:position + 2 + size])
+            position += 2 + size
+        if position != len(data):
+            raise ValueError("Dictionary file is truncated or has trailing bytes")
+        return cls(data[5], phrases)
+
+
+def count_phrases(planes, max_size):
+    """How often LZW emits each phrase of two or more symbols when coding each plane alone."""
+    counts = collections.Counter()
+    for plane in planes:
+        data = np.ascontiguousarray(plane, dtype=np.uint8).tobytes()
+        known = set()
+        start = 0  # The current phrase is data[start:end]
+        for end in range(1, len(data)):
+            phrase = data[start:end + 1]
+            if phrase in known:
+                continue
+            if end - start > 1:
+                counts[data[start:end]] += 1
+            if len(known) + ALPHABET < max_size:
+                known.add(phrase)
+            start = end
+        if len(data) - start > 1:
+            counts[data[start:]] += 1
+    return counts
+
+
+def select_phrases(counts, size):
+    """The `size` phrases saving the most codes, with all their prefixes, in code order."""
+    selected = set()
+    ranked = sorted(counts, key=lambda phrase: (-counts[phrase] * (len(phrase) - 1), phrase))
+    for phrase in ranked:
+        missing = [phrase[:k] for k in range(2, len(phrase) + 1) if phrase[:k] not in selected]
+        if len(selected) + len(missing) <= size:
+            selected.update(missing)
+        if len(selected) == size:
+            break
+    # Shorter phrases first, so every prefix gets its code before it is used
+    return sorted(selected, key=lambda phrase: (len(phrase), phrase))
+
+
+def train(samples, level, size=DEFAULT_SIZE):
+    """Train a dictionary for `level` on samples accepted by lzw_api.compress."""
+    import lzw_api
+    max_size = lzw_api.MAX_DICT_SIZE[level]
+    if ALPHABET + size > max_size:
+        raise ValueError(f"Level {level} dictionaries hold at most {max_size - ALPHABET} phrases")
+    planes = []
+    for sample in samples:
+        planes.extend(lzw_api.symbol_planes(sample, level))
+    return Dictionary(level, select_phrases(count_phrases(planes, max_size), size))
+
+
+def dictionary_path(dictionary_id, directory=DICTIONARY_DIR):
+    return os.path.join(directory, f"{dictionary_id:08x}.lzwd")
+
+
+def save(dictionary, directory=DICTIONARY_DIR):
+    """Store a dictionary under its ID and return the path."""
+    os.makedirs(directory, exist_ok=True)
+    path = dictionary_path(dictionary.id, directory)
+    with open(path, 'wb') as f:
+        f.write(dictionary.to_bytes())
+    return path
+
+
+@functools.lru_cache(maxsize=32)
+def load(dictionary_id, directory=DICTIONARY_DIR):
+    """Load a stored dictionary by ID; raises ValueError if it is missing or damaged."""
+    try:
+        with open(dictionary_path(dictionary_id, directory), 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        raise ValueError(f"Dictionary {dictionary_id:08x} not found in {directory}") from None
+    if zlib.crc32(data) != dictionary_id:
+        raise ValueError(f"Dictionary {dictionary_id:08x} is damaged")
+    return Dictionary.from_bytes(data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train and list preset LZW dictionaries")
+    parser.add_argument("--dir", default=DICTIONARY_DIR, help="dictionary directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train_parser = commands.add_parser("train", help="train a dictionary on sample files")
+    train_parser.add_argument("files", nargs="+", help="text files (level 1) or images")
+    train_parser.add_argument("-l", "--level", type=int, choices=[1, 2, 3, 4, 5], default=1)
+    train_parser.add_argument("--size", type=int, default=DEFAULT_SIZE, help="number of phrases")
+    commands.add_parser("list", help="list the stored dictionaries")
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        samples = []
+        for path in args.files:
+            with open(path, 'rb') as f:
+                samples.append(f.read())
+        dictionary = train(samples, args.level, args.size)
+        path = save(dictionary, args.dir)
+        print(f"{dictionary.id:08x} level {dictionary.level}, "
+              f"{len(dictionary.phrases)} phrases: {path}")
+        return 0
+
+    names = sorted(os.listdir(args.dir)) if os.path.isdir(args.dir) else []
+    for name in names:
+        if not name.endswith(".lzwd"):
+            continue
+        with open(os.path.join(args.dir, name), 'rb') as f:
+            dictionary = Dictionary.from_bytes(f.read())
+        print(f"{dictionary.id:08x} level {dictionary.level}, {len(dictionary.phrases)} phrases")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
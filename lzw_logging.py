@@ -0,0 +1,131 @@
+"""Logging setup and decode error accounting for the LZW modules.
+
+All modules log through get_logger(__name__), i.e. children of the "lzw"
+logger, and print nothing themselves. Libraries embedding them stay quiet
+(only warnings reach Python's last-resort handler); scripts and the CLI call
+configure() to show progress messages, optionally at another level:
+
+    lzw_logging.configure("WARNING")   # or set LZW_LOG_LEVEL
+
+Decoders count bad input in a DecodeErrors object instead of printing one
+line per bad code: the first few of each kind are logged, the totals are
+logged once by summary() and added to the instrumentation counters, and in
+strict mode the first error raises DecodeError.
+"""
+import logging
+import os
+import sys
+import time
+import instrumentation
+
+LOGGER_NAME = "lzw"
+MAX_WARNINGS = 5  # Warnings logged per kind of decode error before only counting
+
+
+class DecodeError(ValueError):
+    """Bad compressed data found by a decoder running in strict mode."""
+
+
+def get_logger(name):
+    """Logger for a module, under the common "lzw" logger."""
+    if name == "__main__":
+        name = os.path.splitext(os.path.basename(sys.argv[0]))[0] or name
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+class RateLimitFilter(logging.Filter):
+    """Pass at most `burst` records per source line every `interval` seconds.
+
+    The number of records dropped is appended to the next record let
+    through from the same line.
+    """
+
+    def __init__(self, burst=10, interval=1.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.windows = {}  # (logger, line) -> [window start, passed, suppressed]
+
+    def filter(self, record):
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        window = self.windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            suppressed = window[2] if window is not None else 0
+            window = self.windows[key] = [now, 0, 0]
+            if suppressed:
+                record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        if window[1] >= self.burst:
+            window[2] += 1
+            return False
+        window[1] += 1
+        return True
+
+
+def configure(level=None, stream=None, burst=10, interval=1.0):
+    """Send "lzw" log records to stderr (or `stream`), rate limited per source line.
+
+    `level` defaults to $LZW_LOG_LEVEL, else INFO. Calling it again only
+    changes the level.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    if level is None:
+        level = os.environ.get("LZW_LOG_LEVEL", "INFO")
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    if not any(getattr(handler, "lzw_handler", False) for handler in logger.handlers):
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        handler.addFilter(RateLimitFilter(burst, interval))
+        handler.lzw_handler = True
+        logger.addHandler(handler)
+        logger.propagate = False
+    return logger
+
+
+class DecodeErrors:
+    """Counts of bad input found while decoding, by kind (e.g. "bad_codes").
+
+    The first `max_warnings` errors of each kind are logged, later ones are
+    only counted. With `strict` set the first error raises DecodeError.
+    The function that creates a DecodeErrors calls summary() when done;
+    callers can pass their own to read the counts afterwards.
+    """
+
+    def __init__(self, strict=False, logger=None, max_warnings=MAX_WARNINGS):
+        self.strict = strict
+        self.logger = logger or get_logger("decode")
+        self.max_warnings = max_warnings
+        self.counts = {}
+        self.unlogged = {}
+
+    def report(self, kind, message, *args):
+        """Record one error; raises DecodeError in strict mode."""
+        if self.strict:
+            raise DecodeError(message % args)
+        count = self.counts.get(kind, 0) + 1
+        self.counts[kind] = count
+        if count <= self.max_warnings:
+            self.logger.warning(message, *args)
+        else:
+            self.unlogged[kind] = self.unlogged.get(kind, 0) + 1
+
+    def add(self, kind, count, message, *args):
+        """Record `count` errors found in bulk (e.g. by a decode kernel) with one warning."""
+        if count <= 0:
+            return
+        if self.strict:
+            raise DecodeError(message % args)
+        self.counts[kind] = self.counts.get(kind, 0) + count
+        self.logger.warning(message, *args)
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def summary(self):
+        """Log totals of kinds that exceeded the warning limit, update the metrics, return the counts."""
+        for kind, count in self.counts.items():
+            if self.unlogged.get(kind):
+                self.logger.warning("%d %s in total (%d not shown)", count, kind, self.unlogged[kind])
+            instrumentation.count(kind, count)
+        return dict(self.counts)
@@ -0,0 +1,796 @@
+import contextlib
+import os
+import numpy as np
+import lzw_logging
+
+# Numba is optional: when it is missing (or disabled with LZW_NO_NUMBA=1) the
+# same API falls back to the dictionary-based pure Python implementation.
+try:
+    if os.environ.get("LZW_NO_NUMBA"):
+        raise ImportError("Numba disabled by LZW_NO_NUMBA")
+    import numba
+    HAVE_NUMBA = True
+except ImportError:
+    numba = None
+    HAVE_NUMBA = False
+
+EMPTY_KEY = -1
+NO_PRESET = np.zeros((0, 2), dtype=np.int32)
+
+
+def _jit(func):
+    """JIT-compile a kernel with an on-disk cache, or return it unchanged."""
+    if HAVE_NUMBA:
+        # cache=True stores the machine code next to the module (__pycache__),
+        # so only the very first run pays the compilation cost
+        return numba.njit(cache=True, nogil=True)(func)
+    return func
+
+
+def _table_size(max_size):
+    """Smallest power of two giving the hash table a load factor <= 0.5."""
+    size = 1
+    while size < 2 * max_size:
+        size *= 2
+    return size
+
+
+@_jit
+def _encode_kernel(symbols, alphabet, max_size, keys, values, next_code):
+    """LZW encoder using an open-addressing hash table of (prefix, symbol) keys."""
+    n = symbols.shape[0]
+    result = np.empty(max(n, 1), dtype=np.int32)
+    if n == 0:
+        return result[:0]
+
+    mask = keys.shape[0] - 1
+    w = np.int64(symbols[0])
+    count = 0
+
+    for i in range(1, n):
+        c = np.int64(symbols[i])
+        key = w * alphabet + c
+        slot = (key * 2654435761) & mask
+        found = False
+        while True:
+            stored = keys[slot]
+            if stored == key:
+                found = True
+                break
+            if stored == EMPTY_KEY:
+                break
+            slot = (slot + 1) & mask
+
+        if found:
+            w = np.int64(values[slot])
+        else:
+            result[count] = w
+            count += 1
+            # Add wc to the dictionary if we haven't exceeded the limit
+            if next_code < max_size:
+                keys[slot] = key
+                values[slot] = next_code
+                next_code += 1
+            w = c
+
+    # Output the code for w
+    result[count] = w
+    count += 1
+    return result[:count]
+
+
+@_jit
+def _preset_encode_table(preset, alphabet, keys, values):
+    """Insert preset entries (prefix code, symbol) as codes alphabet, alphabet + 1, ..."""
+    mask = keys.shape[0] - 1
+    for i in range(preset.shape[0]):
+        key = np.int64(preset[i, 0]) * alphabet + preset[i, 1]
+        slot = (key * 2654435761) & mask
+        while keys[slot] != EMPTY_KEY:
+            slot = (slot + 1) & mask
+        keys[slot] = key
+        values[slot] = alphabet + i
+
+
+@_jit
+def _init_decode_tables(alphabet, max_size, preset):
+    """Build the prefix/suffix/first/length arrays for the single symbols and preset entries."""
+    prefix = np.full(max_size, -1, dtype=np.int32)
+    suffix = np.zeros(max_size, dtype=np.int32)
+    first = np.zeros(max_size, dtype=np.int32)
+    length = np.zeros(max_size, dtype=np.int32)
+    for i in range(alphabet):
+        suffix[i] = i
+        first[i] = i
+        length[i] = 1
+    for i in range(preset.shape[0]):
+        code = alphabet + i
+        parent = preset[i, 0]
+        prefix[code] = parent
+        suffix[code] = preset[i, 1]
+        first[code] = first[parent]
+        length[code] = length[parent] + 1
+    return prefix, suffix, first, length
+
+
+@_jit
+def _decoded_length_kernel(codes, alphabet, max_size, preset):
+    """Number of symbols a code stream expands to (dictionary lengths only)."""
+    n = codes.shape[0]
+    if n == 0:
+        return 0
+    length = np.zeros(max_size, dtype=np.int64)
+    for i in range(alphabet):
+        length[i] = 1
+    for i in range(preset.shape[0]):
+        length[alphabet + i] = length[preset[i, 0]] + 1
+    next_code = alphabet + preset.shape[0]
+    prev = codes[0]
+    if prev >= next_code:
+        prev = 0
+    total = length[prev]
+    for i in range(1, n):
+        code = codes[i]
+        extra = 0
+        if code > next_code or (code == next_code and next_code >= max_size):
+            # Bad code: counted the same way the lenient decoder repairs it
+            if next_code < max_size:
+                code = next_code
+            else:
+                code = prev
+                extra = 1
+        if next_code < max_size:
+            length[next_code] = length[prev] + 1
+            next_code += 1
+        total += length[code] + extra
+        prev = code
+    return total
+
+
+@_jit
+def _decode_kernel(codes, alphabet, max_size, out, lenient, preset):
+    """LZW decoder writing symbols straight into the preallocated `out` array.
+
+    Symbols past the end of `out` are dropped. Returns the full decoded
+    length, so callers can detect truncation, and the number of bad codes
+    repaired in lenient mode.
+    """
+    n = codes.shape[0]
+    if n == 0:
+        return 0, 0
+    prefix, suffix, first, length = _init_decode_tables(alphabet, max_size, preset)
+    capacity = out.shape[0]
+    next_code = alphabet + preset.shape[0]
+    bad = 0
+
+    prev = codes[0]
+    if prev >= next_code:
+        if not lenient:
+            raise ValueError("Invalid first code")
+        prev = 0
+        bad += 1
+    # Write the entry for the first code (a preset phrase can be longer than 1)
+    pos = length[prev]
+    node = prev
+    for j in range(pos - 1, -1, -1):
+        if j < capacity:
+            out[j] = suffix[node]
+        node = prefix[node]
+
+    for i in range(1, n):
+        code = codes[i]
+        extra = -1
+        if code < next_code:
+            first_symbol = first[code]
+        elif code == next_code and next_code < max_size:
+            first_symbol = first[prev]
+        else:
+            if not lenient:
+                raise ValueError("Bad compressed code")
+            # Treat the bad code like the special case (w + w[0])
+            bad += 1
+            first_symbol = first[prev]
+            if next_code < max_size:
+                code = next_code
+            else:
+                code = prev
+                extra = first_symbol
+
+        # Add w + entry[0] to the dictionary
+        if next_code < max_size:
+            prefix[next_code] = prev
+            suffix[next_code] = first_symbol
+            first[next_code] = first[prev]
+            length[next_code] = length[prev] + 1
+            next_code += 1
+
+        # Write the entry for code backwards from its last symbol
+        size = length[code]
+        end = pos + size
+        node = code
+        for j in range(end - 1, pos - 1, -1):
+            if j < capacity:
+                out[j] = suffix[node]
+            node = prefix[node]
+        pos = end
+        if extra >= 0:
+            if pos < capacity:
+                out[pos] = extra
+            pos += 1
+        prev = code
+
+    return pos, bad
+
+
+@_jit
+def _search_kernel(codes, alphabet, max_size, delta, state, offset, line):
+    """Run a pattern automaton over the text of an LZW code stream without decoding it all.
+
+    `delta` is the (pattern length + 1, alphabet) transition table of a
+    KMP automaton. Every dictionary entry keeps its length, its newline
+    count, and the state and number of matches after reading it from
+    state 0, so an entry read in state 0 without matches is skipped in
+    constant time; only the others are expanded and scanned. Returns the
+    end offsets of the matches, the newlines before each end, and the
+    state, offset and newline count after the stream, to continue with
+    the next one.
+    """
+    m = delta.shape[0] - 1
+    n = codes.shape[0]
+    ends = np.empty(16, dtype=np.int64)
+    end_lines = np.empty(16, dtype=np.int64)
+    found = 0
+    if n == 0:
+        return ends[:0], end_lines[:0], state, offset, line
+
+    prefix = np.full(max_size, -1, dtype=np.int32)
+    suffix = np.zeros(max_size, dtype=np.int32)
+    first = np.zeros(max_size, dtype=np.int32)
+    length = np.zeros(max_size, dtype=np.int32)
+    end_state = np.zeros(max_size, dtype=np.int32)
+    matches = np.zeros(max_size, dtype=np.int32)
+    newlines = np.zeros(max_size, dtype=np.int32)
+    for i in range(alphabet):
+        suffix[i] = i
+        first[i] = i
+        length[i] = 1
+        end_state[i] = delta[0, i]
+        matches[i] = 1 if end_state[i] == m else 0
+        newlines[i] = 1 if i == 10 else 0
+    phrase = np.empty(64, dtype=np.int32)
+    next_code = alphabet
+    prev = 0
+
+    for i in range(n):
+        code = codes[i]
+        if i == 0:
+            if code >= alphabet:
+                raise ValueError("Invalid first code")
+        else:
+            if code > next_code or (code == next_code and next_code >= max_size):
+                raise ValueError("Bad compressed code")
+            if next_code < max_size:
+                symbol = first[code] if code < next_code else first[prev]
+                prefix[next_code] = prev
+                suffix[next_code] = symbol
+                first[next_code] = first[prev]
+                length[next_code] = length[prev] + 1
+                end_state[next_code] = delta[end_state[prev], symbol]
+                matches[next_code] = matches[prev] + (1 if end_state[next_code] == m else 0)
+                newlines[next_code] = newlines[prev] + (1 if symbol == 10 else 0)
+                next_code += 1
+
+        if state == 0 and matches[code] == 0:
+            state = end_state[code]
+        else:
+            size = length[code]
+            if size > phrase.shape[0]:
+                phrase = np.empty(2 * size, dtype=np.int32)
+            node = code
+            for j in range(size - 1, -1, -1):
+                phrase[j] = suffix[node]
+                node = prefix[node]
+            seen = 0
+            for j in range(size):
+                symbol = phrase[j]
+                state = delta[state, symbol]
+                if symbol == 10:
+                    seen += 1
+                if state == m:
+                    if found == ends.shape[0]:
+                        ends = np.concatenate((ends, np.empty(found, dtype=np.int64)))
+                        end_lines = np.concatenate((end_lines, np.empty(found, dtype=np.int64)))
+                    ends[found] = offset + j + 1
+                    end_lines[found] = line + seen
+                    found += 1
+        offset += length[code]
+        line += newlines[code]
+        prev = code
+
+    return ends[:found], end_lines[:found], state, offset, line
+
+
+@_jit
+def _encode_chunk_kernel(symbols, alphabet, max_size, keys, values, state):
+    """_encode_kernel for one chunk of a longer input.
+
+    `state` holds the next free code and the code of the phrase matched so
+    far (-1 before the first symbol); that phrase is only output once a
+    later chunk ends it, or by the caller at the end of the input.
+    """
+    n = symbols.shape[0]
+    result = np.empty(max(n, 1), dtype=np.int32)
+    mask = keys.shape[0] - 1
+    next_code = state[0]
+    w = state[1]
+    count = 0
+
+    for i in range(n):
+        c = np.int64(symbols[i])
+        if w < 0:
+            w = c
+            continue
+        key = w * alphabet + c
+        slot = (key * 2654435761) & mask
+        found = False
+        while True:
+            stored = keys[slot]
+            if stored == key:
+                found = True
+                break
+            if stored == EMPTY_KEY:
+                break
+            slot = (slot + 1) & mask
+
+        if found:
+            w = np.int64(values[slot])
+        else:
+            result[count] = w
+            count += 1
+            if next_code < max_size:
+                keys[slot] = key
+                values[slot] = next_code
+                next_code += 1
+            w = c
+
+    state[0] = next_code
+    state[1] = w
+    return result[:count]
+
+
+@_jit
+def _decode_chunk_kernel(codes, alphabet, max_size, prefix, suffix, first, length, state, out,
+                         lenient):
+    """_decode_kernel for one chunk of a longer code stream.
+
+    The tables and `state` (next free code, previous code or -1 before the
+    first, bad codes repaired) carry over between chunks. Decoding stops
+    before the first code whose entry does not fit in `out`; returns the
+    number of codes used and of symbols written.
+    """
+    capacity = out.shape[0]
+    next_code = state[0]
+    prev = state[1]
+    bad = state[2]
+    pos = 0
+    used = 0
+
+    for i in range(codes.shape[0]):
+        code = codes[i]
+        extra = -1
+        repaired = 0
+        if prev < 0:
+            if code >= next_code:
+                if not lenient:
+                    raise ValueError("Invalid first code")
+                code = 0
+                repaired = 1
+            size = length[code]
+        elif code < next_code:
+            size = length[code]
+        elif code == next_code and next_code < max_size:
+            size = length[prev] + 1
+        else:
+            if not lenient:
+                raise ValueError("Bad compressed code")
+            # Treat the bad code like the special case (w + w[0])
+            repaired = 1
+            size = length[prev] + 1
+            if next_code < max_size:
+                code = next_code
+            else:
+                code = prev
+                extra = first[prev]
+        if pos + size > capacity:
+            break
+
+        if prev >= 0 and next_code < max_size:
+            # Add w + entry[0] to the dictionary
+            prefix[next_code] = prev
+            suffix[next_code] = first[code] if code < next_code else first[prev]
+            first[next_code] = first[prev]
+            length[next_code] = length[prev] + 1
+            next_code += 1
+
+        # Write the entry for code backwards from its last symbol
+        end = pos + length[code]
+        node = code
+        for j in range(end - 1, pos - 1, -1):
+            out[j] = suffix[node]
+            node = prefix[node]
+        pos = end
+        if extra >= 0:
+            out[pos] = extra
+            pos += 1
+        bad += repaired
+        prev = code
+        used = i + 1
+
+    state[0] = next_code
+    state[1] = prev
+    state[2] = bad
+    return used, pos
+
+
+def _encode_python(symbols, alphabet, max_size, preset=NO_PRESET):
+    """Dictionary-based fallback encoder used when Numba is not available."""
+    dictionary = {(prefix, symbol): alphabet + i for i, (prefix, symbol) in enumerate(preset.tolist())}
+    data = symbols.tolist()
+    if not data:
+        return np.zeros(0, dtype=np.int32)
+    next_code = alphabet + len(preset)
+    w = data[0]
+    result = []
+    for c in data[1:]:
+        wc = (w, c)
+        if wc in dictionary:
+            w = dictionary[wc]
+        else:
+            result.append(w)
+            if next_code < max_size:
+                dictionary[wc] = next_code
+                next_code += 1
+            w = c
+    result.append(w)
+    return np.array(result, dtype=np.int32)
+
+
+def _decode_python(codes, alphabet, max_size, lenient, preset=NO_PRESET):
+    """Dictionary-based fallback decoder; returns (symbols, number of bad codes repaired)."""
+    codes = codes.tolist()
+    if not codes:
+        return [], 0
+    dictionary = {i: [i] for i in range(alphabet)}
+    for i, (prefix, symbol) in enumerate(preset.tolist()):
+        dictionary[alphabet + i] = dictionary[prefix] + [symbol]
+    next_code = alphabet + len(preset)
+    bad = 0
+    current = codes[0]
+    if current >= next_code:
+        if not lenient:
+            raise ValueError(f"Invalid first code: {current}")
+        current = 0
+        bad += 1
+    w = dictionary[current]
+    result = list(w)
+    for k in codes[1:]:
+        if k in dictionary:
+            entry = dictionary[k]
+        elif k == next_code and next_code < max_size:
+            entry = w + [w[0]]
+        elif lenient:
+            entry = w + [w[0]]
+            bad += 1
+            if next_code >= max_size:
+                # Full dictionary: w + w[0] has no code, so w stays the previous
+                # phrase, exactly as in _decode_kernel
+                result.extend(entry)
+                continue
+        else:
+            raise ValueError(f"Bad compressed code: {k}")
+        result.extend(entry)
+        if next_code < max_size:
+            dictionary[next_code] = w + [entry[0]]
+            next_code += 1
+        w = entry
+    return result, bad
+
+
+@contextlib.contextmanager
+def _bad_codes():
+    """Re-raise a bad code found by a kernel or fallback decoder as lzw_logging.DecodeError.
+
+    Numba kernels can only raise plain ValueError, so the public decoders
+    translate it here and strict failures look the same on every path.
+    """
+    try:
+        yield
+    except lzw_logging.DecodeError:
+        raise
+    except ValueError as e:
+        raise lzw_logging.DecodeError(str(e)) from e
+
+
+def _as_codes(codes):
+    """Contiguous int32 codes for the kernels; native uint16 arrays are kept (half the memory)."""
+    codes = np.asarray(codes)
+    if codes.dtype == np.uint16 and codes.dtype.isnative:
+        return np.ascontiguousarray(codes)
+    return np.ascontiguousarray(codes, dtype=np.int32)
+
+
+def _as_preset(preset, alphabet, max_size):
+    """Preset entries as an (n, 2) int32 array of (prefix code, symbol); none for None."""
+    if preset is None:
+        return NO_PRESET
+    preset = np.ascontiguousarray(preset, dtype=np.int32).reshape(-1, 2)
+    if alphabet + len(preset) > max_size:
+        raise ValueError(f"{len(preset)} preset entries do not fit a dictionary of {max_size}")
+    return preset
+
+
+def compress_lzw(data, alphabet=256, max_size=4096, preset=None):
+    """Compress an integer array of symbols in [0, alphabet) to LZW codes.
+
+    Produces exactly the same codes as the dictionary-based compress_lzw
+    functions of the level modules for the same alphabet and dictionary limit.
+    `preset` entries (prefix code, symbol), each prefix a single symbol or an
+    earlier entry, start the dictionary at code `alphabet` (see lzw_dictionary).
+    """
+    symbols = np.ascontiguousarray(np.asarray(data).ravel(), dtype=np.int32)
+    preset = _as_preset(preset, alphabet, max_size)
+    if not HAVE_NUMBA:
+        return _encode_python(symbols, alphabet, max_size, preset)
+    table_size = _table_size(max_size)
+    keys = np.full(table_size, EMPTY_KEY, dtype=np.int64)
+    values = np.zeros(table_size, dtype=np.int32)
+    _preset_encode_table(preset, alphabet, keys, values)
+    return _encode_kernel(symbols, alphabet, max_size, keys, values, alphabet + len(preset))
+
+
+def decoded_length(codes, alphabet=256, max_size=4096, preset=None):
+    """Number of symbols the code stream decodes to."""
+    codes = _as_codes(codes)
+    preset = _as_preset(preset, alphabet, max_size)
+    if not HAVE_NUMBA:
+        return len(_decode_python(codes, alphabet, max_size, True, preset)[0])
+    return int(_decoded_length_kernel(codes, alphabet, max_size, preset))
+
+
+def decompress_lzw(codes, alphabet=256, max_size=4096, length=None,
+                   dtype=np.int32, lenient=False, errors=None, out=None, preset=None, fill=0):
+    """Decompress LZW codes to a NumPy array of symbols.
+
+    When `length` is given the output is truncated or padded with `fill` to
+    exactly that many symbols, as the image decoders expect. With `lenient` set, bad
+    codes are repaired as w + w[0] instead of raising lzw_logging.DecodeError. `out`, a
+    preallocated 1-D array, is filled and returned instead of a new array;
+    its size is the length. `preset` must be the one the codes were made with.
+
+    `errors` (an lzw_logging.DecodeErrors) receives the number of repaired
+    codes and any mismatch with `length`; in strict mode a mismatch raises.
+    """
+    codes = _as_codes(codes)
+    preset = _as_preset(preset, alphabet, max_size)
+    if out is not None:
+        length = len(out)
+        total, bad = decode_into(codes, out, alphabet, max_size, lenient, preset, fill)
+    elif not HAVE_NUMBA:
+        with _bad_codes():
+            result, bad = _decode_python(codes, alphabet, max_size, lenient, preset)
+        total = len(result)
+        if length is not None:
+            result = result[:length] + [fill] * max(0, length - len(result))
+        out = np.array(result, dtype=dtype)
+    else:
+        expected = length
+        if length is None:
+            length = int(_decoded_length_kernel(codes, alphabet, max_size, preset))
+        out = np.full(length, fill, dtype=dtype)
+        with _bad_codes():
+            total, bad = _decode_kernel(codes, alphabet, max_size, out, lenient, preset)
+        length = expected
+
+    if errors is not None:
+        errors.add("bad_codes", bad, "%d bad codes repaired", bad)
+        if length is not None and total != length:
+            errors.report("length_mismatch", "Decoded %d symbols, expected %d", total, length)
+    return out
+
+
+def decode_into(codes, out, alphabet=256, max_size=4096, lenient=False, preset=None, fill=0):
+    """Decode LZW codes into the preallocated 1-D array `out`.
+
+    Symbols past the end of `out` are dropped and the rest of it is set to
+    `fill` (e.g. the offset symbol of a zero residual).
+    Returns (number of symbols the stream decodes to, bad codes repaired),
+    for callers that check the length and count errors themselves. Without
+    `lenient` a bad code raises lzw_logging.DecodeError.
+    """
+    codes = _as_codes(codes)
+    preset = _as_preset(preset, alphabet, max_size)
+    if not HAVE_NUMBA:
+        with _bad_codes():
+            result, bad = _decode_python(codes, alphabet, max_size, lenient, preset)
+        total = len(result)
+        result = result[:len(out)]
+        out[:len(result)] = result
+    else:
+        with _bad_codes():
+            total, bad = _decode_kernel(codes, alphabet, max_size, out, lenient, preset)
+    out[total:] = fill
+    return int(total), int(bad)
+
+
+def pattern_automaton(pattern, alphabet=256):
+    """(len + 1, alphabet) KMP transition table for a sequence of symbols; state len is a match."""
+    pattern = list(pattern)
+    if not pattern:
+        raise ValueError("Empty pattern")
+    if max(pattern) >= alphabet:
+        raise ValueError(f"Pattern symbol {max(pattern)} is outside the alphabet")
+    delta = np.zeros((len(pattern) + 1, alphabet), dtype=np.int32)
+    delta[0, pattern[0]] = 1
+    restart = 0  # State after the pattern without its first symbol
+    for j in range(1, len(pattern) + 1):
+        delta[j] = delta[restart]
+        if j < len(pattern):
+            delta[j, pattern[j]] = j + 1
+            restart = delta[restart, pattern[j]]
+    return delta
+
+
+def search_lzw(codes, delta, alphabet=256, max_size=4096, state=0, offset=0, line=0):
+    """Find a pattern in the text of LZW codes; see _search_kernel for the result.
+
+    `delta` comes from pattern_automaton. state, offset and line continue
+    a search from the end of a previous stream.
+    """
+    codes = _as_codes(codes)
+    with _bad_codes():
+        ends, lines, state, offset, line = _search_kernel(codes, alphabet, max_size, delta,
+                                                          state, offset, line)
+    return ends, lines, int(state), int(offset), int(line)
+
+
+class StreamEncoder:
+    """LZW encoder fed in chunks, for inputs too large to hold in memory.
+
+    encode() returns the codes each chunk completes and finish() the last
+    one; together they are the codes compress_lzw gives for the whole input.
+    """
+
+    def __init__(self, alphabet=256, max_size=4096):
+        self.alphabet = alphabet
+        self.max_size = max_size
+        if HAVE_NUMBA:
+            table_size = _table_size(max_size)
+            self._keys = np.full(table_size, EMPTY_KEY, dtype=np.int64)
+            self._values = np.zeros(table_size, dtype=np.int32)
+            self._state = np.array([alphabet, -1], dtype=np.int64)
+        else:
+            self._dictionary = {}
+            self._next_code = alphabet
+            self._w = -1
+
+    def encode(self, data):
+        symbols = np.ascontiguousarray(np.asarray(data).ravel(), dtype=np.int32)
+        if HAVE_NUMBA:
+            return _encode_chunk_kernel(symbols, self.alphabet, self.max_size, self._keys,
+                                        self._values, self._state)
+        # Dictionary-based fallback, as in _encode_python
+        result = []
+        w = self._w
+        for c in symbols.tolist():
+            if w < 0:
+                w = c
+            elif (w, c) in self._dictionary:
+                w = self._dictionary[(w, c)]
+            else:
+                result.append(w)
+                if self._next_code < self.max_size:
+                    self._dictionary[(w, c)] = self._next_code
+                    self._next_code += 1
+                w = c
+        self._w = w
+        return np.array(result, dtype=np.int32)
+
+    def finish(self):
+        w = int(self._state[1]) if HAVE_NUMBA else self._w
+        return np.array([w] if w >= 0 else [], dtype=np.int32)
+
+
+class StreamDecoder:
+    """LZW decoder fed in chunks of codes; the inverse of StreamEncoder.
+
+    decode() returns the uint8 symbols of each chunk. With `lenient` set
+    bad codes are repaired as w + w[0] and counted in `bad`, else they
+    raise lzw_logging.DecodeError.
+    """
+
+    def __init__(self, alphabet=256, max_size=4096, lenient=False):
+        self.alphabet = alphabet
+        self.max_size = max_size
+        self.lenient = lenient
+        if HAVE_NUMBA:
+            self._tables = _init_decode_tables(alphabet, max_size, NO_PRESET)
+            self._state = np.array([alphabet, -1, 0], dtype=np.int64)
+        else:
+            self._dictionary = {i: [i] for i in range(alphabet)}
+            self._w = None
+            self._bad = 0
+
+    @property
+    def bad(self):
+        return int(self._state[2]) if HAVE_NUMBA else self._bad
+
+    def decode(self, codes):
+        codes = _as_codes(codes)
+        if not HAVE_NUMBA:
+            with _bad_codes():
+                return np.array(self._decode_python(codes.tolist()), dtype=np.uint8)
+        pieces = []
+        start = 0
+        while start < len(codes):
+            # Room for a few symbols per code; the loop continues where a chunk filled up
+            out = np.empty(max(4 * (len(codes) - start), self.max_size + 1), dtype=np.uint8)
+            with _bad_codes():
+                used, written = _decode_chunk_kernel(codes[start:], self.alphabet, self.max_size,
+                                                     *self._tables, self._state, out,
+                                                     self.lenient)
+            pieces.append(out[:written])
+            start += used
+        return np.concatenate(pieces) if pieces else np.zeros(0, dtype=np.uint8)
+
+    def _decode_python(self, codes):
+        # Dictionary-based fallback, as in _decode_python
+        dictionary = self._dictionary
+        result = []
+        for k in codes:
+            w = self._w
+            if w is None:
+                if k not in dictionary:
+                    if not self.lenient:
+                        raise ValueError(f"Invalid first code: {k}")
+                    k = 0
+                    self._bad += 1
+                entry = dictionary[k]
+            elif k in dictionary:
+                entry = dictionary[k]
+            elif k == len(dictionary) and len(dictionary) < self.max_size:
+                entry = w + [w[0]]
+            elif self.lenient:
+                entry = w + [w[0]]
+                self._bad += 1
+                if len(dictionary) >= self.max_size:
+                    # Full dictionary: keep w as the previous phrase, as the kernel does
+                    result.extend(entry)
+                    continue
+            else:
+                raise ValueError(f"Bad compressed code: {k}")
+            result.extend(entry)
+            if w is not None and len(dictionary) < self.max_size:
+                dictionary[len(dictionary)] = w + [entry[0]]
+            self._w = entry
+        return result
+
+
+def warm_up():
+    """Compile (or load from the on-disk cache) all kernels on a tiny input.
+
+    Long-running processes can call this at startup so the first real
+    request does not pay the JIT cost.
+    """
+    sample = np.array([1, 2, 1, 2, 1, 2, 1], dtype=np.int32)
+    codes = compress_lzw(sample)
+    # Each output dtype is a separate specialization of the decode kernel
+    for dtype in (np.uint8, np.int16, np.int32):
+        decompress_lzw(codes, dtype=dtype)
+        decompress_lzw(codes, length=len(sample), dtype=dtype, lenient=True)
+    # Decoders reading 16-bit codes pass them as uint16
+    for dtype in (np.int16, np.int32):
+        decompress_lzw(codes.astype(np.uint16), length=len(sample), dtype=dtype)
+    search_lzw(codes, pattern_automaton([1, 2]))
+    encoder = StreamEncoder()
+    StreamDecoder().decode(np.concatenate([encoder.encode(sample), encoder.finish()]))
+    return HAVE_NUMBA
@@ -0,0 +1,101 @@
+"""Pixel scan orders for the image containers.
+
+LZW sees an image as one sequence of pixels. In raster order every row ends
+with a jump back to the left edge, so a phrase rarely continues from one row
+into the next. The other orders keep consecutive pixels next to each other:
+
+    serpentine  rows alternately left to right and right to left
+    hilbert     square tiles in raster order, each along a Hilbert curve
+    zorder      square tiles in raster order, each in Morton (Z) order
+
+An order is a permutation of the row-major pixel indices. It is computed
+once per image shape and cached, then applied with NumPy fancy indexing.
+"""
+import functools
+import numpy as np
+
+ORDERS = ("raster", "serpentine", "hilbert", "zorder")
+TILE = 32  # Side of the hilbert and zorder tiles, a power of two
+
+
+def _hilbert_points(side):
+    """(x, y) of every point of a side x side Hilbert curve, in curve order."""
+    t = np.arange(side * side)
+    x = np.zeros_like(t)
+    y = np.zeros_like(t)
+    s = 1
+    while s < side:
+        rx = (t // 2) & 1
+        ry = (t ^ rx) & 1
+        # Rotate the quadrant so the sub-curves join up
+        flip = (ry == 0) & (rx == 1)
+        x[flip] = s - 1 - x[flip]
+        y[flip] = s - 1 - y[flip]
+        swap = ry == 0
+        x[swap], y[swap] = y[swap], x[swap]
+        x += s * rx
+        y += s * ry
+        t //= 4
+        s *= 2
+    return x, y
+
+
+def _zorder_points(side):
+    """(x, y) of every point of a side x side square in Morton order."""
+    t = np.arange(side * side)
+    x = np.zeros_like(t)
+    y = np.zeros_like(t)
+    for bit in range(max(side - 1, 0).bit_length()):
+        x |= ((t >> (2 * bit)) & 1) << bit
+        y |= ((t >> (2 * bit + 1)) & 1) << bit
+    return x, y
+
+
+@functools.lru_cache(maxsize=16)
+def scan_indices(order, height, width, tile=TILE):
+    """Read-only row-major indices of the pixels of a (height, width) image in scan order."""
+    if order not in ORDERS:
+        raise ValueError(f"Unknown scan order: {order}")
+    if order in ("hilbert", "zorder") and (tile < 1 or tile & (tile - 1)):
+        raise ValueError(f"Tile size must be a power of two, got {tile}")
+    grid = np.arange(height * width, dtype=np.intp).reshape(height, width)
+    if order == "raster":
+        indices = grid.ravel()
+    elif order == "serpentine":
+        grid[1::2] = grid[1::2, ::-1]
+        indices = grid.ravel()
+    else:
+        x, y = _hilbert_points(tile) if order == "hilbert" else _zorder_points(tile)
+        # Every tile position plus every curve point; edge tiles skip the points outside
+        tile_y, tile_x = np.mgrid[0:height:tile, 0:width:tile]
+        rows = tile_y.reshape(-1, 1) + y
+        cols = tile_x.reshape(-1, 1) + x
+        inside = (rows < height) & (cols < width)
+        indices = (rows * width + cols)[inside].astype(np.intp)
+    indices.flags.writeable = False
+    return indices
+
+
+@functools.lru_cache(maxsize=16)
+def inverse_indices(order, height, width, tile=TILE):
+    """Position in the scan of every row-major pixel: the inverse permutation."""
+    indices = scan_indices(order, height, width, tile)
+    inverse = np.empty_like(indices)
+    inverse[indices] = np.arange(len(indices), dtype=np.intp)
+    inverse.flags.writeable = False
+    return inverse
+
+
+def scan(plane, order, tile=TILE):
+    """The pixels of a 2D plane as a 1D array in scan order."""
+    if order == "raster":
+        return plane.ravel()
+    return plane.ravel()[scan_indices(order, plane.shape[0], plane.shape[1], tile)]
+
+
+def unscan(sequence, order, shape, tile=TILE):
+    """Put a 1D array in scan order back into a plane of `shape` (height, width)."""
+    height, width = shape
+    if order == "raster":
+        return sequence.reshape(shape)
+    return sequence[inverse_indices(order, height, width, tile)].reshape(shape)
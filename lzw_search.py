@@ -0,0 +1,81 @@
+"""Substring search in level 1 .lzw files without decompressing them.
+
+The code stream is run through a KMP automaton of the pattern while the
+LZW dictionary is rebuilt; each dictionary entry carries a summary (state
+and matches when read from the automaton start, length, newlines), so most
+codes advance the search in constant time and their text is never written
+out (see lzw_numba.search_lzw). Block files are searched block by block,
+with the automaton state carried over so matches across blocks are found.
+
+    python lzw_search.py ERROR app_compressed.lzw
+"""
+import argparse
+import sys
+import numpy as np
+import lzw_blocks
+import lzw_numba
+
+
+def _hits(ends, lines, pattern):
+    """(line from 1, offset) of the start of every match from match ends and newlines before them."""
+    pattern_newlines = pattern.count(b"\n")
+    return [(int(line) - pattern_newlines + 1, int(end) - len(pattern))
+            for end, line in zip(ends, lines)]
+
+
+def search(path, pattern):
+    """Every match of `pattern` in a level 1 .lzw file as (line number from 1, offset).
+
+    Offsets are in bytes of UTF-8 text for block files. Plain files hold
+    characters below 256 and give character offsets; a str pattern is
+    encoded to match.
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(len(lzw_blocks.MAGIC))
+    if magic == lzw_blocks.MAGIC:
+        if isinstance(pattern, str):
+            pattern = pattern.encode("utf-8")
+        delta = lzw_numba.pattern_automaton(pattern)
+        index = lzw_blocks.BlockIndex(path)
+        hits = []
+        state = 0
+        with open(path, 'rb') as f:
+            for block in range(len(index)):
+                f.seek(index.file_offsets[block])
+                count = index.code_counts[block]
+                codes = np.frombuffer(f.read(2 * count), dtype='>u2').astype(np.uint16)
+                ends, lines, state, _, _ = lzw_numba.search_lzw(
+                    codes, delta, 256, lzw_blocks.MAX_DICT_SIZE, state,
+                    index.text_offsets[block], index.first_lines[block])
+                hits.extend(_hits(ends, lines, pattern))
+        return hits
+
+    # Plain files: text length (4 bytes) and 4-byte codes, the dictionary never stops growing
+    if isinstance(pattern, str):
+        pattern = pattern.encode("latin-1")
+    delta = lzw_numba.pattern_automaton(pattern)
+    codes = np.fromfile(path, dtype='>u4', offset=4).astype(np.int32)
+    ends, lines, _, _, _ = lzw_numba.search_lzw(codes, delta, 256, 256 + len(codes))
+    return _hits(ends, lines, pattern)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Search level 1 .lzw files without decompressing")
+    parser.add_argument("pattern")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("-c", "--count", action="store_true", help="print only the number of matches")
+    args = parser.parse_args(argv)
+    found = False
+    for path in args.files:
+        hits = search(path, args.pattern)
+        found = found or bool(hits)
+        if args.count:
+            print(f"{path}:{len(hits)}")
+            continue
+        for line, offset in hits:
+            print(f"{path}:{line}:{offset}")
+    return 0 if found else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""Segmented code streams for the grayscale image files (levels 2 and 3).
+
+With `segments` set, the compressors split the image at row boundaries into
+segments that are LZW coded independently, each starting with a fresh
+dictionary, so the decoder can spread them over a process pool. Layout:
+
+    b"LZWS" | level (1 byte) | width (4) | height (4) | segment count (4)
+    | per segment: first row (4), byte offset (4), code count (4)
+    | 2-byte big-endian codes of every segment
+
+Offsets count from the start of the file. The workers decode their rows
+straight into one shared-memory image, so nothing is concatenated. Only
+the LZW streams are split: level 3 still predicts across segment
+boundaries and restores the whole difference image after decoding.
+
+16-bit images use the same layout with b"LZWW" as magic: they are split
+into a high and a low byte plane, stacked into one image of twice the
+height (first rows count through both), and every plane is banded
+separately, so it takes at least two segments.
+"""
+import concurrent.futures
+import os
+from multiprocessing import shared_memory
+import numpy as np
+import lzw_numba
+import instrumentation
+
+MAGIC = b"LZWS"
+MAGIC_WIDE = b"LZWW"  # Two byte planes of a 16-bit image
+HEADER_SIZE = 17
+ENTRY_SIZE = 12
+
+
+def segment_rows(height, segments):
+    """First row of each of (at most) `segments` bands of equal height."""
+    rows = max(1, -(-height // max(1, segments)))
+    return list(range(0, height, rows)) or [0]
+
+
+def is_segmented(path):
+    """True for segmented files, including the 16-bit ones."""
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) in (MAGIC, MAGIC_WIDE)
+
+
+def compress_rows(array, segments, alphabet=256, max_size=4096):
+    """Code each band of rows of a symbol array separately; returns (first rows, code arrays).
+
+    A 3-D array is a stack of planes, banded one plane at a time.
+    """
+    planes = array.reshape((-1,) + array.shape[-2:])
+    height = planes.shape[1]
+    stacked = planes.reshape(-1, planes.shape[2])
+    first_rows = [plane * height + first for plane in range(len(planes))
+                  for first in segment_rows(height, segments)]
+    stops = first_rows[1:] + [len(stacked)]
+    streams = []
+    for first, stop in zip(first_rows, stops):
+        codes = lzw_numba.compress_lzw(stacked[first:stop], alphabet, max_size)
+        instrumentation.count_lzw(stacked[first:stop].size, len(codes), alphabet, max_size)
+        streams.append(codes)
+    return first_rows, streams
+
+
+def write_file(path, level, width, height, first_rows, streams, planes=1):
+    """Write a segmented file (two planes: a 16-bit one) and return its size in bytes."""
+    if planes not in (1, 2):
+        raise ValueError(f"Files hold one or two byte planes, not {planes}")
+    offset = HEADER_SIZE + ENTRY_SIZE * len(streams)
+    with open(path, 'wb') as f:
+        f.write(MAGIC if planes == 1 else MAGIC_WIDE)
+        f.write(level.to_bytes(1, byteorder='big'))
+        f.write(width.to_bytes(4, byteorder='big'))
+        f.write(height.to_bytes(4, byteorder='big'))
+        f.write(len(streams).to_bytes(4, byteorder='big'))
+        for first_row, codes in zip(first_rows, streams):
+            f.write(first_row.to_bytes(4, byteorder='big'))
+            f.write(offset.to_bytes(4, byteorder='big'))
+            f.write(len(codes).to_bytes(4, byteorder='big'))
+            offset += 2 * len(codes)
+        for codes in streams:
+            f.write(np.asarray(codes).astype('>u2').tobytes())
+    return offset
+
+
+def read_file(path, level):
+    """(width, height, planes, [(first row, codes)]) of a segmented file written for `level`.
+
+    The segments cover planes * height rows of stacked planes.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(MAGIC)] not in (MAGIC, MAGIC_WIDE) or len(data) < HEADER_SIZE:
+        raise ValueError("Not a segmented LZW file")
+    planes = 1 if data[:len(MAGIC)] == MAGIC else 2
+    if data[4] != level:
+        raise ValueError(f"Segmented file is for level {data[4]}, not level {level}")
+    width = int.from_bytes(data[5:9], byteorder='big')
+    height = int.from_bytes(data[9:13], byteorder='big')
+    count = int.from_bytes(data[13:17], byteorder='big')
+    if count == 0 or HEADER_SIZE + ENTRY_SIZE * count > len(data):
+        raise ValueError("Missing or truncated segment table")
+
+    segments = []
+    previous_row = -1
+    for i in range(count):
+        entry = data[HEADER_SIZE + ENTRY_SIZE * i:HEADER_SIZE + ENTRY_SIZE * (i + 1)]
+        first_row = int.from_bytes(entry[0:4], byteorder='big')
+        offset = int.from_bytes(entry[4:8], byteorder='big')
+        code_count = int.from_bytes(entry[8:12], byteorder='big')
+        if first_row <= previous_row or first_row >= max(planes * height, 1) or (i == 0 and first_row):
+            raise ValueError(f"Bad first row {first_row} for segment {i}")
+        if offset + 2 * code_count > len(data):
+            raise ValueError(f"Segment {i} runs past the end of the file")
+        codes = np.frombuffer(data, dtype='>u2', count=code_count, offset=offset).astype(np.uint16)
+        segments.append((first_row, codes))
+        previous_row = first_row
+    return width, height, planes, segments
+
+
+def _decode_rows(image, first, stop, codes, alphabet, max_size, lenient, fill=0):
+    """Decode one segment into rows [first, stop) of `image`; returns (pixels decoded, bad codes)."""
+    return lzw_numba.decode_into(codes, image[first:stop].reshape(-1), alphabet, max_size,
+                                 lenient, fill=fill)
+
+
+def _decode_segment(name, shape, dtype, first, stop, codes, alphabet, max_size, lenient, fill):
+    """Process pool task: decode one segment into the shared image called `name`."""
+    memory = shared_memory.SharedMemory(name=name)
+    image = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+    # On an error the mapping stays open until the worker exits
+    result = _decode_rows(image, first, stop, codes, alphabet, max_size, lenient, fill)
+    del image  # The mapping cannot be closed while an array uses it
+    memory.close()
+    return result
+
+
+def decode(width, height, segments, alphabet=256, max_size=4096, dtype=np.uint8,
+           lenient=False, errors=None, workers=None, fill=0):
+    """Decode the segments of a file into one (height, width) array.
+
+    With more than one worker the segments are decoded by a process pool
+    into a shared-memory image. Bad codes (repaired when `lenient`) and
+    segments of the wrong length are recorded in `errors`; missing pixels of
+    a short segment are set to `fill`. Without `lenient` a bad code raises
+    lzw_logging.DecodeError (see lzw_numba).
+    """
+    shape = (height, width)
+    dtype = np.dtype(dtype)
+    stops = [first for first, _ in segments[1:]] + [height]
+    jobs = [(first, stop, codes) for (first, codes), stop in zip(segments, stops)]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(jobs))
+
+    if workers <= 1:
+        image = np.empty(shape, dtype=dtype)
+        results = [_decode_rows(image, first, stop, codes, alphabet, max_size, lenient, fill)
+                   for first, stop, codes in jobs]
+    else:
+        memory = shared_memory.SharedMemory(create=True, size=max(1, height * width * dtype.itemsize))
+        try:
+            with concurrent.futures.ProcessPoolExecutor(workers, initializer=lzw_numba.warm_up) as pool:
+                futures = [pool.submit(_decode_segment, memory.name, shape, dtype, first, stop,
+                                       codes, alphabet, max_size, lenient, fill)
+                           for first, stop, codes in jobs]
+                results = [future.result() for future in futures]
+            # One copy out of the shared block, which is unlinked below
+            image = np.ndarray(shape, dtype=dtype, buffer=memory.buf).copy()
+        finally:
+            memory.close()
+            memory.unlink()
+
+    if errors is not None:
+        for index, ((first, stop, _), (total, bad)) in enumerate(zip(jobs, results)):
+            errors.add("bad_codes", bad, "%d bad codes repaired in segment %d", bad, index)
+            expected = (stop - first) * width
+            if total != expected:
+                errors.report("length_mismatch", "Segment %d decoded %d pixels, expected %d",
+                              index, total, expected)
+    return image
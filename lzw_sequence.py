@@ -0,0 +1,153 @@
+"""Image sequences (camera frames, video) coded with temporal prediction.
+
+Every keyframe_interval-th frame is a keyframe coded on its own like level 5
+(level 3 for grayscale frames). The frames in between store their
+difference to the previous frame, (frame - previous + 128) mod 256, which
+is nearly constant wherever the scene did not change; with `spatial` set
+that difference also goes through the level 5/3 left-neighbour predictor,
+otherwise it is coded as plain planes like level 4/2. Everything is
+lossless, so the decoder predicts from exactly the frames the encoder saw.
+Each frame is an lzw_api container. Layout:
+
+    b"LZWQ" | header length (4 bytes, big endian) | JSON header | frame containers
+
+The header holds the frame shape, the keyframe interval and the [offset,
+size] of every frame container after the header, so decode_frame() seeks
+to the keyframe before a frame and decodes from there.
+
+    python lzw_sequence.py compress frames/ clip.lzq --keyframe-interval 30
+    python lzw_sequence.py decompress clip.lzq decoded/
+"""
+import argparse
+import json
+import os
+import sys
+import numpy as np
+import image_tools
+import lzw_api
+
+MAGIC = b"LZWQ"
+VERSION = 1
+IMAGE_EXTENSIONS = (".bmp", ".png", ".tif", ".tiff", ".ppm", ".pgm", ".jpg", ".jpeg")
+
+
+def read_frames(directory):
+    """Frames of a directory of images, in file name order, as uint8 arrays."""
+    for name in sorted(os.listdir(directory)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            img = image_tools.readPILimg(os.path.join(directory, name))
+            if img.mode not in ("L", "RGB"):
+                img = img.convert("RGB")
+            yield image_tools.PIL2np(img)
+
+
+def _levels(frame):
+    """(keyframe level, inter frame levels without and with the spatial predictor)."""
+    return (5, 4, 5) if frame.ndim == 3 else (3, 2, 3)
+
+
+def compress_frames(frames, keyframe_interval=30, spatial=False):
+    """Code an iterable (or stacked array) of equally shaped uint8 frames to a sequence blob."""
+    if keyframe_interval < 1:
+        raise ValueError(f"Keyframe interval must be at least 1, got {keyframe_interval}")
+    blobs = []
+    shape = None
+    previous = None
+    for index, frame in enumerate(frames):
+        frame = np.asarray(frame)
+        if shape is None:
+            shape = frame.shape
+        elif frame.shape != shape:
+            raise ValueError(f"Frame {index} has shape {frame.shape}, expected {shape}")
+        key_level, plain_level, spatial_level = _levels(frame)
+        if index % keyframe_interval == 0:
+            blobs.append(lzw_api.compress(frame, key_level))
+        else:
+            residual = frame - previous + np.uint8(lzw_api.RESIDUAL_OFFSET)
+            blobs.append(lzw_api.compress(residual, spatial_level if spatial else plain_level))
+        previous = frame
+    if shape is None:
+        raise ValueError("No frames to compress")
+
+    offsets = np.cumsum([0] + [len(blob) for blob in blobs])[:-1]
+    header = {"version": VERSION, "shape": list(shape), "keyframe_interval": keyframe_interval,
+              "spatial": spatial,
+              "frames": [[int(offset), len(blob)] for offset, blob in zip(offsets, blobs)]}
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("ascii")
+    return b"".join([MAGIC, len(header_bytes).to_bytes(4, byteorder='big'), header_bytes] + blobs)
+
+
+def read_header(blob):
+    """Parse the sequence header; returns (header dict, offset of the first frame)."""
+    blob = memoryview(blob)
+    if bytes(blob[:4]) != MAGIC:
+        raise ValueError("Not an LZW sequence (bad magic)")
+    header_length = int.from_bytes(blob[4:8], byteorder='big')
+    header = json.loads(bytes(blob[8:8 + header_length]).decode("ascii"))
+    if header.get("version", 0) > VERSION:
+        raise ValueError(f"Unsupported sequence version: {header['version']}")
+    return header, 8 + header_length
+
+
+def _decode(blob, header, payload_offset, index, previous):
+    """Decode frame `index`; `previous` is the decoded frame before it (None for keyframes)."""
+    offset, size = header["frames"][index]
+    start = payload_offset + offset
+    if start + size > len(blob):
+        raise ValueError(f"Sequence is truncated in frame {index}")
+    decoded = lzw_api.decompress(memoryview(blob)[start:start + size])
+    if index % header["keyframe_interval"] == 0:
+        return decoded
+    return previous + decoded - np.uint8(lzw_api.RESIDUAL_OFFSET)
+
+
+def decompress_frames(blob, start=0):
+    """Yield the frames of a sequence blob from frame `start` on."""
+    header, payload_offset = read_header(blob)
+    keyframe = start - start % header["keyframe_interval"]
+    frame = None
+    for index in range(keyframe, len(header["frames"])):
+        frame = _decode(blob, header, payload_offset, index, frame)
+        if index >= start:
+            yield frame
+
+
+def decode_frame(blob, index):
+    """One frame of a sequence, decoded from the keyframe before it."""
+    header, _ = read_header(blob)
+    if not 0 <= index < len(header["frames"]):
+        raise IndexError(f"Frame {index} out of range")
+    return next(decompress_frames(blob, index))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compress image sequences with temporal prediction")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compress_parser = commands.add_parser("compress", help="compress a directory of frames")
+    compress_parser.add_argument("directory")
+    compress_parser.add_argument("output")
+    compress_parser.add_argument("--keyframe-interval", type=int, default=30)
+    compress_parser.add_argument("--spatial", action="store_true",
+                                 help="also predict the frame differences from the left neighbour")
+    decompress_parser = commands.add_parser("decompress", help="write the frames as BMP files")
+    decompress_parser.add_argument("input")
+    decompress_parser.add_argument("directory")
+    args = parser.parse_args(argv)
+
+    if args.command == "compress":
+        blob = compress_frames(read_frames(args.directory), args.keyframe_interval, args.spatial)
+        with open(args.output, 'wb') as f:
+            f.write(blob)
+        print(f"{args.output}: {len(blob)} bytes")
+        return 0
+
+    with open(args.input, 'rb') as f:
+        blob = f.read()
+    os.makedirs(args.directory, exist_ok=True)
+    for index, frame in enumerate(decompress_frames(blob)):
+        image_tools.np2PIL(frame).save(os.path.join(args.directory, f"frame_{index:06d}.bmp"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
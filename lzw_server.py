@@ -0,0 +1,329 @@
+"""Asyncio HTTP server wrapping the LZW compressors.
+
+Endpoints::
+
+    POST /compress?level=N   body: text (level 1) or image file bytes (2-5);
+                             add &progressive=1 for an interlaced image container
+                             or &pyramid=N to also store 1/2 ... 1/2**N sizes
+                             or &restart=N for restart segments of N rows
+    POST /decompress         body: container made by /compress;
+                             ?reduction=N returns a stored smaller size
+    GET  /health
+
+LZW work runs in a process pool. Request and response bodies are streamed in
+chunks with flow control (reads are bounded, writes wait for drain()), at most
+`max_concurrency` jobs run at once and at most `max_queue` more may wait; any
+request beyond that is rejected with 503 so clients back off.
+
+Run with ``python lzw_server.py --port 8080 --workers 4``.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import io
+import os
+from urllib.parse import urlsplit, parse_qs
+import lzw_api
+import lzw_logging
+import lzw_numba
+
+CHUNK_SIZE = 64 * 1024
+MAX_HEADER_SIZE = 16 * 1024
+MAX_BODY_SIZE = 256 * 1024 * 1024
+
+logger = lzw_logging.get_logger(__name__)
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error",
+           503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    """Error that is reported to the client with the given status code."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def compress_job(body, level, progressive=False, pyramid=0, restart_interval=0):
+    """Worker process: compress a request body."""
+    try:
+        blob = lzw_api.compress(body, level, progressive, pyramid, restart_interval)
+    except OSError as e:
+        # PIL could not decode the uploaded image: bad input, not a server fault
+        raise ValueError(f"Cannot read image: {e}") from e
+    return blob, "application/octet-stream"
+
+
+def decompress_job(body, reduction=1):
+    """Worker process: decompress a container to raw bytes or a BMP image."""
+    result = lzw_api.decompress(body, reduction)
+    if isinstance(result, bytes):
+        return result, "application/octet-stream"
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.fromarray(result).save(buffer, "BMP")
+    return buffer.getvalue(), "image/bmp"
+
+
+async def read_headers(reader):
+    """Read the request line and headers; returns None when the client closed."""
+    try:
+        raw = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise HTTPError(400, "Incomplete request headers")
+    except asyncio.LimitOverrunError:
+        raise HTTPError(400, "Request headers too large")
+
+    lines = raw.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, f"Malformed request line: {lines[0]!r}")
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+    return method, target, version, headers
+
+
+async def read_body(reader, headers, max_size=MAX_BODY_SIZE):
+    """Read a Content-Length or chunked request body in bounded chunks."""
+    body = bytearray()
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size_line = await reader.readline()
+            try:
+                size = int(size_line.split(b";")[0].strip(), 16)
+            except ValueError:
+                raise HTTPError(400, "Malformed chunk size")
+            if size == 0:
+                await reader.readline()  # Empty trailer
+                return bytes(body)
+            if len(body) + size > max_size:
+                raise HTTPError(413, "Request body too large")
+            body += await reader.readexactly(size)
+            await reader.readline()  # CRLF after each chunk
+
+    if "content-length" not in headers:
+        raise HTTPError(411, "Content-Length or chunked encoding required")
+    length = headers["content-length"].strip()
+    if not (length.isascii() and length.isdigit()):
+        # The body cannot be skipped, so the connection has to be closed
+        raise HTTPError(400, f"Malformed Content-Length: {length!r}")
+    length = int(length)
+    if length > max_size:
+        raise HTTPError(413, "Request body too large")
+    while len(body) < length:
+        chunk = await reader.read(min(CHUNK_SIZE, length - len(body)))
+        if not chunk:
+            raise HTTPError(400, "Request body truncated")
+        body += chunk
+    return bytes(body)
+
+
+async def write_response(writer, status, body, content_type="text/plain", extra_headers=None,
+                         keep_alive=True):
+    """Send a response with a chunked body, waiting for the socket to drain."""
+    headers = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+               f"Content-Type: {content_type}",
+               "Transfer-Encoding: chunked",
+               f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    for name, value in (extra_headers or {}).items():
+        headers.append(f"{name}: {value}")
+    writer.write(("\r\n".join(headers) + "\r\n\r\n").encode("latin-1"))
+
+    view = memoryview(body)
+    for start in range(0, len(view), CHUNK_SIZE):
+        chunk = view[start:start + CHUNK_SIZE]
+        writer.write(f"{len(chunk):x}\r\n".encode("ascii"))
+        writer.write(chunk)
+        writer.write(b"\r\n")
+        # Backpressure: do not buffer more than the transport's high-water mark
+        await writer.drain()
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
+
+
+class CompressionServer:
+    """HTTP front end dispatching LZW jobs to a process pool."""
+
+    def __init__(self, host="127.0.0.1", port=8080, workers=None, max_concurrency=None,
+                 max_queue=64, max_body_size=MAX_BODY_SIZE):
+        self.host = host
+        self.port = port
+        self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                                                           initializer=lzw_numba.warm_up)
+        self.max_concurrency = max_concurrency or workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.max_body_size = max_body_size
+        self.slots = asyncio.Semaphore(self.max_concurrency)
+        self.waiting = 0
+        self.server = None
+        self.stats = {"requests": 0, "rejected": 0, "errors": 0}
+
+    async def start(self):
+        """Start listening; with port 0 the chosen port is stored in self.port."""
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port,
+                                                 limit=MAX_HEADER_SIZE)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        await self.start()
+        logger.info(f"LZW server listening on http://{self.host}:{self.port} "
+                    f"({self.max_concurrency} concurrent jobs)")
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.pool.shutdown(wait=True)
+
+    async def run_job(self, func, *args):
+        """Run a job in the pool, honouring the concurrency and queue limits."""
+        if self.slots.locked() and self.waiting >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise HTTPError(503, "Server busy, retry later")
+        self.waiting += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.waiting -= 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.pool, func, *args)
+        finally:
+            self.slots.release()
+
+    async def dispatch(self, method, target, body):
+        """Route a request to a job; returns (status, body, content type, headers)."""
+        url = urlsplit(target)
+        if url.path == "/health":
+            return 200, b"ok", "text/plain", {}
+        if url.path not in ("/compress", "/decompress"):
+            raise HTTPError(404, f"Unknown path: {url.path}")
+        if method != "POST":
+            raise HTTPError(405, "Use POST")
+
+        query = parse_qs(url.query)
+        if url.path == "/compress":
+            try:
+                level = int(query.get("level", ["5"])[0])
+                pyramid = int(query.get("pyramid", ["0"])[0])
+                restart_interval = int(query.get("restart", ["0"])[0])
+            except ValueError:
+                raise HTTPError(400, "level, pyramid and restart must be integers")
+            if level not in lzw_api.MAX_DICT_SIZE:
+                raise HTTPError(400, f"Unknown compression level: {level}")
+            progressive = query.get("progressive", ["0"])[0].lower() in ("1", "true", "yes")
+            result, content_type = await self.run_job(compress_job, body, level, progressive,
+                                                      pyramid, restart_interval)
+            return 200, result, content_type, {"X-LZW-Level": level}
+
+        try:
+            reduction = int(query.get("reduction", ["1"])[0])
+        except ValueError:
+            raise HTTPError(400, "reduction must be an integer")
+        result, content_type = await self.run_job(decompress_job, body, reduction)
+        return 200, result, content_type, {}
+
+    async def handle_connection(self, reader, writer):
+        """Serve requests on one keep-alive connection."""
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await read_headers(reader)
+                    if request is None:
+                        break
+                    method, target, version, headers = request
+                    keep_alive = (headers.get("connection", "").lower() != "close"
+                                  and version == "HTTP/1.1")
+                    body = b""
+                    if method == "POST":
+                        body = await read_body(reader, headers, self.max_body_size)
+                    self.stats["requests"] += 1
+                    status, result, content_type, extra = await self.dispatch(method, target, body)
+                except HTTPError as e:
+                    # The rest of the request may be unread, so close afterwards
+                    status, result, content_type, extra = e.status, str(e).encode(), "text/plain", {}
+                    keep_alive = False
+                except ValueError as e:
+                    # Invalid input detected by the compressor
+                    status, result, content_type, extra = 400, str(e).encode(), "text/plain", {}
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    logger.exception("Request failed")
+                    status, result, content_type, extra = 500, str(e).encode(), "text/plain", {}
+
+                await write_response(writer, status, result, content_type, extra, keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def request(host, port, method, path, body=b"", chunk_size=CHUNK_SIZE):
+    """Minimal loopback client; streams the body chunked and returns (status, headers, body)."""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write((f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+                      "Transfer-Encoding: chunked\r\nConnection: close\r\n\r\n").encode("latin-1"))
+        view = memoryview(body)
+        for start in range(0, len(view), chunk_size):
+            chunk = view[start:start + chunk_size]
+            writer.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+        status_line = await reader.readline()
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        response = await read_body(reader, headers)
+        return status, headers, response
+    finally:
+        writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LZW compression server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
+    parser.add_argument("--max-concurrency", type=int, default=None,
+                        help="jobs running at once (default: number of workers)")
+    parser.add_argument("--max-queue", type=int, default=64,
+                        help="requests waiting for a worker before 503 is returned")
+    args = parser.parse_args()
+
+    lzw_logging.configure()
+    server = CompressionServer(args.host, args.port, args.workers, args.max_concurrency,
+                               args.max_queue)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.pool.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    main()
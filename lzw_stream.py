@@ -0,0 +1,281 @@
+"""Row-streaming image compression for images too large to hold in memory.
+
+The encoder takes an iterator of rows (read_rows() streams them from an
+uncompressed BMP or a binary PGM/PPM file), applies the level 3/5
+difference predictor keeping only the previous row, and emits code bytes
+as it goes. The decoder turns code bytes back into rows and write_bmp()
+writes them to disk as they arrive. Memory use depends on the width, not
+the height. Layout:
+
+    b"LZWR" | channels (1 byte) | width (4) | height (4) | 2-byte big-endian codes
+
+The codes are one LZW stream (dictionary of 65536 codes) over the residual
+rows; a color row is stored as its red, green and blue residuals one after
+another. Residuals are the difference to the left neighbour, to the pixel
+above for the first column, plus 128 mod 256, as lzw_api.encode_residuals.
+
+    python lzw_stream.py compress huge.ppm huge.lzr
+    python lzw_stream.py decompress huge.lzr huge_restored.bmp
+"""
+import argparse
+import sys
+import numpy as np
+import instrumentation
+import lzw_logging
+import lzw_numba
+
+logger = lzw_logging.get_logger(__name__)
+
+MAGIC = b"LZWR"
+HEADER_SIZE = 13
+MAX_DICT_SIZE = 65536  # Codes fit 2 bytes
+RESIDUAL_OFFSET = 128
+ROWS_PER_CHUNK = 64  # Rows coded per call of the LZW kernel
+CODES_PER_READ = 64 * 1024
+
+
+def _read_bmp_rows(f, width, height, bits, channels, palette, data_offset):
+    """Rows of an uncompressed BMP, top first; bottom-up files are read backwards row by row."""
+    stride = (width * bits + 31) // 32 * 4
+    for i in range(abs(height)):
+        row_index = i if height < 0 else height - 1 - i
+        f.seek(data_offset + row_index * stride)
+        row = np.frombuffer(f.read(stride), dtype=np.uint8)
+        if len(row) < stride:
+            raise ValueError(f"BMP file is truncated in row {i}")
+        if bits == 8:
+            row = palette[row[:width], 0] if channels == 1 else palette[row[:width]]
+        else:
+            # BGR or BGRX (the fourth byte is unused) to RGB
+            row = row[:width * bits // 8].reshape(width, bits // 8)[:, 2::-1]
+        yield np.ascontiguousarray(row)
+
+
+def _open_bmp(f):
+    header = f.read(54)
+    data_offset = int.from_bytes(header[10:14], 'little')
+    info_size = int.from_bytes(header[14:18], 'little')
+    width = int.from_bytes(header[18:22], 'little', signed=True)
+    height = int.from_bytes(header[22:26], 'little', signed=True)
+    bits = int.from_bytes(header[28:30], 'little')
+    compression = int.from_bytes(header[30:34], 'little')
+    if bits not in (8, 24, 32) or compression != 0:
+        raise ValueError(f"Only uncompressed 8, 24 and 32-bit BMP files can be streamed "
+                         f"(got {bits} bits, compression {compression})")
+    palette = None
+    if bits == 8:
+        colors = int.from_bytes(header[46:50], 'little') or 256
+        f.seek(14 + info_size)
+        # Palette entries are BGRX; lookups give RGB
+        palette = np.frombuffer(f.read(4 * colors), dtype=np.uint8).reshape(-1, 4)[:, 2::-1]
+        palette = np.concatenate([palette, np.zeros((256 - len(palette), 3), dtype=np.uint8)])
+        channels = 1 if np.all(palette[:, :1] == palette) else 3
+    else:
+        channels = 3
+    return width, abs(height), channels, _read_bmp_rows(f, width, height, bits, channels,
+                                                        palette, data_offset)
+
+
+def _pnm_token(f):
+    """Next whitespace separated header token of a PNM file, skipping comments."""
+    token = b""
+    while True:
+        c = f.read(1)
+        if not c:
+            return token
+        if c == b"#":
+            f.readline()
+        elif c.isspace():
+            if token:
+                return token
+        else:
+            token += c
+
+
+def _open_pnm(f):
+    magic = f.read(2)
+    width, height, maxval = (int(_pnm_token(f)) for _ in range(3))
+    if maxval > 255:
+        raise ValueError("Only 8-bit PGM/PPM files can be streamed")
+    channels = 1 if magic == b"P5" else 3
+    row_size = width * channels
+
+    def rows():
+        for i in range(height):
+            row = np.frombuffer(f.read(row_size), dtype=np.uint8)
+            if len(row) < row_size:
+                raise ValueError(f"PNM file is truncated in row {i}")
+            yield row if channels == 1 else row.reshape(width, 3)
+    return width, height, channels, rows()
+
+
+def read_rows(f):
+    """(width, height, channels, row iterator) of an open BMP or binary PGM/PPM file.
+
+    Rows are uint8 arrays of shape (width,) for grayscale or (width, 3) for RGB.
+    """
+    magic = f.read(2)
+    f.seek(0)
+    if magic == b"BM":
+        return _open_bmp(f)
+    if magic in (b"P5", b"P6"):
+        return _open_pnm(f)
+    raise ValueError("Not an uncompressed BMP or binary PGM/PPM file")
+
+
+def _residual_rows(rows, channels):
+    """Residual symbols of every row (channels one after another), keeping only the previous row."""
+    previous = None
+    for row in rows:
+        row = row.reshape(len(row), channels)
+        diff = np.empty_like(row)
+        diff[1:] = row[1:] - row[:-1]
+        diff[0] = row[0] if previous is None else row[0] - previous[0]
+        diff += np.uint8(RESIDUAL_OFFSET)
+        previous = row
+        yield diff.T.ravel()
+
+
+def encode_rows(rows, width, height, channels=1):
+    """Yield the bytes of a row stream: the header, then codes as rows are coded."""
+    yield (MAGIC + bytes([channels]) + width.to_bytes(4, byteorder='big')
+           + height.to_bytes(4, byteorder='big'))
+    encoder = lzw_numba.StreamEncoder(256, MAX_DICT_SIZE)
+    chunk = []
+    count = 0
+    for symbols in _residual_rows(rows, channels):
+        if len(symbols) != width * channels:
+            raise ValueError(f"Row {count} has {len(symbols) // channels} pixels, expected {width}")
+        chunk.append(symbols)
+        count += 1
+        if len(chunk) == ROWS_PER_CHUNK:
+            with instrumentation.stage("lzw"):
+                codes = encoder.encode(np.concatenate(chunk))
+            yield codes.astype('>u2').tobytes()
+            chunk = []
+    if count != height:
+        raise ValueError(f"Got {count} rows, expected {height}")
+    with instrumentation.stage("lzw"):
+        codes = np.concatenate([encoder.encode(np.concatenate(chunk) if chunk else []),
+                                encoder.finish()])
+    instrumentation.count("symbols_in", width * height * channels)
+    yield codes.astype('>u2').tobytes()
+
+
+def read_header(f):
+    """(width, height, channels) from the header of a row stream file."""
+    header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE or header[:4] != MAGIC:
+        raise ValueError("Not a row stream file (bad magic)")
+    return (int.from_bytes(header[5:9], byteorder='big'),
+            int.from_bytes(header[9:13], byteorder='big'), header[4])
+
+
+def decode_rows(f, errors=None):
+    """Yield the rows of an open row stream file as they are decoded.
+
+    A stream that ends early is padded with zero rows, and symbols past
+    the last row are dropped; both are reported to `errors`.
+    """
+    f.seek(0)
+    width, height, channels = read_header(f)
+    lenient = errors is None or not errors.strict
+    decoder = lzw_numba.StreamDecoder(256, MAX_DICT_SIZE, lenient)
+    row_size = width * channels
+    pending = np.zeros(0, dtype=np.uint8)
+    previous = None
+    count = 0
+    while count < height:
+        data = f.read(2 * CODES_PER_READ)
+        if len(data) < 2:
+            break
+        codes = np.frombuffer(data[:len(data) // 2 * 2], dtype='>u2').astype(np.uint16)
+        with instrumentation.stage("lzw"):
+            pending = np.concatenate([pending, decoder.decode(codes)])
+        rows = min(len(pending) // row_size, height - count)
+        block = pending[:rows * row_size].reshape(rows, channels, width) - np.uint8(RESIDUAL_OFFSET)
+        pending = pending[rows * row_size:]
+        for diff in block:
+            # Restore the first column from the row above, then along the row
+            if previous is not None:
+                diff[:, 0] += previous[:, 0]
+            previous = np.cumsum(diff, axis=1, dtype=np.uint8)
+            count += 1
+            yield previous[0] if channels == 1 else previous.T
+    if errors is not None:
+        errors.add("bad_codes", decoder.bad, "%d bad codes repaired", decoder.bad)
+        if count < height or len(pending) or f.read(2):
+            errors.report("length_mismatch", "Decoded %d of %d rows", count, height)
+    for _ in range(count, height):
+        yield np.zeros((width,) if channels == 1 else (width, 3), dtype=np.uint8)
+
+
+def write_bmp(path, width, height, channels, rows):
+    """Write rows (top first) to an uncompressed top-down BMP as they arrive; returns its size."""
+    bits = 8 * channels
+    stride = (width * bits + 31) // 32 * 4
+    palette_size = 1024 if channels == 1 else 0
+    data_offset = 54 + palette_size
+    size = data_offset + stride * height
+    with open(path, 'wb') as f:
+        f.write(b"BM" + size.to_bytes(4, 'little') + bytes(4) + data_offset.to_bytes(4, 'little'))
+        # BITMAPINFOHEADER; a negative height stores the rows top first
+        colors = 256 if channels == 1 else 0
+        f.write((40).to_bytes(4, 'little') + width.to_bytes(4, 'little', signed=True)
+                + (-height).to_bytes(4, 'little', signed=True) + (1).to_bytes(2, 'little')
+                + bits.to_bytes(2, 'little') + bytes(4) + (stride * height).to_bytes(4, 'little')
+                + (2835).to_bytes(4, 'little') * 2 + colors.to_bytes(4, 'little') + bytes(4))
+        if channels == 1:
+            # Grayscale palette, BGRX
+            f.write(np.repeat(np.arange(256, dtype=np.uint8), 4).reshape(256, 4)
+                    * np.array([1, 1, 1, 0], dtype=np.uint8))
+        padding = bytes(stride - width * channels)
+        for row in rows:
+            f.write((row if channels == 1 else row[:, ::-1]).tobytes() + padding)
+    return size
+
+
+def compress_file(input_file_path, output_file_path):
+    """Row-stream an uncompressed BMP or PGM/PPM file to a row stream file; returns its size."""
+    size = 0
+    with open(input_file_path, 'rb') as f, open(output_file_path, 'wb') as out:
+        width, height, channels, rows = read_rows(f)
+        for data in encode_rows(rows, width, height, channels):
+            out.write(data)
+            size += len(data)
+    instrumentation.count("bytes_in", width * height * channels)
+    instrumentation.count("bytes_out", size)
+    logger.info(f"Image streamed to {output_file_path}: {size} bytes")
+    return size
+
+
+def decompress_file(input_file_path, output_file_path, strict=False):
+    """Decode a row stream file to a BMP, one row at a time."""
+    errors = lzw_logging.DecodeErrors(strict, logger)
+    with open(input_file_path, 'rb') as f:
+        width, height, channels = read_header(f)
+        size = write_bmp(output_file_path, width, height, channels, decode_rows(f, errors))
+    errors.summary()
+    instrumentation.count("bytes_out", size)
+    logger.info(f"Image decompressed and saved as {output_file_path}")
+    return output_file_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Row-streaming compression of large images")
+    parser.add_argument("action", choices=["compress", "decompress"])
+    parser.add_argument("input")
+    parser.add_argument("output")
+    parser.add_argument("--strict", action="store_true",
+                        help="fail on the first bad code when decompressing")
+    args = parser.parse_args(argv)
+    lzw_logging.configure()
+    if args.action == "compress":
+        compress_file(args.input, args.output)
+    else:
+        decompress_file(args.input, args.output, args.strict)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
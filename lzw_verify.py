@@ -0,0 +1,87 @@
+"""Integrity check of LZW containers without the original files.
+
+    python lzw_verify.py archive/ extra.lzwc --decode --workers 8
+
+Directories are searched recursively for containers (files starting with
+the container magic). Without --decode only the stream checksums are
+checked, which is limited by disk speed; zlib releases the GIL while
+hashing, so threads are used. --decode also decodes every container and
+compares it with the stored data checksum, using a process pool.
+"""
+import argparse
+import concurrent.futures
+import os
+import sys
+import lzw_api
+import lzw_logging
+
+logger = lzw_logging.get_logger(__name__)
+
+
+def is_container(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(lzw_api.MAGIC)) == lzw_api.MAGIC
+    except OSError:
+        return False
+
+
+def find_containers(paths):
+    """Container files among `paths`, searching directories recursively."""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, _, names in os.walk(path):
+            for name in sorted(names):
+                file_path = os.path.join(root, name)
+                if is_container(file_path):
+                    yield file_path
+
+
+def verify_file(path, decode=False):
+    """Verify one container file; returns (path, list of problems)."""
+    try:
+        with open(path, 'rb') as f:
+            blob = f.read()
+    except OSError as e:
+        return path, [str(e)]
+    return path, lzw_api.verify(blob, decode)
+
+
+def verify_paths(paths, decode=False, workers=None):
+    """Verify every container in `paths` in parallel; yields (path, problems) in order."""
+    files = list(find_containers(paths))
+    if workers == 1 or len(files) <= 1:
+        for path in files:
+            yield verify_file(path, decode)
+        return
+    executor_class = (concurrent.futures.ProcessPoolExecutor if decode
+                      else concurrent.futures.ThreadPoolExecutor)
+    with executor_class(max_workers=workers) as executor:
+        yield from executor.map(verify_file, files, [decode] * len(files))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verify LZW containers")
+    parser.add_argument("paths", nargs="+", help="container files or directories")
+    parser.add_argument("--decode", action="store_true",
+                        help="also decode and check the stored data checksum")
+    parser.add_argument("--workers", type=int, default=None, help="parallel workers")
+    args = parser.parse_args(argv)
+
+    lzw_logging.configure()
+    checked = failed = 0
+    for path, problems in verify_paths(args.paths, args.decode, args.workers):
+        checked += 1
+        if problems:
+            failed += 1
+            logger.error(f"FAILED {path}: {'; '.join(problems)}")
+        else:
+            logger.info(f"OK {path}")
+    logger.info(f"{checked} containers checked, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def gray():
+    """Odd-sized grayscale image: a diagonal gradient with a little noise."""
+    rng = np.random.default_rng(0)
+    ramp = np.add.outer(np.arange(37), np.arange(53)) % 200
+    return (ramp + rng.integers(0, 3, ramp.shape)).astype(np.uint8)
+
+
+@pytest.fixture
+def color(gray):
+    # First pixels and neighbour differences fit the clipped level 3/5 residuals
+    return np.stack([gray, gray // 2, gray + 40], axis=2)
+
+
+@pytest.fixture
+def few_colors():
+    """RGB image of four colors, coded as palette indices by default."""
+    rng = np.random.default_rng(1)
+    colors = np.array([[0, 0, 0], [255, 0, 0], [10, 200, 30], [255, 255, 255]], dtype=np.uint8)
+    return colors[rng.integers(0, 4, (24, 31))]
+
+
+@pytest.fixture
+def text():
+    lines = [f"{i:04d} line with ÜTF-8 and repeated words words words\n" for i in range(300)]
+    return "".join(lines).encode("utf-8")
@@ -0,0 +1,144 @@
+import numpy as np
+import pytest
+from PIL import Image
+import image_tools
+import level1_compression
+import level1_decompression
+import level2_compression
+import level2_decompression
+import level3_compression
+import level3_decompression
+import level4_compression
+import level4_decompression
+import level5_compression
+import level5_decompression
+import lzw_logging
+import lzw_numba
+
+GRAY_LEVELS = {2: (level2_compression, level2_decompression),
+               3: (level3_compression, level3_decompression)}
+COLOR_LEVELS = {4: (level4_compression, level4_decompression),
+                5: (level5_compression, level5_decompression)}
+
+
+def read_restored(path):
+    return image_tools.read_gray_array(path) if path.endswith(".png") else np.array(Image.open(path))
+
+
+@pytest.mark.parametrize("block_size", [0, 400])
+def test_text(tmp_path, text, block_size):
+    source = tmp_path / "text.txt"
+    source.write_bytes(text)
+    compressed = level1_compression.compress_text_file(str(source), block_size=block_size)
+    restored = level1_decompression.decompress_text_file(compressed)
+    with open(restored, 'rb') as f:
+        assert f.read() == text
+
+
+@pytest.mark.parametrize("segments", [1, 3])
+@pytest.mark.parametrize("level", sorted(GRAY_LEVELS))
+def test_gray(tmp_path, gray, level, segments):
+    compress, decompress = GRAY_LEVELS[level]
+    source = str(tmp_path / "gray.bmp")
+    Image.fromarray(gray).save(source)
+    compressed = compress.compress_image_file(source, segments=segments)
+    assert np.array_equal(read_restored(decompress.decompress_image_file(compressed)), gray)
+
+
+@pytest.mark.parametrize("level", sorted(GRAY_LEVELS))
+def test_gray16(tmp_path, gray, level):
+    compress, decompress = GRAY_LEVELS[level]
+    img = gray.astype(np.uint16) * 300 + 7
+    source = str(tmp_path / "gray16.npy")
+    np.save(source, img)
+    compressed = compress.compress_image_file(source)
+    restored = read_restored(decompress.decompress_image_file(compressed))
+    assert restored.dtype == np.uint16
+    assert np.array_equal(restored, img)
+
+
+@pytest.mark.parametrize("level, options", [(4, {}), (4, {"tuples": True}), (5, {})])
+def test_color(tmp_path, color, few_colors, level, options):
+    compress, decompress = COLOR_LEVELS[level]
+    img = few_colors if options else color
+    source = str(tmp_path / "color.bmp")
+    Image.fromarray(img).save(source)
+    compressed = compress.compress_image_file(source, **options)
+    assert np.array_equal(read_restored(decompress.decompress_image_file(compressed)), img)
+
+
+def shorten(path, header_size, count_fields, keep):
+    """Rewrite a level 3/5 file keeping only `keep` codes of every stream."""
+    with open(path, 'rb') as f:
+        header = f.read(header_size)
+        counts = [int.from_bytes(f.read(4), byteorder='big') for _ in range(count_fields)]
+        streams = [f.read(2 * count)[:2 * keep] for count in counts]
+    with open(path, 'wb') as f:
+        f.write(header)
+        for stream in streams:
+            f.write((len(stream) // 2).to_bytes(4, byteorder='big'))
+        f.write(b"".join(streams))
+
+
+@pytest.mark.parametrize("level", [3, 5])
+def test_truncated_stream_holds_last_value(tmp_path, level):
+    # A flat image is all zero residuals after its first pixel, so a stream
+    # cut short must restore the same flat value, not ramp down to 0
+    if level == 3:
+        img = np.full((37, 53), 100, dtype=np.uint8)
+        compress, decompress = level3_compression, level3_decompression
+    else:
+        img = np.full((37, 53, 3), (100, 110, 120), dtype=np.uint8)
+        compress, decompress = level5_compression, level5_decompression
+    source = str(tmp_path / "flat.bmp")
+    Image.fromarray(img).save(source)
+    compressed = compress.compress_image_file(source)
+    shorten(compressed, 4, 1 if level == 3 else 3, keep=20)
+
+    errors = lzw_logging.DecodeErrors()
+    restored = decompress.decompress_image_file(compressed, errors=errors)
+    assert errors.counts["length_mismatch"] >= 1
+    assert np.array_equal(read_restored(restored), img)
+
+
+def test_strict_text_raises(tmp_path, text):
+    source = tmp_path / "text.txt"
+    source.write_bytes(text)
+    compressed = level1_compression.compress_text_file(str(source))
+    with open(compressed, 'r+b') as f:
+        f.seek(40)
+        f.write(b"\x00\x7f\xff\xff")
+    with pytest.raises(lzw_logging.DecodeError):
+        level1_decompression.decompress_text_file(compressed, strict=True)
+    assert level1_decompression.decompress_text_file(compressed) is not None
+
+
+@pytest.mark.parametrize("level", [2, 3])
+def test_bad_code_counted_or_raised(tmp_path, gray, level):
+    compress, decompress = GRAY_LEVELS[level]
+    source = str(tmp_path / "gray.bmp")
+    Image.fromarray(gray).save(source)
+    compressed = compress.compress_image_file(source)
+    with open(compressed, 'r+b') as f:
+        f.seek(20)
+        f.write(b"\xff\xf0")
+    errors = lzw_logging.DecodeErrors()
+    assert decompress.decompress_image_file(compressed, errors=errors) is not None
+    assert errors.counts["bad_codes"] == 1
+    with pytest.raises(lzw_logging.DecodeError):
+        decompress.decode_image_file(compressed, errors=lzw_logging.DecodeErrors(strict=True))
+
+
+@pytest.mark.skipif(not lzw_numba.HAVE_NUMBA, reason="compares the Numba kernel with the fallback")
+def test_lenient_repair_matches_fallback():
+    rng = np.random.default_rng(2)
+    codes = lzw_numba.compress_lzw(rng.integers(0, 4, 5000), 256, 300)
+    # Two bad codes in a row after the dictionary is full
+    codes[-10] = 350
+    codes[-9] = 360
+    kernel = lzw_numba.decompress_lzw(codes, 256, 300, lenient=True)
+    fallback, bad = lzw_numba._decode_python(lzw_numba._as_codes(codes), 256, 300, True,
+                                             lzw_numba.NO_PRESET)
+    assert bad == 2
+    assert kernel.tolist() == fallback
+    assert lzw_numba.decoded_length(codes, 256, 300) == len(fallback)
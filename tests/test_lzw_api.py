@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+import lzw_api
+import lzw_dictionary
+import lzw_scan
+
+MODES = [{}, {"progressive": True}, {"pyramid": 2}, {"restart_interval": 8},
+         {"max_size": 65536}, {"palette": False}] + [{"scan": order} for order in lzw_scan.ORDERS]
+
+
+@pytest.mark.parametrize("options", MODES)
+@pytest.mark.parametrize("level", [2, 3, 4, 5])
+def test_image_round_trip(gray, color, level, options):
+    img = gray if level in (2, 3) else color
+    blob = lzw_api.compress(img, level, **options)
+    assert np.array_equal(lzw_api.decompress(blob), img)
+    assert lzw_api.verify(blob, decode=True) == []
+
+
+@pytest.mark.parametrize("options", [{}, {"restart_interval": 100}])
+def test_text_round_trip(text, options):
+    blob = lzw_api.compress(text, 1, **options)
+    assert lzw_api.decompress(blob) == text
+
+
+@pytest.mark.parametrize("level", [4, 5])
+def test_palette_round_trip(few_colors, level):
+    blob = lzw_api.compress(few_colors, level)
+    assert lzw_api.read_header(blob)[0]["level"] in (2, 3)
+    assert np.array_equal(lzw_api.decompress(blob), few_colors)
+
+
+def test_empty_text():
+    assert lzw_api.decompress(lzw_api.compress(b"", 1)) == b""
+
+
+@pytest.mark.parametrize("level", [1, 3])
+def test_trained_dictionary(text, gray, level):
+    data = text if level == 1 else gray
+    dictionary = lzw_dictionary.train([data], level, size=64)
+    blob = lzw_api.compress(data, level, dictionary=dictionary)
+    assert np.array_equal(np.asarray(lzw_api.decompress(blob, dictionary=dictionary)),
+                          np.asarray(data))
+
+
+def test_pyramid_reduction(gray):
+    blob = lzw_api.compress(gray, 2, pyramid=2)
+    quarter = lzw_api.decompress(blob, reduction=4)
+    assert quarter.shape == tuple(lzw_api.pyramid_shapes(gray.shape, 2)[2])
+    assert lzw_api.thumbnail(blob, 10).shape == quarter.shape
+
+
+def test_progressive_preview_of_prefix(color):
+    blob = lzw_api.compress(color, 4, progressive=True)
+    image, passes = lzw_api.preview(blob[:lzw_api.prefix_length(blob, 3)])
+    assert passes == 3
+    assert image.shape == color.shape
+    assert np.array_equal(lzw_api.preview(blob)[0], color)
+
+
+def test_recover_damaged_restart_segment(gray):
+    blob = bytearray(lzw_api.compress(gray, 3, restart_interval=8))
+    blob[len(blob) // 2] ^= 0xFF
+    assert lzw_api.verify(bytes(blob))
+    image, damaged = lzw_api.recover(bytes(blob))
+    assert len(damaged) == 1
+    start, end = damaged[0]
+    intact = np.ones(gray.shape[0], dtype=bool)
+    intact[start:end] = False
+    assert np.array_equal(image[intact], gray[intact])
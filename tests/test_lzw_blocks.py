@@ -0,0 +1,48 @@
+import pytest
+import lzw_blocks
+import lzw_logging
+
+
+@pytest.fixture
+def block_file(tmp_path, text):
+    path = str(tmp_path / "text_compressed.lzw")
+    lzw_blocks.write_file(path, text, 500)
+    return path
+
+
+def test_decode(block_file, text):
+    assert len(lzw_blocks.BlockIndex(block_file)) > 10
+    assert lzw_blocks.decode(block_file, workers=4) == text
+
+
+@pytest.mark.parametrize("start, end", [(0, 1), (0, 10 ** 6), (499, 501), (1234, 4321),
+                                        (7000, 6000)])
+def test_read_range(block_file, text, start, end):
+    assert lzw_blocks.read_range(block_file, start, end) == text[start:end]
+
+
+@pytest.mark.parametrize("first, last", [(1, 1), (1, 300), (7, 8), (42, 137), (299, 400),
+                                         (300, 300), (5, 4)])
+def test_read_lines(block_file, text, first, last):
+    lines = text.decode("utf-8").splitlines(keepends=True)
+    assert lzw_blocks.read_lines(block_file, first, last) == "".join(lines[first - 1:last])
+
+
+def test_blocks_without_newlines(tmp_path):
+    data = bytes(range(256)) * 20
+    path = str(tmp_path / "binary.lzw")
+    lzw_blocks.write_file(path, data, 300)
+    assert lzw_blocks.read_range(path, 250, 1300) == data[250:1300]
+    assert lzw_blocks.decode(path) == data
+
+
+def test_strict_bad_code(block_file):
+    index = lzw_blocks.BlockIndex(block_file)
+    with open(block_file, 'r+b') as f:
+        f.seek(index.file_offsets[1] + 20)
+        f.write(b"\xff\xff")
+    with pytest.raises(lzw_logging.DecodeError):
+        lzw_blocks.decode(block_file, lzw_logging.DecodeErrors(strict=True))
+    errors = lzw_logging.DecodeErrors()
+    lzw_blocks.decode(block_file, errors)
+    assert errors.counts["bad_codes"] == 1
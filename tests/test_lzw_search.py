@@ -0,0 +1,33 @@
+import pytest
+import level1_compression
+import lzw_blocks
+import lzw_search
+
+
+def find_all(data, pattern):
+    """(line from 1, offset) of every match, overlapping ones included, by bytes.find."""
+    hits = []
+    position = data.find(pattern)
+    while position >= 0:
+        hits.append((data.count(b"\n", 0, position) + 1, position))
+        position = data.find(pattern, position + 1)
+    return hits
+
+
+PATTERNS = [b"words", b"words words", b"0042", b"\n0100", "ÜTF".encode("utf-8"), b"w", b"absent"]
+
+
+@pytest.mark.parametrize("pattern", PATTERNS)
+def test_block_file(tmp_path, text, pattern):
+    path = str(tmp_path / "text_compressed.lzw")
+    lzw_blocks.write_file(path, text, 300)  # Small blocks: matches cross block boundaries
+    assert lzw_search.search(path, pattern) == find_all(text, pattern)
+
+
+@pytest.mark.parametrize("pattern", [b"aa", b"abab", b"line 7", b"\nline", b"zzz"])
+def test_plain_file(tmp_path, pattern):
+    data = "".join(f"line {i} abababab aaaa\n" for i in range(200)).encode("ascii")
+    source = tmp_path / "plain.txt"
+    source.write_bytes(data)
+    path = level1_compression.compress_text_file(str(source))
+    assert lzw_search.search(path, pattern) == find_all(data, pattern)
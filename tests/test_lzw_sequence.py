@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+import lzw_sequence
+
+
+def frames(first, count=7):
+    """A frame moving one pixel to the right per frame."""
+    return [np.roll(first, shift, axis=1) for shift in range(count)]
+
+
+@pytest.mark.parametrize("spatial", [False, True])
+@pytest.mark.parametrize("channels", [1, 3])
+def test_round_trip(gray, color, channels, spatial):
+    clip = frames(gray if channels == 1 else color)
+    blob = lzw_sequence.compress_frames(clip, keyframe_interval=3, spatial=spatial)
+    decoded = list(lzw_sequence.decompress_frames(blob))
+    assert len(decoded) == len(clip)
+    for frame, original in zip(decoded, clip):
+        assert np.array_equal(frame, original)
+
+
+def test_random_access(color):
+    clip = frames(color)
+    blob = lzw_sequence.compress_frames(clip, keyframe_interval=3)
+    for index in (0, 2, 4, 6):
+        assert np.array_equal(lzw_sequence.decode_frame(blob, index), clip[index])
+    assert len(list(lzw_sequence.decompress_frames(blob, start=5))) == 2
+    with pytest.raises(IndexError):
+        lzw_sequence.decode_frame(blob, 7)
+
+
+def test_mismatched_frame_shape(gray):
+    with pytest.raises(ValueError):
+        lzw_sequence.compress_frames([gray, gray[1:]])
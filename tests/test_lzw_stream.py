@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from PIL import Image
+import lzw_logging
+import lzw_stream
+
+
+@pytest.mark.parametrize("extension", [".bmp", ".pnm"])
+@pytest.mark.parametrize("channels", [1, 3])
+def test_round_trip(tmp_path, gray, color, channels, extension):
+    img = gray if channels == 1 else color
+    source = str(tmp_path / f"image{extension}")
+    Image.fromarray(img).save(source, "BMP" if extension == ".bmp" else "PPM")
+    compressed = str(tmp_path / "image.lzr")
+    restored = str(tmp_path / "restored.bmp")
+    lzw_stream.compress_file(source, compressed)
+    lzw_stream.decompress_file(compressed, restored)
+    assert np.array_equal(np.array(Image.open(restored)), img)
+
+
+def test_truncated_stream(tmp_path, gray):
+    source = str(tmp_path / "image.bmp")
+    Image.fromarray(gray).save(source)
+    compressed = str(tmp_path / "image.lzr")
+    lzw_stream.compress_file(source, compressed)
+    with open(compressed, 'r+b') as f:
+        f.truncate(lzw_stream.HEADER_SIZE + 200)
+
+    errors = lzw_logging.DecodeErrors()
+    with open(compressed, 'rb') as f:
+        rows = np.array(list(lzw_stream.decode_rows(f, errors)))
+    assert rows.shape == gray.shape
+    assert errors.counts["length_mismatch"] == 1
+    decoded = (rows != 0).any(axis=1).sum()
+    assert 0 < decoded < gray.shape[0]
+    assert np.array_equal(rows[:decoded], gray[:decoded])
+
+    with open(compressed, 'rb') as f, pytest.raises(lzw_logging.DecodeError):
+        list(lzw_stream.decode_rows(f, lzw_logging.DecodeErrors(strict=True)))